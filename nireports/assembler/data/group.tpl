@@ -0,0 +1,104 @@
+<!DOCTYPE html>
+<html lang="en">
+<head>
+<meta http-equiv="Content-Type" content="text/html; charset=utf-8" />
+<title>{{ title }}</title>
+
+<style type="text/css">
+body {
+    padding: 65px 10px 10px;
+}
+
+.subject-summary {
+    cursor: pointer;
+    padding: 5px 0;
+}
+
+.subject-report {
+    width: 100%;
+    height: 80vh;
+    border: 1px solid #DEE2E6;
+}
+</style>
+
+<link href="https://cdn.jsdelivr.net/npm/bootstrap@5.2.3/dist/css/bootstrap.min.css" rel="stylesheet" integrity="sha384-rbsA2VBKQhggwzxH7pPCaAqO46MgnOM80zW1RWuH61DGLwZJEdK2Kadq2F9CUG65" crossorigin="anonymous">
+
+</head>
+<body>
+
+<nav class="navbar fixed-top bg-light">
+<div class="container-fluid">
+    <span class="navbar-brand">{{ title }}</span>
+    <ul class="pagination mb-0" id="pages"></ul>
+</div>
+</nav>
+
+<noscript>
+<ul>
+{% for subject in subjects %}
+    <li><a href="{{ subject.report }}">sub-{{ subject.subject }}</a></li>
+{% endfor %}
+</ul>
+</noscript>
+
+<div id="subjects"></div>
+
+<script type="text/javascript">
+const SUBJECTS = {{ subjects_json }};
+const PAGE_SIZE = {{ page_size }};
+
+function describe(subject) {
+    const details = [`${subject.reportlets} reportlets`];
+    if (subject.sessions.length) details.push(`sessions: ${subject.sessions.join(", ")}`);
+    if (subject.tasks.length) details.push(`tasks: ${subject.tasks.join(", ")}`);
+    return details.join(" &middot; ");
+}
+
+/* Reports are only loaded once their subject is opened */
+function loadReport(event) {
+    const element = event.target;
+    if (element.open && !element.querySelector("iframe")) {
+        const frame = document.createElement("iframe");
+        frame.className = "subject-report";
+        frame.src = element.dataset.report;
+        element.appendChild(frame);
+    }
+}
+
+function showPage(page) {
+    const npages = Math.max(1, Math.ceil(SUBJECTS.length / PAGE_SIZE));
+    page = Math.min(Math.max(1, page), npages);
+
+    const container = document.getElementById("subjects");
+    container.replaceChildren();
+    for (const subject of SUBJECTS.slice((page - 1) * PAGE_SIZE, page * PAGE_SIZE)) {
+        const element = document.createElement("details");
+        element.id = `sub-${subject.subject}`;
+        element.dataset.report = subject.report;
+        element.innerHTML = `<summary class="subject-summary"><strong>sub-${subject.subject}</strong> \
+<span class="text-muted">${describe(subject)}</span> \
+(<a href="${subject.report}" target="_blank">open</a>)</summary>`;
+        element.addEventListener("toggle", loadReport);
+        container.appendChild(element);
+    }
+
+    const pages = document.getElementById("pages");
+    pages.replaceChildren();
+    for (let i = 1; i <= npages; i++) {
+        const item = document.createElement("li");
+        item.className = i === page ? "page-item active" : "page-item";
+        item.innerHTML = `<a class="page-link" href="#page-${i}">${i}</a>`;
+        pages.appendChild(item);
+    }
+}
+
+function currentPage() {
+    const match = window.location.hash.match(/^#page-([0-9]+)$/);
+    return match ? parseInt(match[1]) : 1;
+}
+
+window.addEventListener("hashchange", () => showPage(currentPage()));
+showPage(currentPage());
+</script>
+</body>
+</html>
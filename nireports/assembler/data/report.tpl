@@ -101,7 +101,8 @@ div#boilerplate pre {
             {% for elem in run_report.components %}
                 {% if elem[0] %}
                     {% if elem[1] %}<p class="elem-caption">{{ elem[1] }}</p>{% endif %}
-                    {{ elem[0] }}
+                    {# Dynamic figures are deferred, and loaded by the script at the bottom #}
+                    {{ elem[0] | replace('<object class="svg-reportlet" type="image/svg+xml" data=', '<object class="svg-reportlet" type="image/svg+xml" data-src=') }}
                 {% endif %}
             {% endfor %}
         </div>
@@ -111,6 +112,31 @@ div#boilerplate pre {
 {% endfor %}
 
 <script type="text/javascript">
+/* Load dynamic figures only when they are about to be scrolled into view */
+function loadFigure(placeholder) {
+    var figure = placeholder.cloneNode(true);
+    figure.removeAttribute('data-src');
+    figure.setAttribute('data', placeholder.getAttribute('data-src'));
+    placeholder.replaceWith(figure);
+}
+
+(function () {
+    var figures = document.querySelectorAll('object.svg-reportlet[data-src]');
+    if (!('IntersectionObserver' in window)) {
+        figures.forEach(loadFigure);
+        return;
+    }
+    var observer = new IntersectionObserver(function (entries) {
+        entries.forEach(function (entry) {
+            if (entry.isIntersecting) {
+                observer.unobserve(entry.target);
+                loadFigure(entry.target);
+            }
+        });
+    }, {rootMargin: '200px 0px'});
+    figures.forEach(function (figure) { observer.observe(figure); });
+})();
+
 function toggle(id) {
     var element = document.getElementById(id);
     if(element.style.display == 'block')
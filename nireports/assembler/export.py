@@ -23,3 +23,192 @@
 # STATEMENT OF CHANGES: This file was ported carrying over full git history from niworkflows,
 # another NiPreps project licensed under the Apache-2.0 terms, and has been changed since.
 """Utility functions for archiving and distributing reports."""
+import gzip
+import io
+import os
+import tarfile
+import zipfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from time import localtime
+
+from nireports.assembler.reportlet import _FigureSnippet
+
+# Figure formats that are already compressed, and are stored as they are in zip archives
+COMPRESSED_SUFFIXES = {".gif", ".gz", ".jpeg", ".jpg", ".png", ".webp", ".avif", ".zst"}
+
+
+def report_files(report):
+    """
+    List the files that make up an indexed report.
+
+    The figures are those referenced by the reportlets of the report, and therefore
+    the output folder is not traversed.
+
+    Parameters
+    ----------
+    report : :obj:`~nireports.assembler.report.Report`
+        A report, which has been indexed (i.e., it was not skipped as up to date).
+
+    Returns
+    -------
+    files : :obj:`dict`
+        A mapping of the paths within the archive (relative to the output folder of the
+        report) to the absolute paths of the files, starting with the HTML document.
+
+    """
+    if report.up_to_date:
+        raise RuntimeError(
+            f"Report <{report.out_filename}> was not indexed (it is up to date)."
+        )
+
+    out_dir = Path(report.out_dir).absolute()
+    html = Path(report.out_filename).absolute()
+    try:
+        files = {html.relative_to(out_dir).as_posix(): html}
+    except ValueError:
+        files = {html.name: html}
+
+    for section in report.sections:
+        for reportlet in section.reportlets:
+            for contents, _ in reportlet.components:
+                if isinstance(contents, _FigureSnippet):
+                    anchor = Path(contents.anchor)
+                    files.setdefault(anchor.as_posix(), out_dir / anchor)
+    return files
+
+
+def _read(path):
+    path = Path(path)
+    return path.read_bytes(), path.stat().st_mtime
+
+
+def _prefetch(paths, max_workers=None):
+    """Read files on a pool of threads, yielding their contents in order as they are ready."""
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        # Bound the number of files held in memory
+        window = 2 * (max_workers or min(32, (os.cpu_count() or 1) + 4))
+        pending = deque()
+        for path in paths:
+            pending.append(pool.submit(_read, path))
+            if len(pending) >= window:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def _gzip_writer(fileobj, level=None):
+    return gzip.GzipFile(
+        fileobj=fileobj, mode="wb", compresslevel=9 if level is None else level
+    )
+
+
+def _zstd_writer(fileobj, level=None, threads=-1):
+    try:
+        import zstandard
+    except ImportError as exc:
+        raise RuntimeError(
+            "Exporting reports to .tar.zst archives requires the zstandard package."
+        ) from exc
+
+    compressor = zstandard.ZstdCompressor(level=3 if level is None else level, threads=threads)
+    return compressor.stream_writer(fileobj, closefd=False)
+
+
+def export_report(report, archive, level=None, max_workers=None):
+    """
+    Stream a report and all the figures it references into an archive.
+
+    Files are read concurrently (reading is bound by I/O, particularly on network
+    filesystems) and written into the archive as they are ready, so that only a few
+    files are held in memory at any time.
+    Figures in compressed formats (e.g., PNG) are stored, rather than compressed again,
+    in zip archives.
+    Zstandard-compressed tarballs (``.tar.zst``, which require the *zstandard*
+    package) are compressed on as many threads as CPUs available.
+
+    Parameters
+    ----------
+    report : :obj:`~nireports.assembler.report.Report`
+        An indexed report (see :func:`report_files`), whose HTML has been generated.
+    archive : :obj:`str` or :obj:`~pathlib.Path`
+        The path of the archive, which format is set by its extension: ``.zip``,
+        ``.tar``, ``.tar.gz`` (or ``.tgz``) and ``.tar.zst``.
+    level : :obj:`int`
+        The compression level (by default, that of the corresponding library).
+    max_workers : :obj:`int`
+        Number of threads reading files (by default, as set by
+        :obj:`~concurrent.futures.ThreadPoolExecutor`).
+
+    Returns
+    -------
+    archive : :obj:`~pathlib.Path`
+        The path of the archive.
+
+    Examples
+    --------
+    .. testsetup::
+
+       >>> from pkg_resources import resource_filename as pkgrf
+       >>> from nireports.assembler.report import Report
+       >>> test_data_path = Path(pkgrf('nireports', 'assembler/data/tests/work'))
+       >>> testdir = Path(tmpdir)
+
+    >>> report = Report(
+    ...     testdir / 'out',
+    ...     'fakeuuid',
+    ...     reportlets_dir=test_data_path / 'reportlets' / 'nireports',
+    ...     subject_id='01',
+    ... )
+    >>> report.generate_report()
+    0
+    >>> archive = export_report(report, testdir / 'sub-01.zip')
+    >>> names = zipfile.ZipFile(archive).namelist()
+    >>> names[0], len(names)
+    ('sub-01.html', 32)
+    >>> sorted(tarfile.open(export_report(report, testdir / 'sub-01.tar.gz')).getnames()) == (
+    ...     sorted(names)
+    ... )
+    True
+
+    """
+    archive = Path(archive)
+    files = report_files(report)
+    contents = zip(files, _prefetch(files.values(), max_workers=max_workers))
+    archive.parent.mkdir(parents=True, exist_ok=True)
+
+    if archive.suffix == ".zip":
+        with zipfile.ZipFile(
+            archive, "w", compression=zipfile.ZIP_DEFLATED, compresslevel=level
+        ) as zipf:
+            for arcname, (data, mtime) in contents:
+                zinfo = zipfile.ZipInfo(arcname, date_time=localtime(mtime)[:6])
+                zinfo.external_attr = 0o644 << 16
+                if Path(arcname).suffix.lower() not in COMPRESSED_SUFFIXES:
+                    zinfo.compress_type = zipfile.ZIP_DEFLATED
+                zipf.writestr(zinfo, data, compresslevel=level)
+        return archive
+
+    suffixes = "".join(archive.suffixes[-2:])
+    if archive.suffix == ".tar":
+        compressor = None
+    elif suffixes == ".tar.gz" or archive.suffix == ".tgz":
+        compressor = _gzip_writer
+    elif suffixes == ".tar.zst":
+        compressor = _zstd_writer
+    else:
+        raise ValueError(f"Unsupported archive format <{archive.name}>.")
+
+    with open(archive, "wb") as fileobj:
+        stream = fileobj if compressor is None else compressor(fileobj, level)
+        with tarfile.open(fileobj=stream, mode="w|") as tar:
+            for arcname, (data, mtime) in contents:
+                tarinfo = tarfile.TarInfo(arcname)
+                tarinfo.size = len(data)
+                tarinfo.mtime = mtime
+                tarinfo.mode = 0o644
+                tar.addfile(tarinfo, io.BytesIO(data))
+        if stream is not fileobj:
+            stream.close()
+    return archive
@@ -0,0 +1,311 @@
+# emacs: -*- mode: python; py-indent-offset: 4; indent-tabs-mode: nil -*-
+# vi: set ft=python sts=4 ts=4 sw=4 et:
+#
+# Copyright 2023 The NiPreps Developers <nipreps@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# We support and encourage derived works from this project, please read
+# about our expectations at
+#
+#     https://www.nipreps.org/community/licensing/
+#
+"""A lightweight index of reportlets that does not require *PyBIDS*."""
+import json
+import os
+import re
+from pathlib import Path
+
+from pkg_resources import resource_filename as pkgrf
+
+from nireports.assembler.misc import snapshot_tree
+
+# Paths (relative to the root, with a leading slash) that PyBIDS does not index
+IGNORE_PATTERNS = (
+    re.compile(r"^/(code|models|sourcedata|stimuli)"),
+    re.compile(r"^/derivatives/"),
+    re.compile(r"/\."),
+)
+
+DTYPES = {"int": int, "str": str}
+
+
+def _natural_key(path):
+    """Sort key equivalent to :func:`bids.utils.natural_sort`."""
+    return [int(c) if c.isdigit() else c.lower() for c in re.split("([0-9]+)", path)]
+
+
+def _astype(dtype, value):
+    try:
+        return dtype(value)
+    except (TypeError, ValueError):
+        return value
+
+
+def _matcher(values, regex_search=False, dtype=None):
+    """Build a function checking whether an entity value matches any of the query values."""
+    if regex_search:
+        exprs = [re.compile(str(v), re.IGNORECASE) for v in values]
+        return lambda val: any(expr.search(str(val)) for expr in exprs)
+
+    if dtype is None:  # Coerce query values to the type of the entity value
+        return lambda val: any(_astype(type(val), v) == val for v in values)
+
+    return {_astype(dtype, v) for v in values}.__contains__
+
+
+def _select(values, query, regex_search=False, dtype=None):
+    """Indices of the entity ``values`` (``None`` if missing) that match one filter."""
+    query = list(query) if isinstance(query, (list, tuple)) else [query]
+    if not query:
+        return range(len(values))
+
+    allow_none = None in query
+    match = _matcher([v for v in query if v is not None], regex_search, dtype)
+    return [i for i, val in enumerate(values) if (allow_none if val is None else match(val))]
+
+
+def filter_files(files, regex_search=False, **filters):
+    """
+    Select, in memory, the files that match a query.
+
+    The query follows the semantics of :meth:`ReportletIndex.get`, and ``files``
+    may be the results of a previous query to either a :obj:`ReportletIndex` or a
+    :obj:`~bids.layout.BIDSLayout`.
+    Filters on entities not found in any of the files select no files.
+
+    Examples
+    --------
+    >>> files = [
+    ...     ReportletFile('sub-01_run-1_bold.svg', {'subject': '01', 'run': 1}),
+    ...     ReportletFile('sub-01_run-2_bold.svg', {'subject': '01', 'run': 2}),
+    ...     ReportletFile('sub-01_bold.svg', {'subject': '01'}),
+    ... ]
+    >>> filter_files(files, run='02')
+    [<ReportletFile 'sub-01_run-2_bold.svg'>]
+    >>> filter_files(files, run=[None, 1])
+    [<ReportletFile 'sub-01_run-1_bold.svg'>, <ReportletFile 'sub-01_bold.svg'>]
+    >>> len(filter_files(files, subject='0', regex_search=True))
+    3
+
+    """
+    for name, query in filters.items():
+        values = [f.entities.get(name) for f in files]
+        files = [files[i] for i in _select(values, query, regex_search)]
+    return files
+
+
+class ReportletFile:
+    """A reportlet found by :class:`ReportletIndex`, mimicking :obj:`bids.layout.BIDSFile`."""
+
+    __slots__ = {
+        "path": "The absolute path of the reportlet.",
+        "entities": "A dictionary of the entities parsed from the path.",
+    }
+
+    def __init__(self, path, entities):
+        self.path = path
+        self.entities = entities
+
+    def get_entities(self):
+        """Return the entities parsed from the path."""
+        return self.entities
+
+    def __repr__(self):
+        return f"<ReportletFile {self.path!r}>"
+
+
+class ReportletIndex:
+    """
+    An in-memory table of the entities of all reportlets found under a folder.
+
+    The entity patterns of the ``figures`` specification (``data/nipreps.json``) are
+    compiled once and applied to the paths found by a single traversal of the folder.
+    Entities are stored column-wise (one list per entity, with ``None`` for missing
+    values), and :meth:`get` implements the subset of :meth:`bids.layout.BIDSLayout.get`
+    that the assembler uses, returning the same files in the same order.
+    Therefore, an index can be used in place of a :obj:`~bids.layout.BIDSLayout` by
+    :obj:`~nireports.assembler.report.Report` and
+    :obj:`~nireports.assembler.reportlet.Reportlet`.
+
+    .. testsetup::
+
+       >>> from pkg_resources import resource_filename as pkgrf
+       >>> root = Path(pkgrf('nireports', 'assembler/data/tests/work/reportlets'))
+
+    Examples
+    --------
+    >>> index = ReportletIndex(root)
+    >>> len(index)
+    106
+
+    >>> index.get(subject='01', desc='reconall')  # doctest: +ELLIPSIS
+    [<ReportletFile '.../nireports/sub-01/figures/sub-01_desc-reconall_T1w.svg'>]
+
+    >>> len(index.get(subject='01', space='.*', regex_search=True))
+    2
+
+    >>> [
+    ...     f.entities['run']
+    ...     for f in index.get(subject='01', task='faketaskwithruns', desc='aroma')
+    ... ]
+    [1, 2]
+
+    >>> len(index.get(subject='01', task='faketask', run=None))
+    4
+
+    >>> index.get(madeupentity='value')
+    Traceback (most recent call last):
+    ValueError: 'madeupentity' is not a recognized entity.
+
+    """
+
+    __slots__ = {
+        "root": "The absolute path of the indexed folder.",
+        "paths": "The absolute paths of all indexed files, in natural order.",
+        "table": "A mapping of entity names to the list of values for every file.",
+        "_dtypes": "The data type of each entity.",
+        "_files": "A cache of :obj:`ReportletFile` objects.",
+    }
+
+    def __init__(self, root, snapshot=None, config=None):
+        root = Path(root).absolute()
+        spec = json.loads(
+            Path(config or pkgrf("nireports.assembler", "data/nipreps.json")).read_text()
+        )
+        patterns = [
+            (
+                entity["name"],
+                re.compile(entity["pattern"]),
+                entity.get("mandatory", False),
+            )
+            for entity in spec["entities"]
+        ]
+
+        self.root = str(root)
+        self._dtypes = {
+            entity["name"]: DTYPES.get(entity.get("dtype", "str"), str)
+            for entity in spec["entities"]
+        }
+
+        paths = []
+        for reldir, entry in (snapshot or snapshot_tree(root)).items():
+            prefix = "/" if reldir == "." else f"/{reldir}/"
+            paths += [
+                str(root / reldir / fname)
+                for fname in entry["files"]
+                if not any(patt.search(prefix + fname) for patt in IGNORE_PATTERNS)
+            ]
+        self.paths = sorted(paths, key=_natural_key)
+
+        self.table = {name: [None] * len(self.paths) for name, _, _ in patterns}
+        for i, path in enumerate(self.paths):
+            for name, regex, mandatory in patterns:
+                match = regex.search(path)
+                if match is None:
+                    if mandatory:
+                        break
+                    continue
+                self.table[name][i] = _astype(self._dtypes[name], match.group(1))
+
+        self._files = [None] * len(self.paths)
+
+    def __len__(self):
+        return len(self.paths)
+
+    def _file(self, idx):
+        if self._files[idx] is None:
+            self._files[idx] = ReportletFile(
+                self.paths[idx],
+                {
+                    name: column[idx]
+                    for name, column in self.table.items()
+                    if column[idx] is not None
+                },
+            )
+        return self._files[idx]
+
+    def get(self, regex_search=False, **filters):
+        """
+        Query the index.
+
+        Parameters
+        ----------
+        regex_search : :obj:`bool`
+            Whether query values are (case-insensitive) regular expressions searched
+            within the entity values, or should match them exactly.
+        filters : :obj:`dict`
+            Entity names and the value (or list of values) to select. A value of
+            ``None`` selects files where the entity is not present.
+
+        Returns
+        -------
+        files : :obj:`list` of :obj:`ReportletFile`
+            The files matching all filters, in natural order of their paths.
+
+        """
+        for name in filters:
+            if name not in self.table:
+                raise ValueError(f"'{name}' is not a recognized entity.")
+
+        selected = range(len(self.paths))
+        for name, query in filters.items():
+            column = self.table[name]
+            hits = _select([column[i] for i in selected], query, regex_search, self._dtypes[name])
+            selected = [selected[i] for i in hits]
+
+        return [self._file(i) for i in selected]
+
+
+def load_index(root, cache_dir=None):
+    """
+    Index the reportlets under ``root``, possibly reusing a cached listing.
+
+    When a ``cache_dir`` is given, the listing of the folder (see
+    :func:`~nireports.assembler.misc.snapshot_tree`) is stored on disk, so that
+    subsequent calls only list again the folders that changed.
+
+    Parameters
+    ----------
+    root : :obj:`str` or :obj:`~pathlib.Path`
+        The folder containing the reportlets.
+    cache_dir : :obj:`str` or :obj:`~pathlib.Path`
+        A folder where the listing is persisted across executions.
+
+    Returns
+    -------
+    index : :obj:`ReportletIndex`
+        The index of reportlets.
+
+    """
+    if cache_dir is None:
+        return ReportletIndex(root)
+
+    root = Path(root).absolute()
+    cache_file = Path(cache_dir) / "index.json"
+
+    cached = {}
+    if cache_file.exists():
+        cached = json.loads(cache_file.read_text())
+        if cached.get("root") != str(root):
+            cached = {}
+
+    snapshot = snapshot_tree(root, previous=cached.get("tree"))
+    if snapshot != cached.get("tree"):
+        cache_file.parent.mkdir(parents=True, exist_ok=True)
+        # Write to a temporary file first, so that concurrent readers never see a partial file
+        tmp_file = cache_file.with_name(f".{cache_file.name}.{os.getpid()}")
+        tmp_file.write_text(json.dumps({"root": str(root), "tree": snapshot}))
+        tmp_file.replace(cache_file)
+
+    return ReportletIndex(root, snapshot=snapshot)
@@ -23,14 +23,21 @@
 # STATEMENT OF CHANGES: This file was ported carrying over full git history from niworkflows,
 # another NiPreps project licensed under the Apache-2.0 terms, and has been changed since.
 """Miscellaneous utilities."""
+import hashlib
+import os
+import shutil
 from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import contextmanager
+from functools import partial
+from multiprocessing import parent_process
 from pathlib import Path
-from bids.utils import listify
+from time import perf_counter
 
 from nipype.utils.filemanip import loadcrash
 
 
-def read_crashfile(path, root=None, root_replace="<workdir>"):
+def read_crashfile(path, root=None, root_replace="<workdir>", max_length=None):
     """
     Prepare crashfiles for rendering into a report.
 
@@ -42,6 +49,11 @@ def read_crashfile(path, root=None, root_replace="<workdir>"):
         The root folder. If provided, the path will be replaced with ``root_replace``.
     root_replace : :obj:`str`
         A replacement for the absolute root path.
+    max_length : :obj:`int`
+        If provided, the traceback and the values of inputs are truncated to
+        approximately this number of characters (see :func:`_truncate`).
+        The inputs of nodes in pickled crashfiles are bounded as they are converted
+        into strings (see :func:`_bounded_str`).
 
     Examples
     --------
@@ -67,23 +79,208 @@ def read_crashfile(path, root=None, root_replace="<workdir>"):
     ... )['file']
     '<outdir>/crashfile.txt'
 
+    >>> info = read_crashfile(test_data_path / 'crashfile.txt', max_length=100)
+    >>> info['traceback'].split('] ')[0]  # doctest: +ELLIPSIS
+    '[... ... characters truncated ...'
+    >>> info['traceback'].endswith('which has no identity')
+    True
+
     """
-    errordata = _read_pkl(path) if str(path).endswith(".pklz") else _read_txt(path)
+    errordata = _load_crashfile(path, root, root_replace, max_length)
+    if max_length is not None:
+        errordata["traceback"] = _truncate(errordata["traceback"], max_length, keep_end=True)
+    return errordata
+
+
+def _load_crashfile(path, root, root_replace, max_length):
+    """Read a crashfile, bounding the size of its inputs (but not of its traceback)."""
+    if str(path).endswith(".pklz"):
+        errordata = _read_pkl(path, max_length=max_length)
+    else:
+        errordata = _read_txt(path)
+        if max_length is not None and "inputs" in errordata:
+            errordata["inputs"] = [
+                (name, _truncate(value, max_length)) for name, value in errordata["inputs"]
+            ]
     if root:
         errordata["file"] = f"{root_replace}/{Path(errordata['file']).relative_to(root)}"
     return errordata
 
 
-def _read_pkl(path):
-    crash_data = loadcrash(path)
-    data = {"file": path, "traceback": "".join(crash_data["traceback"])}
+def _truncate(text, max_length, keep_end=False):
+    """
+    Truncate a string to (approximately) ``max_length`` characters.
+
+    Examples
+    --------
+    >>> _truncate('abcdefghij', 20)
+    'abcdefghij'
+    >>> _truncate('abcdefghij', 4)
+    'abcd [... 6 characters truncated ...]'
+    >>> _truncate('abcdefghij', 4, keep_end=True)
+    '[... 6 characters truncated ...] ghij'
+
+    """
+    text = str(text)
+    excess = len(text) - max_length
+    if excess <= 0:
+        return text
+    if keep_end:
+        return f"[... {excess} characters truncated ...] {text[excess:]}"
+    return f"{text[:max_length]} [... {excess} characters truncated ...]"
+
+
+def _bounded_str(value, max_length):
+    """
+    Convert a value into a string of (approximately) ``max_length`` characters.
+
+    Lists and tuples are converted item by item, and items beyond ``max_length``
+    are not converted at all, so that long inputs (e.g., lists of thousands of files)
+    are cheap to report.
+
+    Examples
+    --------
+    >>> _bounded_str('abcdefghij', 4)
+    'abcd [... 6 characters truncated ...]'
+    >>> _bounded_str(['a', 'b'], 20)
+    "['a', 'b']"
+    >>> _bounded_str(list(range(100000)), 8)
+    '[0, 1, 2, [... 99997 items truncated ...]'
+    >>> _bounded_str(('a',), 20)
+    "('a',)"
+
+    """
+    if not isinstance(value, (list, tuple)):
+        return _truncate(value, max_length)
+
+    items, length = [], 1
+    for item in value:
+        if length >= max_length:
+            break
+        items.append(repr(item)[:max_length])
+        length += len(items[-1]) + 2
+    text = ("[" if isinstance(value, list) else "(") + ", ".join(items)
+    if len(items) < len(value):
+        return f"{text}, [... {len(value) - len(items)} items truncated ...]"
+    return text + ("]" if isinstance(value, list) else ",)" if len(value) == 1 else ")")
+
+
+def _read_crashfile_keyed(path, root, root_replace, max_length):
+    """
+    Read a crashfile, keyed by a digest of its full traceback.
+
+    This runs in worker processes, so that only the (truncated) strings describing
+    the crash are sent back, not the unpickled nodes.
+    """
+    errordata = _load_crashfile(path, root, root_replace, max_length)
+    key = hashlib.blake2b(errordata["traceback"].encode(), digest_size=16).hexdigest()
+    if max_length is not None:
+        # The end of a traceback (where the exception is raised) is the most informative part
+        errordata["traceback"] = _truncate(errordata["traceback"], max_length, keep_end=True)
+    return key, errordata
+
+
+_POOL_MIN_BYTES = 1 << 22
+"""Total size of crashfiles below which starting a pool of processes is not worth it."""
+
+
+def read_crashfiles(
+    paths, root=None, root_replace="<workdir>", max_length=None, max_workers=None
+):
+    """
+    Read many crashfiles concurrently, merging those with identical tracebacks.
+
+    Large crashfiles are parsed (and unpickled) on a pool of processes, which return
+    their contents already truncated.
+    When many executions fail for the same reason (e.g., a missing license file),
+    their tracebacks are identical and they are reported only once: the returned
+    entries record how many crashfiles share the traceback (``count``) and which
+    they are (``files``).
+    Tracebacks are compared before truncation.
+
+    Parameters
+    ----------
+    paths : :obj:`list` of :obj:`str` or :obj:`~pathlib.Path`
+        The paths of the crashfiles.
+    root : :obj:`str` or :obj:`~pathlib.Path`
+        The root folder, replaced with ``root_replace`` (see :func:`read_crashfile`).
+    root_replace : :obj:`str`
+        A replacement for the absolute root path.
+    max_length : :obj:`int`
+        If provided, the approximate size of tracebacks and inputs (see
+        :func:`read_crashfile`).
+    max_workers : :obj:`int`
+        Number of processes (no more than crashfiles are used).
+        By default, crashfiles are read serially unless they add up to 4 MiB or more,
+        in which case as many processes as CPUs are used.
+        Crashfiles are always read serially with ``1``, and within worker processes
+        (e.g., those of :func:`~nireports.assembler.tools.generate_reports`), which
+        would otherwise oversubscribe the CPUs.
+
+    Returns
+    -------
+    errors : :obj:`list` of :obj:`dict`
+        One entry per distinct traceback, in the order of ``paths``.
+
+    Examples
+    --------
+    .. testsetup::
+
+       >>> test_data_path = Path(__file__).resolve().parent / 'data' / 'tests'
+
+    >>> errors = read_crashfiles([test_data_path / 'crashfile.txt'] * 3, root=test_data_path)
+    >>> len(errors)
+    1
+    >>> errors[0]['count'], errors[0]['files']
+    (3, ['<workdir>/crashfile.txt', '<workdir>/crashfile.txt', '<workdir>/crashfile.txt'])
+
+    """
+    if not paths:
+        return []
+
+    read = partial(
+        _read_crashfile_keyed, root=root, root_replace=root_replace, max_length=max_length
+    )
+    if parent_process() is not None:
+        max_workers = 1
+    elif max_workers is None and sum(os.stat(path).st_size for path in paths) < _POOL_MIN_BYTES:
+        max_workers = 1
+    max_workers = min(max_workers or os.cpu_count() or 1, len(paths))
+    if max_workers > 1:
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            parsed = list(pool.map(read, paths))
+    else:
+        parsed = [read(path) for path in paths]
+
+    errors = {}
+    for key, errordata in parsed:
+        if key not in errors:
+            errors[key] = {**errordata, "count": 0, "files": []}
+        errors[key]["count"] += 1
+        errors[key]["files"].append(errordata["file"])
+    return list(errors.values())
+
+
+def _read_pkl(path, max_length=None):
+    """
+    Read a pickled crashfile.
+
+    With ``max_length``, the node is converted into its name, and the values of its
+    inputs into strings of bounded size (see :func:`_bounded_str`).
+    """
+    crash_data = loadcrash(str(path))
+    data = {"file": str(path), "traceback": "".join(crash_data["traceback"])}
     if "node" in crash_data:
-        data["node"] = crash_data["node"]
-        if data["node"].base_dir:
-            data["node_dir"] = data["node"].output_dir()
+        node = crash_data["node"]
+        data["node"] = node if max_length is None else str(node)
+        if node.base_dir:
+            data["node_dir"] = node.output_dir()
         else:
             data["node_dir"] = "Node crashed before execution"
-        data["inputs"] = sorted(data["node"].inputs.trait_get().items())
+        data["inputs"] = sorted(
+            (name, value if max_length is None else _bounded_str(value, max_length))
+            for name, value in node.inputs.trait_get().items()
+        )
     return data
 
 
@@ -137,6 +334,80 @@ def _read_txt(path):
     return data
 
 
+def snapshot_tree(root, previous=None):
+    """
+    Take a snapshot of the directory structure under ``root``.
+
+    The snapshot records the modification time of every folder and the names of the
+    files and subfolders it contains.
+    Symbolic links to folders are followed, but a folder reached more than once (e.g.,
+    through a symlink loop) is only traversed the first time.
+    Adding, removing or renaming files updates the modification time of their parent
+    folder, and therefore, when a ``previous`` snapshot is given, only the folders
+    whose modification time changed are listed again (unchanged folders are only
+    *stat*-ed).
+
+    Parameters
+    ----------
+    root : :obj:`str` or :obj:`~pathlib.Path`
+        The folder to be traversed.
+    previous : :obj:`dict`
+        A snapshot of the same folder previously generated with this function.
+
+    Returns
+    -------
+    snapshot : :obj:`dict`
+        A mapping of folders (relative to ``root``) to a dictionary with keys
+        ``mtime``, ``dirs``, and ``files``.
+
+    Examples
+    --------
+    >>> root = Path(tmpdir) / 'snapshot'
+    >>> (root / 'sub-01' / 'figures').mkdir(parents=True)
+    >>> _ = (root / 'sub-01' / 'figures' / 'sub-01_dseg.svg').write_text('<svg/>')
+    >>> snapshot = snapshot_tree(root)
+    >>> sorted(snapshot)
+    ['.', 'sub-01', 'sub-01/figures']
+    >>> snapshot['sub-01/figures']['files']
+    ['sub-01_dseg.svg']
+    >>> snapshot_tree(root, previous=snapshot) == snapshot
+    True
+    >>> (root / 'sub-01' / 'figures' / 'loop').symlink_to('..')
+    >>> sorted(snapshot_tree(root))
+    ['.', 'sub-01', 'sub-01/figures']
+
+    """
+    root = Path(root)
+    previous = previous or {}
+    snapshot = {}
+    pending = ["."]
+    visited = set()
+    while pending:
+        reldir = pending.pop()
+        try:
+            stat = os.stat(root / reldir)
+        except FileNotFoundError:  # Removed while traversing
+            continue
+
+        # Symlinked folders are followed, but each folder is only traversed once
+        if (stat.st_dev, stat.st_ino) in visited:
+            continue
+        visited.add((stat.st_dev, stat.st_ino))
+        mtime = stat.st_mtime_ns
+
+        entry = previous.get(reldir)
+        if entry is None or entry["mtime"] != mtime:
+            dirs, files = [], []
+            with os.scandir(root / reldir) as entries:
+                for dirent in entries:
+                    (dirs if dirent.is_dir() else files).append(dirent.name)
+            entry = {"mtime": mtime, "dirs": sorted(dirs), "files": sorted(files)}
+
+        snapshot[reldir] = entry
+        pending += [os.path.normpath(os.path.join(reldir, d)) for d in entry["dirs"]]
+    return snapshot
+
+
 def dict2html(indict, table_id):
     """Convert a dictionary into an HTML table."""
     rows = sorted(unfold_columns(indict))
@@ -241,7 +512,12 @@ def unfold_columns(indict, prefix=None, delimiter="_"):
     ['nested', 'key1', 'sub2', 'val3']]
 
     """
-    prefix = listify(prefix) if prefix is not None else []
+    if prefix is None:
+        prefix = []
+    elif isinstance(prefix, str):
+        prefix = [prefix]
+    else:
+        prefix = list(prefix)
     keys = sorted(set(list(indict.keys())))
 
     data = []
@@ -266,3 +542,180 @@ def unfold_columns(indict, prefix=None, delimiter="_"):
                 data += unfold_columns(subdict[skey], prefix=prefix + [skey])
 
     return data
+
+
+def stat_files(*paths):
+    """
+    Record the size and modification time of files.
+
+    Parameters
+    ----------
+    paths : :obj:`str` or :obj:`~pathlib.Path`
+        Files, or folders that are traversed recursively. Paths that do not exist
+        are ignored.
+
+    Returns
+    -------
+    stats : :obj:`dict`
+        A mapping of absolute file paths to a list ``[size, mtime]``, where ``mtime``
+        is given in nanoseconds.
+
+    Examples
+    --------
+    >>> root = Path(tmpdir) / 'stat_files'
+    >>> (root / 'figures').mkdir(parents=True)
+    >>> _ = (root / 'figures' / 'sub-01_dseg.svg').write_text('<svg/>')
+    >>> stats = stat_files(root, root / 'missing.txt')
+    >>> [(Path(path).name, size) for path, (size, _) in stats.items()]
+    [('sub-01_dseg.svg', 6)]
+
+    """
+    stats = {}
+    for path in paths:
+        path = Path(path).absolute()
+        if path.is_file():
+            stat = path.stat()
+            stats[str(path)] = [stat.st_size, stat.st_mtime_ns]
+            continue
+
+        for dirpath, _, filenames in os.walk(path):
+            for fname in sorted(filenames):
+                fpath = os.path.join(dirpath, fname)
+                try:
+                    stat = os.stat(fpath)
+                except FileNotFoundError:  # Removed while traversing
+                    continue
+                stats[fpath] = [stat.st_size, stat.st_mtime_ns]
+    return stats
+
+
+# The FICLONE ioctl of Linux, which clones a file sharing its data blocks (reflink)
+FICLONE = 0x40049409
+
+
+def _hash_file(path, chunk_size=1 << 20):
+    digest = hashlib.blake2b()
+    with open(path, "rb") as f:
+        while chunk := f.read(chunk_size):
+            digest.update(chunk)
+    return digest.digest()
+
+
+def _reflink(src, dst):
+    import fcntl
+
+    with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+        fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+
+
+def place_file(src, dst):
+    """
+    Place a file in its final location, avoiding copying data when possible.
+
+    The destination is kept if it already has the same size and contents as the source.
+    Otherwise, the file is hard-linked, reflinked (on filesystems supporting
+    copy-on-write clones), or copied, whichever succeeds first.
+
+    Parameters
+    ----------
+    src : :obj:`str` or :obj:`~pathlib.Path`
+        The file to be placed.
+    dst : :obj:`str` or :obj:`~pathlib.Path`
+        The destination path. Parent folders are created as necessary.
+
+    Returns
+    -------
+    method : :obj:`str`
+        One of ``"kept"``, ``"linked"``, ``"reflinked"``, or ``"copied"``.
+
+    Examples
+    --------
+    >>> src = Path(tmpdir) / 'place_file' / 'sub-01_dseg.svg'
+    >>> src.parent.mkdir()
+    >>> _ = src.write_text('<svg/>')
+    >>> place_file(src, src.parent / 'out' / src.name)
+    'linked'
+    >>> place_file(src, src.parent / 'out' / src.name)
+    'kept'
+
+    """
+    src, dst = Path(src), Path(dst)
+    if dst.exists():
+        if os.path.samefile(src, dst) or (
+            src.stat().st_size == dst.stat().st_size and _hash_file(src) == _hash_file(dst)
+        ):
+            return "kept"
+    if dst.is_symlink() or dst.exists():
+        dst.unlink()
+
+    dst.parent.mkdir(parents=True, exist_ok=True)
+    try:
+        os.link(src, dst)
+        return "linked"
+    except OSError:
+        pass
+
+    try:
+        _reflink(src, dst)
+        return "reflinked"
+    except (ImportError, OSError):
+        dst.unlink(missing_ok=True)
+
+    shutil.copyfile(src, dst)
+    return "copied"
+
+
+def place_figures(figures, max_workers=None):
+    """
+    Place figures in their final location concurrently (see :func:`place_file`).
+
+    Placing figures is bound by I/O (particularly on network filesystems), and
+    therefore runs on a pool of threads.
+
+    Parameters
+    ----------
+    figures : :obj:`list` of :obj:`tuple`
+        Pairs of source and destination paths. Repeated destinations are placed once.
+    max_workers : :obj:`int`
+        Number of threads (by default, as set by
+        :obj:`~concurrent.futures.ThreadPoolExecutor`).
+
+    Returns
+    -------
+    methods : :obj:`dict`
+        A mapping of destination paths to the method used to place them.
+
+    """
+    figures = dict((Path(dst), Path(src)) for src, dst in figures)
+    if not figures:
+        return {}
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        methods = pool.map(lambda dst: place_file(figures[dst], dst), figures)
+        return dict(zip(figures, methods))
+
+
+@contextmanager
+def timed(record, key):
+    """
+    Accumulate the wall time (in seconds) spent within the context into ``record[key]``.
+
+    Nothing is recorded if ``record`` is ``None``, so that timing can be made optional.
+
+    Examples
+    --------
+    >>> record = {}
+    >>> with timed(record, 'render'):
+    ...     pass
+    >>> record['render'] >= 0
+    True
+    >>> with timed(None, 'render'):
+    ...     pass
+
+    """
+    start = perf_counter()
+    try:
+        yield
+    finally:
+        if record is not None:
+            record[key] = record.get(key, 0.0) + perf_counter() - start
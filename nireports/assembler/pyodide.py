@@ -22,4 +22,230 @@
 #
 # STATEMENT OF CHANGES: This file was ported carrying over full git history from niworkflows,
 # another NiPreps project licensed under the Apache-2.0 terms, and has been changed since.
-"""An assembler that runs in the browser."""
+"""
+An assembler that runs in the browser.
+
+Instead of rendering the HTML of every report in advance, the server side may write
+a compact JSON index of the reportlets of each subject (see :func:`write_index`),
+which a web browser turns into the report on demand, running :func:`render_index`
+with `Pyodide <https://pyodide.org>`__.
+The viewer (see :func:`write_viewer`) is a static page that loads Pyodide, this
+module, the report template and the index of the subject given in the URL
+(e.g., ``viewer.html?subject=01``).
+
+This module is executed in the browser, and therefore it must not import any
+dependency other than *Jinja2* at the module level.
+
+"""
+import json
+from pathlib import Path
+
+# The name under which the viewer loads this module in the browser
+VIEWER_MODULE = "nireports_pyodide.py"
+
+
+def _drop_empty(indict):
+    return {key: value for key, value in indict.items() if value not in (None, "", [], {})}
+
+
+def report_index(report):
+    """
+    Describe an indexed report with the minimal information to render it.
+
+    Figures are referenced by their path (relative to the report) and entities,
+    whereas HTML reportlets (e.g., summaries and errors) are inlined.
+
+    Parameters
+    ----------
+    report : :obj:`~nireports.assembler.report.Report`
+        A report, which has been indexed (i.e., it was not skipped as up to date).
+
+    Returns
+    -------
+    index : :obj:`dict`
+        A JSON-serializable description of the report.
+
+    """
+    from nireports import __version__
+    from nireports.assembler.reportlet import SVG_SNIPPET, _FigureSnippet
+
+    if report.up_to_date:
+        raise RuntimeError(
+            f"Report <{report.out_filename}> was not indexed (it is up to date)."
+        )
+
+    sections = []
+    for section in report.sections:
+        reportlets = []
+        for reportlet in section.reportlets:
+            components = []
+            for contents, caption in reportlet.components:
+                if isinstance(contents, _FigureSnippet):
+                    component = {
+                        "figure": Path(contents.anchor).as_posix(),
+                        "static": contents.static,
+                        "entities": contents.entities,
+                    }
+                else:
+                    component = {"html": str(contents)}
+                components.append(_drop_empty({**component, "caption": caption}))
+
+            reportlets.append(
+                _drop_empty(
+                    {
+                        "name": reportlet.name,
+                        "title": reportlet.title,
+                        "subtitle": reportlet.subtitle,
+                        "description": reportlet.description,
+                        "components": components,
+                    }
+                )
+            )
+
+        sections.append(
+            _drop_empty(
+                {
+                    "name": section.name,
+                    "title": section.title,
+                    "isnested": section.isnested,
+                    "reportlets": reportlets,
+                }
+            )
+        )
+
+    return {
+        "version": __version__,
+        "snippets": SVG_SNIPPET,
+        "sections": sections,
+    }
+
+
+def write_index(report, filename=None):
+    """
+    Write the index of a report (see :func:`report_index`) as compact JSON.
+
+    Parameters
+    ----------
+    report : :obj:`~nireports.assembler.report.Report`
+        An indexed report.
+    filename : :obj:`str` or :obj:`~pathlib.Path`
+        The path of the index (by default, that of the report with extension ``.json``).
+
+    Returns
+    -------
+    filename : :obj:`~pathlib.Path`
+        The path of the index.
+
+    """
+    filename = Path(filename or report.out_filename.with_suffix(".json"))
+    filename.parent.mkdir(parents=True, exist_ok=True)
+    filename.write_text(
+        json.dumps(report_index(report), separators=(",", ":"), default=str)
+    )
+    return filename
+
+
+def render_index(index, template):
+    """
+    Render the HTML of a report from its index.
+
+    The result is identical to the report generated by
+    :meth:`~nireports.assembler.report.Report.generate_report`.
+
+    Parameters
+    ----------
+    index : :obj:`dict` or :obj:`str`
+        The index of the report (see :func:`report_index`), possibly as JSON.
+    template : :obj:`str`
+        The *Jinja2* template of the report.
+
+    Returns
+    -------
+    html : :obj:`str`
+        The report.
+
+    Examples
+    --------
+    .. testsetup::
+
+       >>> from pkg_resources import resource_filename as pkgrf
+       >>> from nireports.assembler.report import Report
+       >>> test_data_path = Path(pkgrf('nireports', 'assembler/data/tests/work'))
+       >>> template = Path(pkgrf('nireports.assembler', 'data/report.tpl')).read_text()
+
+    >>> report = Report(
+    ...     Path(tmpdir) / 'out',
+    ...     'fakeuuid',
+    ...     reportlets_dir=test_data_path / 'reportlets' / 'nireports',
+    ...     subject_id='01',
+    ... )
+    >>> report.generate_report()
+    0
+    >>> index = write_index(report).read_text()
+    >>> render_index(index, template) == report.out_filename.read_text()
+    True
+
+    """
+    import jinja2
+
+    if isinstance(index, str):
+        index = json.loads(index)
+
+    snippets = index["snippets"]
+    sections = [
+        {
+            **section,
+            "reportlets": [
+                {
+                    **reportlet,
+                    "components": [
+                        (
+                            snippets[component.get("static", False)].format(component["figure"])
+                            if "figure" in component
+                            else component.get("html"),
+                            component.get("caption"),
+                        )
+                        for component in reportlet.get("components", [])
+                    ],
+                }
+                for reportlet in section.get("reportlets", [])
+            ],
+        }
+        for section in index["sections"]
+    ]
+
+    env = jinja2.Environment(trim_blocks=True, lstrip_blocks=True, autoescape=False)
+    return env.from_string(template).render(sections=sections)
+
+
+def write_viewer(out_dir, template=None):
+    """
+    Write the viewer of reports rendered in the browser.
+
+    The viewer (``viewer.html``) is written along with this module and the template,
+    which the viewer loads from the same folder as the indexes of reports.
+
+    Parameters
+    ----------
+    out_dir : :obj:`str` or :obj:`~pathlib.Path`
+        The folder where indexes of reports are written.
+    template : :obj:`str` or :obj:`~pathlib.Path`
+        The *Jinja2* template of reports (by default, that of *NiReports*).
+
+    Returns
+    -------
+    viewer : :obj:`~pathlib.Path`
+        The path of the viewer.
+
+    """
+    from pkg_resources import resource_filename as pkgrf
+
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    template = Path(template or pkgrf("nireports.assembler", "data/report.tpl"))
+    (out_dir / "report.tpl").write_text(template.read_text())
+    (out_dir / VIEWER_MODULE).write_text(Path(__file__).read_text())
+
+    viewer = out_dir / "viewer.html"
+    viewer.write_text(Path(pkgrf("nireports.assembler", "data/viewer.html")).read_text())
+    return viewer
@@ -23,28 +23,181 @@
 # STATEMENT OF CHANGES: This file was ported carrying over full git history from niworkflows,
 # another NiPreps project licensed under the Apache-2.0 terms, and has been changed since.
 """Core objects representing reports."""
+import json
+import logging
 import re
 from collections import defaultdict
 from itertools import compress
 from pathlib import Path
+from time import perf_counter
 from yaml import safe_load as load
 
 import jinja2
-from bids.layout import BIDSLayout, BIDSLayoutIndexer, add_config_paths
-from bids.utils import listify
+import numpy as np
+import pandas as pd
 from pkg_resources import resource_filename as pkgrf
 
+from nireports import __version__
+from nireports.assembler.index import filter_files, load_index
+from nireports.assembler.misc import place_figures, snapshot_tree, stat_files, timed
 from nireports.assembler.reportlet import Reportlet
 
+PLURAL_SUFFIX = defaultdict(str("s").format, [("echo", "es")])
 
-# Add a new figures spec
-try:
-    add_config_paths(figures=pkgrf("nireports.assembler", "data/nipreps.json"))
-except ValueError as e:
-    if "Configuration 'figures' already exists" != str(e):
-        raise
+LOGGER = logging.getLogger("nireports.assembler")
 
-PLURAL_SUFFIX = defaultdict(str("s").format, [("echo", "es")])
+# Compiled templates shared by all reports, keyed by path and bytecode cache folder
+_TEMPLATES = {}
+
+
+def init_layout(root, cache_dir=None, indexer="pybids"):
+    """
+    Index the reportlets found under ``root``.
+
+    Building the layout is the most expensive step of indexing a report, and one
+    layout can be shared by the reports of all subjects found under ``root``
+    (see :func:`~nireports.assembler.tools.generate_reports`).
+
+    When a ``cache_dir`` is given, the index is stored on disk and reused by
+    subsequent calls as long as no files were added to, removed from,
+    or renamed within ``root``.
+    Because reportlets are indexed by their path only, rewriting the contents of an
+    existing reportlet does not invalidate the cache.
+
+    Parameters
+    ----------
+    root : :obj:`str` or :obj:`~pathlib.Path`
+        The folder containing the reportlets.
+    cache_dir : :obj:`str` or :obj:`~pathlib.Path`
+        A folder where the index is persisted across executions.
+    indexer : :obj:`str`
+        Either ``"pybids"`` (default) to build a :obj:`~bids.layout.BIDSLayout`
+        (cached as a *PyBIDS* database), or ``"fast"`` to build a
+        :obj:`~nireports.assembler.index.ReportletIndex`, which does not
+        require importing *PyBIDS*, and whose cache only lists again the
+        folders that changed.
+
+    Returns
+    -------
+    layout : :obj:`~bids.layout.BIDSLayout` or :obj:`~nireports.assembler.index.ReportletIndex`
+        A layout following the ``figures`` specification.
+
+    """
+    if indexer == "fast":
+        return load_index(root, cache_dir=cache_dir)
+
+    if indexer != "pybids":
+        raise ValueError(f"Unknown indexer <{indexer}>.")
+
+    from bids.layout import BIDSLayout, BIDSLayoutIndexer, add_config_paths
+
+    # Add a new figures spec
+    try:
+        add_config_paths(figures=pkgrf("nireports.assembler", "data/nipreps.json"))
+    except ValueError as e:
+        if "Configuration 'figures' already exists" != str(e):
+            raise
+
+    _indexer = BIDSLayoutIndexer(
+        config_filename=pkgrf("nireports.assembler", "data/nipreps.json"),
+        index_metadata=False,
+        validate=False,
+    )
+    if cache_dir is None:
+        return BIDSLayout(
+            root,
+            config="figures",
+            indexer=_indexer,
+            validate=False,
+        )
+
+    root = Path(root).absolute()
+    database_path = Path(cache_dir) / "layout"
+    snapshot_file = database_path / "snapshot.json"
+
+    cached = {}
+    if snapshot_file.exists():
+        cached = json.loads(snapshot_file.read_text())
+        if cached.get("root") != str(root):
+            cached = {}
+
+    snapshot = snapshot_tree(root, previous=cached.get("tree"))
+    reset_database = snapshot != cached.get("tree")
+    if reset_database:
+        snapshot_file.unlink(missing_ok=True)
+
+    layout = BIDSLayout(
+        root,
+        config="figures",
+        indexer=_indexer,
+        validate=False,
+        database_path=database_path,
+        reset_database=reset_database,
+    )
+
+    if reset_database:
+        database_path.mkdir(parents=True, exist_ok=True)
+        snapshot_file.write_text(json.dumps({"root": str(root), "tree": snapshot}))
+    return layout
+
+
+def get_template(template_path, cache_dir=None):
+    """
+    Load and compile a report template, reusing previous compilations.
+
+    Templates are compiled once per process, and compiled again only when the
+    modification time of the template changes.
+    When a ``cache_dir`` is given, the compiled bytecode is also stored on disk, so that
+    other processes (e.g., the workers of
+    :func:`~nireports.assembler.tools.generate_reports`) do not compile it again.
+
+    Parameters
+    ----------
+    template_path : :obj:`str` or :obj:`~pathlib.Path`
+        The path to the *Jinja2* template.
+    cache_dir : :obj:`str` or :obj:`~pathlib.Path`
+        A folder where the bytecode of compiled templates is persisted
+        (in a ``jinja2`` subfolder).
+
+    Returns
+    -------
+    template : :obj:`jinja2.Template`
+        The compiled template.
+
+    Examples
+    --------
+    >>> template_path = Path(pkgrf("nireports.assembler", "data/report.tpl"))
+    >>> get_template(template_path) is get_template(template_path)
+    True
+
+    >>> bytecode_dir = Path(tmpdir) / 'cache'
+    >>> get_template(template_path, cache_dir=bytecode_dir) is get_template(template_path)
+    False
+    >>> len(list((bytecode_dir / 'jinja2').glob('*.cache')))
+    1
+
+    """
+    template_path = Path(template_path).absolute()
+    mtime = template_path.stat().st_mtime_ns
+    key = (str(template_path), None if cache_dir is None else str(cache_dir))
+
+    cached = _TEMPLATES.get(key)
+    if cached is None or cached[0] != mtime:
+        bytecode_cache = None
+        if cache_dir is not None:
+            bytecode_dir = Path(cache_dir) / "jinja2"
+            bytecode_dir.mkdir(parents=True, exist_ok=True)
+            bytecode_cache = jinja2.FileSystemBytecodeCache(str(bytecode_dir))
+
+        env = jinja2.Environment(
+            loader=jinja2.FileSystemLoader(searchpath=str(template_path.parent)),
+            trim_blocks=True,
+            lstrip_blocks=True,
+            autoescape=False,
+            bytecode_cache=bytecode_cache,
+        )
+        cached = _TEMPLATES[key] = (mtime, env.get_template(template_path.name))
+    return cached[1]
 
 
 class SubReport:
@@ -93,7 +246,7 @@ class Report:
     >>> robj.generate_report()
     0
     >>> len((output_dir / 'nireports' / 'sub-01.html').read_text())
-    40464
+    41717
 
     Test including a crashfile
 
@@ -106,7 +259,7 @@ class Report:
     >>> robj.generate_report()
     0
     >>> len((output_dir / 'nireports' / 'sub-02.html').read_text())
-    43704
+    44957
 
     Test including a boilerplate
 
@@ -119,7 +272,74 @@ class Report:
     >>> robj.generate_report()
     0
     >>> len((output_dir / 'nireports' / 'sub-03.html').read_text())
-    92639
+    93892
+
+    Test sharing one layout across reports
+
+    >>> layout = init_layout(testdir / 'work' / 'reportlets' / 'nireports')
+    >>> robj = Report(
+    ...     output_dir / 'shared',
+    ...     'madeoutuuid',
+    ...     subject_id='01',
+    ...     reportlets_dir=testdir / 'work' / 'reportlets' / 'nireports',
+    ...     layout=layout,
+    ... )
+    >>> robj.generate_report()
+    0
+    >>> len((output_dir / 'shared' / 'sub-01.html').read_text())
+    41717
+
+    Test profiling, which records timings next to the report
+
+    >>> robj = Report(
+    ...     output_dir / 'profiled',
+    ...     'madeoutuuid',
+    ...     subject_id='01',
+    ...     reportlets_dir=testdir / 'work' / 'reportlets' / 'nireports',
+    ...     profile=True,
+    ... )
+    >>> robj.generate_report()
+    0
+    >>> timings = json.loads((output_dir / 'profiled' / 'sub-01.timings.json').read_text())
+    >>> sorted(timings)
+    ['figures', 'figures_placed', 'layout', 'query', 'render', 'sections', 'template']
+    >>> [section['name'] for section in timings['sections']][:2]
+    ['Summary', 'Anatomical']
+    >>> sorted(timings['sections'][1]['reportlets'][0])
+    ['components', 'figures', 'name', 'time']
+
+    Test an incremental build, which is skipped while the inputs do not change
+
+    >>> robj = Report(
+    ...     output_dir / 'incremental',
+    ...     'madeoutuuid',
+    ...     subject_id='01',
+    ...     reportlets_dir=testdir / 'work' / 'reportlets' / 'nireports',
+    ...     incremental=True,
+    ... )
+    >>> robj.up_to_date, robj.generate_report()
+    (False, 0)
+    >>> (output_dir / 'incremental' / 'sub-01.manifest.json').exists()
+    True
+    >>> Report(
+    ...     output_dir / 'incremental',
+    ...     'madeoutuuid',
+    ...     subject_id='01',
+    ...     reportlets_dir=testdir / 'work' / 'reportlets' / 'nireports',
+    ...     incremental=True,
+    ... ).up_to_date
+    True
+
+    A new run of the pipeline (with a different run UUID) does not trigger a rebuild
+
+    >>> Report(
+    ...     output_dir / 'incremental',
+    ...     'anotheruuid',
+    ...     subject_id='01',
+    ...     reportlets_dir=testdir / 'work' / 'reportlets' / 'nireports',
+    ...     incremental=True,
+    ... ).up_to_date
+    True
 
     """
 
@@ -131,6 +351,11 @@ class Report:
         out_filename="report.html",
         reportlets_dir=None,
         subject_id=None,
+        layout=None,
+        cache_dir=None,
+        indexer="pybids",
+        incremental=False,
+        profile=False,
     ):
         out_dir = Path(out_dir)
         root = Path(reportlets_dir or out_dir)
@@ -143,6 +368,7 @@ class Report:
 
         # Initialize structuring elements
         self.sections = []
+        self.timings = {"sections": []} if profile else None
 
         bootstrap_file = Path(config or pkgrf("nireports.assembler", "data/default.yml"))
 
@@ -162,6 +388,7 @@ class Report:
         settings = load("\n".join(bootstrap_text))
 
         # Set the output path
+        self.out_dir = out_dir
         self.out_filename = Path(out_filename)
         if not self.out_filename.is_absolute():
             self.out_filename = Path(out_dir) / self.out_filename
@@ -174,108 +401,297 @@ class Report:
         )
 
         if not self.template_path.is_absolute():
-            self.template_path = bootstrap_file / self.template_file
+            self.template_path = bootstrap_file.parent / self.template_path
 
         assert self.template_path.exists()
 
         settings["root"] = root
         settings["out_dir"] = out_dir
         settings["run_uuid"] = run_uuid
+        settings["cache_dir"] = cache_dir
+        self.cache_dir = cache_dir
+        settings["indexer"] = indexer
 
         if subject_id is not None:
             settings["bids_filters"] = {
-                "subject": listify(subject_id),
+                "subject": [subject_id],
             }
-        self.index(settings)
 
-    def index(self, config):
+        # Skip indexing (and rendering) if none of the inputs changed since the last build
+        self.manifest_file = self.out_filename.with_suffix(".manifest.json")
+        self.manifest = None
+        if incremental:
+            if layout is None:
+                with timed(self.timings, "layout"):
+                    layout = init_layout(root, cache_dir=cache_dir, indexer=indexer)
+            self.manifest = self._build_manifest(settings, bootstrap_file, layout)
+
+        self.up_to_date = (
+            self.manifest is not None
+            and self.out_filename.exists()
+            and self.manifest_file.exists()
+            and json.loads(self.manifest_file.read_text()) == self.manifest
+        )
+        if not self.up_to_date:
+            self.index(settings, layout=layout)
+
+    def index(self, config, layout=None):
         """
         Traverse the reports config definition and instantiate reportlets.
 
-        This method also places figures in their final location.
+        This method also places figures in their final location (see
+        :func:`~nireports.assembler.misc.place_figures`).
+
+        Parameters
+        ----------
+        config : :obj:`dict`
+            The report settings.
+        layout : :obj:`~bids.layout.BIDSLayout` or :obj:`~nireports.assembler.index.ReportletIndex`
+            A layout indexing the reportlets under ``config["root"]``, possibly shared with
+            other reports. If ``None``, a new layout is initialized with
+            :func:`init_layout` (reusing the index cached in ``config["cache_dir"]``,
+            when set, and with the indexer given by ``config["indexer"]``).
+
         """
-        # Initialize a BIDS layout
-        _indexer = BIDSLayoutIndexer(
-            config_filename=pkgrf("nireports.assembler", "data/nipreps.json"),
-            index_metadata=False,
-            validate=False,
-        )
-        layout = BIDSLayout(
-            config["root"],
-            config="figures",
-            indexer=_indexer,
-            validate=False,
-        )
+        if layout is None:
+            with timed(self.timings, "layout"):
+                layout = init_layout(
+                    config["root"],
+                    cache_dir=config.get("cache_dir"),
+                    indexer=config.get("indexer", "pybids"),
+                )
 
         bids_filters = config.get("bids_filters", {})
         out_dir = Path(config["out_dir"])
-        for subrep_cfg in config["sections"]:
-            # First determine whether we need to split by some ordering
-            # (ie. sessions / tasks / runs), which are separated by commas.
-            orderings = [s for s in subrep_cfg.get("ordering", "").strip().split(",") if s]
-            entities, list_combos = self._process_orderings(orderings, layout.get(**bids_filters))
-
-            if not list_combos:  # E.g. this is an anatomical reportlet
-                reportlets = [
-                    Reportlet(layout, config=cfg, out_dir=out_dir, bids_filters=bids_filters)
-                    for cfg in subrep_cfg["reportlets"]
-                ]
-                list_combos = subrep_cfg.get("nested", False)
-            else:
-                # Do not use dictionary for queries, as we need to preserve ordering
-                # of ordering columns.
-                reportlets = []
-                for c in list_combos:
-                    # do not display entities with the value None.
-                    c_filt = list(filter(None, c))
-                    ent_filt = list(compress(entities, c))
-                    # Set a common title for this particular combination c
-                    title = "Reports for: %s." % ", ".join(
-                        [
-                            '%s <span class="bids-entity">%s</span>' % (ent_filt[i], c_filt[i])
-                            for i in range(len(c_filt))
-                        ]
+
+        # Query the layout only once: reportlets are then selected from these files in memory.
+        # Reportlets using regular expressions query the layout themselves, as their filters
+        # may match files excluded by ``bids_filters``.
+        with timed(self.timings, "query"):
+            hits = layout.get(**bids_filters)
+            # Tabulate the entities of all hits only once, for the orderings of all sections
+            table = self._entity_table(
+                hits,
+                list(
+                    dict.fromkeys(
+                        entity
+                        for subrep_cfg in config["sections"]
+                        for entity in subrep_cfg.get("ordering", "").strip().split(",")
+                        if entity
                     )
-                    for cfg in subrep_cfg["reportlets"]:
-                        cfg["bids"].update({entities[i]: c[i] for i in range(len(c))})
-                        rlet = Reportlet(
-                            layout,
-                            config=cfg,
-                            out_dir=out_dir,
-                            bids_filters=bids_filters,
-                        )
-                        if not rlet.is_empty():
-                            rlet.title = title
-                            title = None
-                            reportlets.append(rlet)
-
-            # Filter out empty reportlets
-            reportlets = [r for r in reportlets if not r.is_empty()]
-            if reportlets:
-                sub_report = SubReport(
-                    subrep_cfg["name"],
-                    isnested=bool(list_combos),
-                    reportlets=reportlets,
-                    title=subrep_cfg.get("title"),
+                ),
+            )
+
+        for subrep_cfg in config["sections"]:
+            section_timings = None
+            if self.timings is not None:
+                section_timings = {"name": subrep_cfg["name"], "reportlets": []}
+                self.timings["sections"].append(section_timings)
+
+            with timed(section_timings, "time"):
+                self._index_section(
+                    subrep_cfg, layout, hits, table, out_dir, bids_filters, section_timings
                 )
-                self.sections.append(sub_report)
+
+        # Place all figures once indexing finished, concurrently
+        figures = [
+            figure
+            for section in self.sections
+            for reportlet in section.reportlets
+            for figure in reportlet.figures
+        ]
+        with timed(self.timings, "figures"):
+            place_figures(figures)
+        if self.timings is not None:
+            self.timings["figures_placed"] = len(figures)
+
+    def _new_reportlet(self, section_timings, *args, **kwargs):
+        """Create a :obj:`Reportlet`, recording how long it took when profiling."""
+        start = perf_counter()
+        reportlet = Reportlet(*args, **kwargs)
+        if section_timings is not None:
+            section_timings["reportlets"].append(
+                {
+                    "name": getattr(reportlet, "name", None),
+                    "time": perf_counter() - start,
+                    "components": len(reportlet.components),
+                    "figures": len(reportlet.figures),
+                }
+            )
+        return reportlet
+
+    def _index_section(
+        self, subrep_cfg, layout, hits, table, out_dir, bids_filters, section_timings
+    ):
+        """Instantiate the reportlets of one section of the report."""
+        # First determine whether we need to split by some ordering
+        # (ie. sessions / tasks / runs), which are separated by commas.
+        orderings = [s for s in subrep_cfg.get("ordering", "").strip().split(",") if s]
+        entities, list_combos = self._process_orderings(orderings, table)
+
+        if not list_combos:  # E.g. this is an anatomical reportlet
+            reportlets = [
+                self._new_reportlet(
+                    section_timings,
+                    layout,
+                    config=cfg,
+                    out_dir=out_dir,
+                    bids_filters=bids_filters,
+                    files=None if cfg.get("bids", {}).get("regex_search") else hits,
+                    copy_figures=False,
+                )
+                for cfg in subrep_cfg["reportlets"]
+            ]
+            list_combos = subrep_cfg.get("nested", False)
+        else:
+            # Select the files of each reportlet once, and split them by combination
+            grouped = []
+            for cfg in subrep_cfg["reportlets"]:
+                if cfg["bids"].get("regex_search"):
+                    grouped.append(None)
+                    continue
+
+                query = {k: v for k, v in cfg["bids"].items() if k not in entities}
+                groups = defaultdict(list)
+                for bidsfile in filter_files(hits, **query):
+                    entity_values = bidsfile.get_entities()
+                    groups[tuple(entity_values.get(e) for e in entities)].append(bidsfile)
+                grouped.append(groups)
+
+            # Do not use dictionary for queries, as we need to preserve ordering
+            # of ordering columns.
+            reportlets = []
+            for c in list_combos:
+                # do not display entities with the value None.
+                c_filt = list(filter(None, c))
+                ent_filt = list(compress(entities, c))
+                # Set a common title for this particular combination c
+                title = "Reports for: %s." % ", ".join(
+                    [
+                        '%s <span class="bids-entity">%s</span>' % (ent_filt[i], c_filt[i])
+                        for i in range(len(c_filt))
+                    ]
+                )
+                for cfg, groups in zip(subrep_cfg["reportlets"], grouped):
+                    if groups is not None and c not in groups:
+                        continue
+
+                    rlet = self._new_reportlet(
+                        section_timings,
+                        layout,
+                        config={
+                            **cfg,
+                            "bids": {**cfg["bids"], **dict(zip(entities, c))},
+                        },
+                        out_dir=out_dir,
+                        bids_filters=bids_filters,
+                        files=None if groups is None else groups[c],
+                        copy_figures=False,
+                    )
+                    if not rlet.is_empty():
+                        rlet.title = title
+                        title = None
+                        reportlets.append(rlet)
+
+        # Filter out empty reportlets
+        reportlets = [r for r in reportlets if not r.is_empty()]
+        if reportlets:
+            sub_report = SubReport(
+                subrep_cfg["name"],
+                isnested=bool(list_combos),
+                reportlets=reportlets,
+                title=subrep_cfg.get("title"),
+            )
+            self.sections.append(sub_report)
+
+    def _build_manifest(self, settings, config_file, layout):
+        """
+        Describe the inputs of the report, to determine whether it must be rebuilt.
+
+        The manifest records the size and modification time of every file that may
+        end up in the report (reportlets, crashfiles, boilerplate and bibliography),
+        of the template and the configuration file, as well as the final settings
+        (regardless of the run UUID).
+
+        """
+        inputs = [f.path for f in layout.get(**settings.get("bids_filters", {}))]
+        for subrep_cfg in settings["sections"]:
+            for cfg in subrep_cfg["reportlets"]:
+                if "path" in cfg:
+                    inputs.append(cfg["path"])
+                if cfg.get("custom") == "boilerplate":
+                    bibfile = cfg.get("bibfile", ["nireports", "data/bibliography.bib"])
+                    inputs.append(pkgrf(*bibfile))
+
+        # Pipelines assign a new run UUID to every run, which must not trigger a rebuild.
+        # Paths containing it (e.g., of crashfiles) are stat-ed among the inputs instead.
+        run_uuid = settings.get("run_uuid")
+        settings_text = json.dumps(
+            {key: value for key, value in settings.items() if key != "run_uuid"}, default=str
+        )
+        if run_uuid:
+            settings_text = settings_text.replace(str(run_uuid), "{run_uuid}")
+
+        return {
+            "version": __version__,
+            # Round-trip through JSON so that the manifest compares equal to its stored copy
+            "settings": json.loads(settings_text),
+            "files": stat_files(config_file, self.template_path, *inputs),
+        }
 
     def generate_report(self):
         """Once the Report has been indexed, the final HTML can be generated"""
-        env = jinja2.Environment(
-            loader=jinja2.FileSystemLoader(searchpath=str(self.template_path.parent)),
-            trim_blocks=True,
-            lstrip_blocks=True,
-            autoescape=False,
-        )
-        report_tpl = env.get_template(self.template_path.name)
-        report_render = report_tpl.render(sections=self.sections)
+        if self.up_to_date:
+            return 0
+
+        with timed(self.timings, "template"):
+            report_tpl = get_template(self.template_path, cache_dir=self.cache_dir)
 
-        # Write out report
+        # Stream the report to disk chunk by chunk, instead of rendering it in memory.
+        # Write to a temporary file first, so that a failure never leaves a partial report.
         self.out_filename.parent.mkdir(parents=True, exist_ok=True)
-        self.out_filename.write_text(report_render, encoding="UTF-8")
+        tmp_filename = self.out_filename.with_name(f".{self.out_filename.name}.tmp")
+        with timed(self.timings, "render"):
+            report_stream = report_tpl.stream(sections=self.sections)
+            report_stream.enable_buffering(size=64)
+            report_stream.dump(str(tmp_filename), encoding="UTF-8")
+        tmp_filename.replace(self.out_filename)
+
+        if self.manifest is not None:
+            self.manifest_file.write_text(json.dumps(self.manifest, indent=2))
+
+        if self.timings is not None:
+            timings_json = json.dumps(self.timings, indent=2)
+            self.out_filename.with_suffix(".timings.json").write_text(timings_json)
+            LOGGER.debug("Timings of report <%s>:\n%s", self.out_filename, timings_json)
         return 0
 
+    @staticmethod
+    def _entity_table(hits, entities=None):
+        """
+        Tabulate the entities of the output of a BIDS query.
+
+        Examples
+        --------
+        >>> from nireports.assembler.index import ReportletFile
+        >>> hits = [
+        ...     ReportletFile('sub-01_run-1_bold.svg', {'subject': '01', 'run': 1}),
+        ...     ReportletFile('sub-01_bold.svg', {'subject': '01'}),
+        ... ]
+        >>> Report._entity_table(hits).values.tolist()
+        [['01', 1], ['01', None]]
+        >>> Report._entity_table(hits, ['run', 'echo']).values.tolist()
+        [[1, None], [None, None]]
+
+        """
+        entity_dicts = [bids_file.get_entities() for bids_file in hits]
+        if entities is None:
+            entities = list(dict.fromkeys(k for d in entity_dicts for k in d))
+        return pd.DataFrame(
+            {k: pd.Series([d.get(k) for d in entity_dicts], dtype=object) for k in entities},
+            columns=entities,
+        )
+
     @staticmethod
     def _process_orderings(orderings, hits):
         """
@@ -285,8 +701,10 @@ class Report:
         ---------
         orderings : :obj:`list` of :obj:`list` of :obj:`str`
             Sections prescribing an ordering to select across sessions, acquisitions, runs, etc.
-        hits : :obj:`list`
-            The output of a BIDS query of the layout
+        hits : :obj:`list` or :obj:`~pandas.DataFrame`
+            The output of a BIDS query of the layout, or the table of their entities
+            (see :meth:`_entity_table`), which is faster when processing several
+            orderings over the same hits.
 
         Returns
         -------
@@ -296,30 +714,48 @@ class Report:
             Unique value combinations for the entities
 
         """
-        # get a set of all unique entity combinations
-        all_value_combos = {
-            tuple(bids_file.get_entities().get(k, None) for k in orderings) for bids_file in hits
-        }
-        # remove the all None member if it exists
-        none_member = tuple([None for k in orderings])
-        if none_member in all_value_combos:
-            all_value_combos.remove(tuple([None for k in orderings]))
-        # see what values exist for each entity
-        unique_values = [
-            {value[idx] for value in all_value_combos} for idx in range(len(orderings))
-        ]
+        table = hits if isinstance(hits, pd.DataFrame) else Report._entity_table(hits, orderings)
+
+        # encode the values of each entity as integers, where 0 stands for None
+        uniques, codes = [], []
+        for k in orderings:
+            column_codes, column_uniques = (
+                pd.factorize(table[k]) if k in table else (np.full(len(table), -1), [])
+            )
+            uniques.append(list(np.asarray(column_uniques, dtype=object)))
+            codes.append(column_codes + 1)
+        codes = np.column_stack(codes) if codes else np.zeros((len(table), 0), dtype=int)
+
+        # get all unique entity combinations (as single integers, unless too many),
+        # and remove the all None member
+        dims = [len(values) + 1 for values in uniques]
+        if not dims:
+            combos = codes[:0]
+        elif np.prod(dims, dtype=float) < 2**62:
+            flat = np.unique(np.ravel_multi_index(codes.T, dims))
+            combos = np.column_stack(np.unravel_index(flat, dims))
+        else:
+            combos = np.unique(codes, axis=0)
+        combos = combos[combos.any(axis=1)]
         # if all values are None for an entity, we do not want to keep that entity
-        keep_idx = [
-            False if (len(val_set) == 1 and None in val_set) or not val_set else True
-            for val_set in unique_values
-        ]
+        keep_idx = combos.any(axis=0).tolist()
         # the "kept" entities
         entities = list(compress(orderings, keep_idx))
-        # the "kept" value combinations
-        value_combos = [tuple(compress(value_combo, keep_idx)) for value_combo in all_value_combos]
+        if not entities:
+            return entities, []
+
+        combos = combos[:, keep_idx]
+        uniques = [[None] + values for values in compress(uniques, keep_idx)]
+
         # sort the value combinations alphabetically from the first entity to the last entity
-        value_combos.sort(
-            key=lambda entry: tuple(str(value) if value is not None else "0" for value in entry)
-        )
+        ranks = [
+            np.unique(["0" if v is None else str(v) for v in values], return_inverse=True)[1]
+            for values in uniques
+        ]
+        order = np.lexsort([rank[combos[:, i]] for i, rank in enumerate(ranks)][::-1])
+        # the "kept" value combinations
+        value_combos = [
+            tuple(values[code] for values, code in zip(uniques, combo)) for combo in combos[order]
+        ]
 
         return entities, value_combos
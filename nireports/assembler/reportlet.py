@@ -27,10 +27,13 @@ from pathlib import Path
 from uuid import uuid4
 import re
 from pkg_resources import resource_filename as pkgrf
-from nipype.utils.filemanip import copyfile
-from nireports.assembler.misc import dict2html, read_crashfile
+from nireports.assembler.index import filter_files
+from nireports.assembler.misc import dict2html, place_figures, read_crashfiles
 
 
+# Static figures are loaded lazily by the browser. Dynamic figures are loaded right away,
+# unless the template defers them (as ``data/report.tpl`` does, until they are about to be
+# scrolled into view)
 SVG_SNIPPET = [
     """\
 <object class="svg-reportlet" type="image/svg+xml" data="./{0}">
@@ -42,7 +45,7 @@ reloading the report in your browser.</object>
 </div>
 """,
     """\
-<img class="svg-reportlet" src="./{0}" style="width: 100%" />
+<img class="svg-reportlet" src="./{0}" style="width: 100%" loading="lazy" />
 </div>
 <div class="elem-filename">
     Get figure file: <a href="./{0}" target="_blank">{0}</a>
@@ -50,6 +53,9 @@ reloading the report in your browser.</object>
 """,
 ]
 
+FIGURE_EXTENSIONS = (".svg", ".png", ".webp", ".avif")
+"""Extensions of the figure files embedded in reports, as SVG or raster images."""
+
 METADATA_ACCORDION_BLOCK = """\
 <div class="accordion accordion-flush" id="{metadata_id}">
 """
@@ -77,7 +83,7 @@ data-bs-parent="#{metadata_id}-{metadata_index}">
 
 ERROR_TEMPLATE = """
     <details>
-        <summary>Node Name: {node}</summary><br>
+        <summary>Node Name: {node}{repeats}</summary><br>
         <div>
             File: <code>{file}</code><br />
             Working Directory: <code>{node_dir}</code><br />
@@ -106,12 +112,52 @@ aria-labelledby="{anchor}-tab" tabindex="0">
 """
 
 
+class _FileContents:
+    """The contents of an HTML reportlet, which are only read when rendered."""
+
+    __slots__ = {"path": "The path of the HTML file."}
+
+    def __init__(self, path):
+        self.path = path
+
+    def __str__(self):
+        return Path(self.path).read_text().strip()
+
+
+def _has_contents(path, chunk_size=8192):
+    """Check whether a text file has anything but whitespace, reading only until it finds it."""
+    with open(path) as fileobj:
+        while chunk := fileobj.read(chunk_size):
+            if chunk.strip():
+                return True
+    return False
+
+
+class _FigureSnippet:
+    """The HTML embedding a figure, which is only formatted when rendered."""
+
+    __slots__ = {
+        "anchor": "The path of the figure, relative to the report.",
+        "static": "Whether the figure is embedded as a static image.",
+        "entities": "The entities of the figure file.",
+    }
+
+    def __init__(self, anchor, static=True, entities=None):
+        self.anchor = anchor
+        self.static = static
+        self.entities = entities or {}
+
+    def __str__(self):
+        return SVG_SNIPPET[self.static].format(self.anchor)
+
+
 class Reportlet:
     """
     A visual report atom (*reportlet*).
 
     A reportlet has title, description and a list of components with either an
-    HTML fragment or a path to an SVG file, and possibly a caption. This is a
+    HTML fragment or a path to an SVG file, and possibly a caption.
+    The HTML of components is only read (or formatted) when the report is rendered. This is a
     factory class to generate Reportlets reusing the layout from a ``Report``
     object.
 
@@ -146,7 +192,7 @@ class Reportlet:
     >>> r.name
     'datatype-figures_desc-reconall'
 
-    >>> r.components[0][0].startswith('<img')
+    >>> str(r.components[0][0]).startswith('<img')
     True
 
     >>> r = Reportlet(bl, out_dir=out_figs, config={
@@ -155,14 +201,14 @@ class Reportlet:
     >>> r.name
     'datatype-figures_desc-reconall'
 
-    >>> r.components[0][0].startswith('<object')
+    >>> str(r.components[0][0]).startswith('<object')
     True
 
     >>> r = Reportlet(bl, out_dir=out_figs, config={
     ...     'title': 'Some Title', 'bids': {'datatype': 'figures', 'desc': 'summary'},
     ...     'description': 'Some description'})
 
-    >>> r.components[0][0].startswith('<h3')
+    >>> str(r.components[0][0]).startswith('<h3')
     True
 
     >>> r.components[0][1] is None
@@ -172,11 +218,8 @@ class Reportlet:
     ...     'title': 'Some Title',
     ...     'bids': {'datatype': 'figures', 'space': '.*', 'regex_search': True},
     ...     'caption': 'Some description {space}'})
-    >>> sorted(r.components)[0][1]
-    'Some description MNI152NLin2009cAsym'
-
-    >>> sorted(r.components)[1][1]
-    'Some description MNI152NLin6Asym'
+    >>> sorted({caption for _, caption in r.components})
+    ['Some description MNI152NLin2009cAsym', 'Some description MNI152NLin6Asym']
 
     >>> r = Reportlet(bl, out_dir=out_figs, config={
     ...     'title': 'Some Title',
@@ -185,17 +228,44 @@ class Reportlet:
     >>> r.is_empty()
     True
 
+    Figures outside ``out_dir`` are placed there, unless ``copy_figures=False`` defers
+    that to the caller (e.g., to place the figures of a whole report concurrently):
+
+    >>> r = Reportlet(bl, out_dir=out_figs, copy_figures=False, config={
+    ...     'title': 'Some Title', 'bids': {'datatype': 'figures', 'desc': 'reconall'}},
+    ...     bids_filters={'subject': '01'})
+    >>> [dst.relative_to(out_figs).as_posix() for _, dst in r.figures]
+    ['nireports/sub-01/figures/sub-01_desc-reconall_T1w.svg']
+
+    Candidate files (e.g., the results of a broader query) can be provided, and then
+    the layout is not queried again:
+
+    >>> r = Reportlet(bl, out_dir=out_figs, config={
+    ...     'title': 'Some Title', 'bids': {'datatype': 'figures', 'desc': 'reconall'}},
+    ...     files=bl.get(subject='01', extension='.svg'))
+    >>> len(r.components)
+    1
+
     """
 
     __slots__ = {
         "components": "A list of visual elements for composite reportlets.",
         "description": "This reportlet's longer description.",
+        "figures": "Pairs of source and destination paths of figures to be placed.",
         "name": "A unique name for the reportlet (used to create HTML anchors).",
         "subtitle": "This reportlet's subtitle.",
         "title": "This reportlet's title.",
     }
 
-    def __init__(self, layout, config=None, out_dir=None, bids_filters=None):
+    def __init__(
+        self,
+        layout,
+        config=None,
+        out_dir=None,
+        bids_filters=None,
+        files=None,
+        copy_figures=True,
+    ):
         if not config:
             raise RuntimeError("Reportlet must have a config object")
 
@@ -207,6 +277,7 @@ class Reportlet:
         self.subtitle = config.get("subtitle")
         self.description = config.get("description")
         self.components = []
+        self.figures = []
 
         # Determine whether this is a "BIDS-type" reportlet (typically, an SVG file)
         if bidsquery := config.get("bids", {}):
@@ -216,8 +287,8 @@ class Reportlet:
                 "_".join("%s-%s" % i for i in sorted(bidsquery.items())),
             )
 
-            # Query the BIDS layout of reportlets
-            files = layout.get(**bidsquery)
+            # Query the BIDS layout of reportlets, or select from the files provided
+            files = layout.get(**bidsquery) if files is None else filter_files(files, **bidsquery)
 
             for bidsfile in files:
                 src = Path(bidsfile.path)
@@ -226,8 +297,9 @@ class Reportlet:
 
                 contents = None
                 if ext == ".html":
-                    contents = src.read_text().strip()
-                elif ext == ".svg":
+                    # Only check the file is not blank, its contents are read when rendered
+                    contents = _FileContents(src) if _has_contents(src) else None
+                elif ext in FIGURE_EXTENSIONS:
 
                     entities = dict(bidsfile.entities)
                     if desc_text:
@@ -239,11 +311,14 @@ class Reportlet:
                         html_anchor = src.relative_to(out_dir)
                     except ValueError:
                         html_anchor = src.relative_to(Path(layout.root))
-                        dst = out_dir / html_anchor
-                        dst.parent.mkdir(parents=True, exist_ok=True)
-                        copyfile(src, dst, copy=True, use_hardlink=True)
+                        self.figures.append((src, out_dir / html_anchor))
 
-                    contents = SVG_SNIPPET[config.get("static", True)].format(html_anchor)
+                    # Raster images cannot be animated, and are always embedded statically
+                    contents = _FigureSnippet(
+                        html_anchor,
+                        config.get("static", True) or ext != ".svg",
+                        entities=entities,
+                    )
 
                     # Our current implementations of dynamic reportlets do this themselves,
                     # however I'll leave the code here since this is potentially something we
@@ -262,6 +337,9 @@ class Reportlet:
 
                 if contents:
                     self.components.append((contents, desc_text))
+
+            if copy_figures:
+                place_figures(self.figures)
         elif metadata := config.get("metadata", False):
             meta_settings = config.get("settings", {})
             meta_id = meta_settings.get("id", f"meta-{uuid4()}")
@@ -290,11 +368,14 @@ class Reportlet:
                 self.name = "errors"
                 # Intepolate error log directory
                 error_dir = Path(path)
-                # Read in all crash files
-                errors = [
-                    read_crashfile(str(f), root=layout.root, root_replace="&lt;workdir&gt;")
-                    for f in error_dir.glob("crash*.*")
-                ]
+                # Read in all crash files, merging those with the same traceback
+                errors = read_crashfiles(
+                    sorted(str(f) for f in error_dir.glob("crash*.*")),
+                    root=layout.root,
+                    root_replace="&lt;workdir&gt;",
+                    max_length=config.get("max_length"),
+                    max_workers=config.get("nprocs"),
+                )
 
                 if not errors:
                     self.components.append(
@@ -306,10 +387,13 @@ class Reportlet:
                 else:
                     contents = [
                         '<p class="alert alert-danger" role="alert">'
-                        f"One or more execution steps failed ({len(errors)}). "
+                        "One or more execution steps failed "
+                        f"({sum(error['count'] for error in errors)}). "
                         "Error details are attached below.</p>",
                     ]
                     for error in errors:
+                        count = error.pop("count")
+                        error.pop("files")
                         contents.append(
                             ERROR_TEMPLATE.format(
                                 inputs="\n".join(
@@ -318,6 +402,7 @@ class Reportlet:
                                         for err_in in error.pop("inputs", {})
                                     ]
                                 ),
+                                repeats=f" (failed {count} times)" if count > 1 else "",
                                 **error,
                             )
                         )
@@ -0,0 +1,103 @@
+# emacs: -*- mode: python; py-indent-offset: 4; indent-tabs-mode: nil -*-
+# vi: set ft=python sts=4 ts=4 sw=4 et:
+#
+# Copyright 2023 The NiPreps Developers <nipreps@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# We support and encourage derived works from this project, please read
+# about our expectations at
+#
+#     https://www.nipreps.org/community/licensing/
+#
+"""Fixtures generating synthetic trees of reportlets."""
+from itertools import product
+
+import pytest
+from bids.layout.writing import build_path
+
+PATTERN = (
+    "sub-{subject}[/ses-{session}]/{datatype<figures>}/"
+    "sub-{subject}[_ses-{session}][_task-{task}][_acq-{acquisition}]"
+    "[_ce-{ceagent}][_dir-{direction}][_rec-{reconstruction}]"
+    "[_mod-{modality}][_run-{run}][_echo-{echo}][_space-{space}]"
+    "[_desc-{desc}]_{suffix<dseg|T1w|bold>}{extension<.svg>}"
+)
+
+SVG_STUB = '<svg xmlns="http://www.w3.org/2000/svg" width="8" height="8"></svg>\n'
+
+
+def generate_reportlets(
+    svg_dir,
+    subjects=("01",),
+    sessions=("1", "2"),
+    tasks=("t1", "t2", "t3"),
+    runs=("01", "02", None),
+    ceagents=("none", "Gd"),
+    echoes=(None,),
+    descs=("aroma", "bbregister", "carpetplot", "rois"),
+    anat_descs=(),
+):
+    """
+    Write a synthetic tree of functional (and optionally, anatomical) reportlets.
+
+    Odd sessions contain several runs of each task, and even sessions contain no runs
+    but several contrast agents (as in the *dMRIPrep* test data, see
+    https://github.com/nipreps/dmriprep/pull/59).
+    Reportlets are minimal SVG files, so that large trees are written quickly.
+
+    Returns
+    -------
+    paths : :obj:`list` of :obj:`~pathlib.Path`
+        The reportlets written.
+
+    """
+    combos = []
+    for i, session in enumerate(sessions):
+        if i % 2 == 0:
+            combos += product(subjects, [session], tasks, [None], runs, echoes, descs)
+        else:
+            combos += product(subjects, [session], tasks, ceagents, [None], echoes, descs)
+
+    entities = [
+        {
+            "subject": subject,
+            "session": session,
+            "task": task,
+            "ceagent": ce,
+            "run": run,
+            "echo": echo,
+            "desc": desc,
+            "suffix": "bold",
+        }
+        for subject, session, task, ce, run, echo, desc in combos
+    ]
+    entities += [
+        {"subject": subject, "desc": desc, "suffix": "T1w"}
+        for subject, desc in product(subjects, anat_descs)
+    ]
+
+    paths = []
+    for file_entities in entities:
+        file_entities.update({"datatype": "figures", "extension": ".svg"})
+        path = svg_dir / build_path(file_entities, PATTERN)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(SVG_STUB)
+        paths.append(path)
+    return paths
+
+
+@pytest.fixture(scope="session")
+def synthetic_reportlets():
+    """Provide :func:`generate_reportlets` to benchmarks."""
+    return generate_reportlets
@@ -0,0 +1,109 @@
+# emacs: -*- mode: python; py-indent-offset: 4; indent-tabs-mode: nil -*-
+# vi: set ft=python sts=4 ts=4 sw=4 et:
+#
+# Copyright 2023 The NiPreps Developers <nipreps@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# We support and encourage derived works from this project, please read
+# about our expectations at
+#
+#     https://www.nipreps.org/community/licensing/
+#
+"""
+Benchmarks of the report assembler on synthetic trees of reportlets.
+
+These benchmarks require *pytest-benchmark*, and are best run without parallelism::
+
+    pytest -n 0 --benchmark-only nireports/assembler/tests/test_benchmarks.py
+
+The sizes of the trees are set by the environment variable
+``NIREPORTS_BENCHMARK_SUBJECTS`` (a comma-separated list of numbers of subjects).
+Benchmarks are skipped unless that variable is set or ``--benchmark-only`` is given,
+so that they do not slow down the default test runs (where ``-n auto`` disables
+*pytest-benchmark* anyway).
+
+"""
+import os
+from pathlib import Path
+
+import pytest
+from pkg_resources import resource_filename as pkgrf
+from yaml import safe_load as load
+
+from nireports.assembler.index import ReportletIndex
+from nireports.assembler.report import Report
+
+pytest.importorskip("pytest_benchmark")
+
+SIZES = [int(n) for n in os.getenv("NIREPORTS_BENCHMARK_SUBJECTS", "1,8").split(",")]
+
+
+@pytest.fixture(scope="module", autouse=True)
+def opt_in(request):
+    """Skip benchmarks (before building any tree) unless they were requested."""
+    if not (
+        os.getenv("NIREPORTS_BENCHMARK_SUBJECTS")
+        or request.config.getoption("benchmark_only", False)
+    ):
+        pytest.skip("set NIREPORTS_BENCHMARK_SUBJECTS or pass --benchmark-only to benchmark")
+
+
+@pytest.fixture(scope="module", params=SIZES, ids=[f"{n}subjects" for n in SIZES])
+def reportlets_dir(request, tmp_path_factory, synthetic_reportlets):
+    svg_dir = tmp_path_factory.mktemp("benchmark") / "nireports"
+    synthetic_reportlets(
+        svg_dir,
+        subjects=[f"{i:03d}" for i in range(1, request.param + 1)],
+        echoes=("1", "2", "3"),
+        anat_descs=("brain", "reconall"),
+    )
+    return svg_dir
+
+
+@pytest.mark.parametrize("indexer", ["pybids", "fast"])
+def test_index(benchmark, reportlets_dir, tmp_path, indexer):
+    report = benchmark.pedantic(
+        Report,
+        args=(tmp_path, "fakeuuid"),
+        kwargs={"reportlets_dir": reportlets_dir, "subject_id": "001", "indexer": indexer},
+        rounds=3,
+    )
+    assert report.sections
+
+
+def test_process_orderings(benchmark, reportlets_dir):
+    settings = load(Path(pkgrf("nireports.assembler", "data/default.yml")).read_text())
+    orderings = next(s for s in settings["sections"] if s["name"] == "Functional")
+    hits = ReportletIndex(reportlets_dir).get()
+
+    entities, combos = benchmark(
+        Report._process_orderings, orderings["ordering"].split(","), hits
+    )
+    assert entities == ["session", "task", "ceagent", "run", "echo"]
+    assert combos
+
+
+@pytest.mark.parametrize("indexer", ["pybids", "fast"])
+def test_generate_report(benchmark, reportlets_dir, tmp_path, indexer):
+    def _run():
+        return Report(
+            tmp_path,
+            "fakeuuid",
+            reportlets_dir=reportlets_dir,
+            subject_id="001",
+            indexer=indexer,
+        ).generate_report()
+
+    assert benchmark.pedantic(_run, rounds=3) == 0
+    assert (tmp_path / "sub-001.html").exists()
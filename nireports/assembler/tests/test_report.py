@@ -24,7 +24,11 @@
 # another NiPreps project licensed under the Apache-2.0 terms, and has been changed since.
 """Exercising the visual report system (VRS)."""
 import os
+import re
+import shutil
+import tarfile
 import tempfile
+import zipfile
 from itertools import product
 from pathlib import Path
 
@@ -35,7 +39,14 @@ from bids.layout.writing import build_path
 from pkg_resources import resource_filename as pkgrf
 from yaml import safe_load as load
 
-from nireports.assembler.report import Report
+from nireports.assembler import misc as _misc, report as _report, tools as _tools
+from nireports.assembler.export import export_report
+from nireports.assembler.index import ReportletIndex
+from nireports.assembler.misc import place_figures, read_crashfiles
+from nireports.assembler.pyodide import render_index
+from nireports.assembler.report import Report, init_layout
+from nireports.assembler.reportlet import Reportlet
+from nireports.assembler.tools import generate_reports
 
 
 @pytest.fixture()
@@ -219,6 +230,10 @@ def test_process_orderings_large(
     layout = BIDSLayout(Path(bids_sessions), config="figures", validate=False)
     entities, value_combos = report._process_orderings(orderings, layout.get())
 
+    # A table of entities tabulated once gives the same result
+    table = Report._entity_table(layout.get())
+    assert report._process_orderings(orderings, table) == (entities, value_combos)
+
     if not value_combos:
         value_combos = [None]
 
@@ -277,6 +292,31 @@ def test_generated_reportlets(bids_sessions, ordering):
         assert reportlets_num < expected_reportlets_num == out_figs
 
 
+def test_index_queries(bids_sessions, tmp_path):
+    """Reportlets are selected from a single query, unless they use regular expressions."""
+    layout = init_layout(Path(bids_sessions) / "nireports")
+    queries = []
+
+    class CountingLayout:
+        root = layout.root
+
+        def get(self, **query):
+            queries.append(query)
+            return layout.get(**query)
+
+    report = Report(
+        tmp_path / "nireports",
+        "fakeuuid",
+        reportlets_dir=Path(bids_sessions) / "nireports",
+        subject_id="01",
+        layout=CountingLayout(),
+    )
+    assert len(queries) == 2
+    assert queries[0] == {"subject": ["01"]}
+    assert queries[1]["regex_search"]
+    assert sum(len(section.reportlets) for section in report.sections) > 0
+
+
 @pytest.mark.parametrize(
     "subject_id,out_html",
     [
@@ -301,3 +341,429 @@ def test_subject_id(tmp_path, subject_id, out_html):
         subject_id=subject_id,
     )
     assert report.out_filename.name == out_html
+
+
+@pytest.mark.parametrize("indexer", ["pybids", "fast"])
+@pytest.mark.parametrize("nprocs", [1, 2])
+def test_generate_reports(tmp_path, nprocs, indexer):
+    """Check serial and parallel executions, with either indexer, produce the same reports."""
+    work_dir = Path(pkgrf("nireports", os.path.join("assembler", "data", "tests", "work")))
+    subjects = ["01", "02", "03"]
+
+    assert generate_reports(
+        subjects,
+        tmp_path / "parallel",
+        "fakeuuid",
+        work_dir=work_dir,
+        nprocs=nprocs,
+        indexer=indexer,
+    ) == 0
+
+    for subject in subjects:
+        Report(
+            tmp_path / "serial",
+            "fakeuuid",
+            reportlets_dir=work_dir / "reportlets",
+            subject_id=subject,
+        ).generate_report()
+
+        assert (tmp_path / "parallel" / f"sub-{subject}.html").read_text() == (
+            tmp_path / "serial" / f"sub-{subject}.html"
+        ).read_text()
+
+
+def test_generate_reports_shared_layout(tmp_path, monkeypatch):
+    """Check the reportlets are indexed only once for all subjects."""
+    work_dir = Path(pkgrf("nireports", os.path.join("assembler", "data", "tests", "work")))
+    roots = []
+    init_layout = _report.init_layout
+
+    def _init_layout(root, **kwargs):
+        roots.append(root)
+        return init_layout(root, **kwargs)
+
+    monkeypatch.setattr(_tools, "init_layout", _init_layout)
+    monkeypatch.setattr(_report, "init_layout", _init_layout)
+
+    assert generate_reports(["01", "02", "03"], tmp_path, "fakeuuid", work_dir=work_dir) == 0
+    assert roots == [work_dir / "reportlets"]
+
+
+def test_init_layout_cache(tmp_path):
+    """Check the on-disk index is reused until reportlets are added."""
+    reportlets_dir = tmp_path / "reportlets"
+    shutil.copytree(
+        pkgrf("nireports", os.path.join("assembler", "data", "tests", "work", "reportlets")),
+        reportlets_dir,
+    )
+    cache_dir = tmp_path / "cache"
+
+    layout = _report.init_layout(reportlets_dir, cache_dir=cache_dir)
+    assert layout.connection_manager._database_reset
+    nfiles = len(layout.get())
+
+    # Warm run: the cached database is loaded as is
+    layout = _report.init_layout(reportlets_dir, cache_dir=cache_dir)
+    assert not layout.connection_manager._database_reset
+    assert len(layout.get()) == nfiles
+
+    # Rewriting an existing reportlet does not invalidate the index
+    svg = next((reportlets_dir / "nireports" / "sub-01" / "figures").glob("*.svg"))
+    svg.write_text(svg.read_text())
+    layout = _report.init_layout(reportlets_dir, cache_dir=cache_dir)
+    assert not layout.connection_manager._database_reset
+
+    # Adding a new reportlet does
+    shutil.copy(svg, svg.parent / "sub-01_desc-new_T1w.svg")
+    layout = _report.init_layout(reportlets_dir, cache_dir=cache_dir)
+    assert layout.connection_manager._database_reset
+    assert len(layout.get()) == nfiles + 1
+    assert len(layout.get(desc="new")) == 1
+
+
+@pytest.mark.parametrize(
+    "query",
+    [
+        {},
+        {"subject": "01"},
+        {"session": "2", "task": "t1"},
+        {"run": 1},
+        {"run": [None, 2], "session": "1"},
+        {"ceagent": None},
+        {"desc": "carpet", "regex_search": True},
+        {"extension": [".svg"], "suffix": "BOLD", "regex_search": True},
+    ],
+)
+def test_reportlet_index(bids_sessions, query):
+    """Check the fast indexer finds the same files and entities as PyBIDS."""
+    layout = _report.init_layout(Path(bids_sessions) / "nireports")
+    index = ReportletIndex(Path(bids_sessions) / "nireports")
+
+    expected = layout.get(**query)
+    files = index.get(**query)
+    assert [f.path for f in files] == [f.path for f in expected]
+    assert [f.get_entities() for f in files] == [f.get_entities() for f in expected]
+    assert _orderings(files) == _orderings(expected)
+
+
+def _orderings(files):
+    return Report._process_orderings(["session", "task", "ceagent", "run"], files)
+
+
+def test_incremental(tmp_path):
+    """Reports are only rebuilt for the subjects whose inputs changed."""
+    work_dir = tmp_path / "work"
+    shutil.copytree(pkgrf("nireports", "assembler/data/tests/work"), work_dir)
+    out_dir = tmp_path / "out"
+    reports = [out_dir / f"sub-{subject}.html" for subject in ("01", "02")]
+
+    def _build():
+        return generate_reports(
+            ["01", "02"], out_dir, "fakeuuid", work_dir=work_dir, incremental=True
+        )
+
+    assert _build() == 0
+    mtimes = [report.stat().st_mtime_ns for report in reports]
+
+    assert _build() == 0
+    assert [report.stat().st_mtime_ns for report in reports] == mtimes
+
+    # Rewrite one figure of the second subject
+    figures_dir = work_dir / "reportlets" / "nireports" / "sub-02" / "figures"
+    figure = sorted(figures_dir.glob("*.svg"))[0]
+    figure.write_text(figure.read_text())
+    os.utime(figure, ns=(figure.stat().st_atime_ns, figure.stat().st_mtime_ns + 10**9))
+
+    assert _build() == 0
+    assert reports[0].stat().st_mtime_ns == mtimes[0]
+    assert reports[1].stat().st_mtime_ns != mtimes[1]
+
+
+def test_place_figures(tmp_path):
+    """Figures are placed once, and replaced only when their contents change."""
+    src_dir, dst_dir = tmp_path / "src", tmp_path / "dst"
+    src_dir.mkdir()
+    figures = []
+    for i in range(4):
+        (src_dir / f"fig{i}.svg").write_text(f"<svg>{i}</svg>")
+        figures.append((src_dir / f"fig{i}.svg", dst_dir / f"fig{i}.svg"))
+
+    methods = place_figures(figures + figures[:1])
+    assert sorted(methods) == [dst for _, dst in figures]
+    assert set(methods.values()) <= {"linked", "reflinked", "copied"}
+    assert set(place_figures(figures).values()) == {"kept"}
+
+    # A stale copy with the same size but different contents is replaced
+    dst = figures[0][1]
+    dst.unlink()
+    dst.write_text("<svg>9</svg>")
+    assert place_figures(figures[:1])[dst] != "kept"
+    assert dst.read_text() == "<svg>0</svg>"
+
+
+def test_watch_reports(tmp_path):
+    """Reports are rebuilt only for subjects whose reportlets change."""
+    from threading import Thread
+    from time import sleep
+
+    work_dir = tmp_path / "work"
+    shutil.copytree(pkgrf("nireports", "assembler/data/tests/work"), work_dir)
+    out_dir = tmp_path / "out"
+    reports = [out_dir / f"sub-{subject}.html" for subject in ("01", "02")]
+
+    watcher = Thread(
+        target=_tools.watch_reports,
+        args=(out_dir, "fakeuuid"),
+        kwargs={
+            "subject_list": ["01", "sub-02"],
+            "work_dir": work_dir,
+            "interval": 0.1,
+            "debounce": 0.5,
+            "timeout": 5,
+            "group_index": True,
+            "page_size": 5,
+        },
+    )
+    watcher.start()
+    while not all(report.exists() for report in reports):
+        sleep(0.1)
+    mtimes = [report.stat().st_mtime_ns for report in reports]
+
+    # A new reportlet lands for the second subject
+    figures_dir = work_dir / "reportlets" / "nireports" / "sub-02" / "figures"
+    new_figure = figures_dir / "sub-02_task-newtask_desc-rois_bold.svg"
+    shutil.copy(figures_dir / "sub-02_task-faketask_desc-rois_bold.svg", new_figure)
+    watcher.join()
+
+    assert not (out_dir / "sub-03.html").exists()
+    assert reports[0].stat().st_mtime_ns == mtimes[0]
+    assert reports[1].stat().st_mtime_ns != mtimes[1]
+    assert new_figure.name in reports[1].read_text()
+
+    # The group-level index is kept up to date with the watched subjects
+    html = (out_dir / "index.html").read_text()
+    assert "const PAGE_SIZE = 5;" in html
+    assert '"report":"sub-02.html","reportlets":36' in html
+    assert '"report":"sub-03.html"' not in html
+
+
+def test_lazy_contents(tmp_path):
+    """HTML reportlets are read when the report is rendered, not when it is indexed."""
+    reportlets_dir = tmp_path / "reportlets"
+    shutil.copytree(pkgrf("nireports", "assembler/data/tests/work/reportlets"), reportlets_dir)
+    summary = reportlets_dir / "nireports" / "sub-01" / "figures" / "sub-01_desc-summary_T1w.html"
+
+    report = Report(
+        tmp_path / "out",
+        "fakeuuid",
+        reportlets_dir=reportlets_dir / "nireports",
+        subject_id="01",
+    )
+    summary.write_text("<p>Updated after indexing</p>")
+    report.generate_report()
+    assert "<p>Updated after indexing</p>" in (tmp_path / "out" / "sub-01.html").read_text()
+
+
+def test_blank_html_reportlet(tmp_path):
+    """HTML reportlets holding only whitespace are dropped."""
+    figures_dir = tmp_path / "sub-01" / "figures"
+    figures_dir.mkdir(parents=True)
+    summary = figures_dir / "sub-01_desc-summary_T1w.html"
+    config = {"bids": {"desc": "summary", "suffix": "T1w"}}
+
+    summary.write_text(" \n\t\n")
+    assert Reportlet(ReportletIndex(tmp_path), config=config, out_dir=tmp_path).is_empty()
+
+    summary.write_text("\n<p>Summary</p>\n")
+    reportlet = Reportlet(ReportletIndex(tmp_path), config=config, out_dir=tmp_path)
+    assert [str(contents) for contents, _ in reportlet.components] == ["<p>Summary</p>"]
+
+
+def test_errors_reportlet(tmp_path):
+    """Crashfiles with the same traceback are merged, and long tracebacks truncated."""
+    log_dir = tmp_path / "sub-01" / "log" / "fakeuuid"
+    log_dir.mkdir(parents=True)
+    crashfile = Path(pkgrf("nireports", "assembler/data/tests/crashfile.txt"))
+    for i in range(3):
+        shutil.copy(crashfile, log_dir / f"crash-{i:02d}.txt")
+
+    config = {"custom": "errors", "path": str(log_dir), "title": "Errors"}
+    layout = ReportletIndex(tmp_path)
+    html = Reportlet(layout, config=config, out_dir=tmp_path).components[0][0]
+    assert "One or more execution steps failed (3)" in html
+    assert html.count("<details>") == 1
+    assert "(failed 3 times)" in html
+
+    config["max_length"] = 100
+    html = Reportlet(layout, config=config, out_dir=tmp_path).components[0][0]
+    assert "characters truncated ...]" in html
+    assert "which has no identity" in html
+
+
+def test_read_crashfiles_serially(monkeypatch):
+    """Small crashfiles are read without starting a pool of processes."""
+
+    def _no_pool(*args, **kwargs):
+        raise AssertionError("No pool should be started")
+
+    monkeypatch.setattr(_misc, "ProcessPoolExecutor", _no_pool)
+    crashfile = Path(pkgrf("nireports", "assembler/data/tests/crashfile.txt"))
+    errors = read_crashfiles([crashfile] * 3)
+    assert [error["count"] for error in errors] == [3]
+
+
+def test_read_pickled_crashfiles(tmp_path):
+    """Pickled crashfiles are read in worker processes, and their inputs bounded."""
+    from nipype.interfaces.utility import IdentityInterface
+    from nipype.pipeline.engine import Node
+    from nipype.utils.filemanip import savepkl
+
+    node = Node(IdentityInterface(fields=["in_files"]), name="big_node")
+    node.inputs.in_files = [f"/data/sub-{i:05d}_T1w.nii.gz" for i in range(100000)]
+    paths = []
+    for i in range(3):
+        paths.append(tmp_path / f"crash-{i:02d}.pklz")
+        savepkl(str(paths[-1]), {"node": node, "traceback": ["Traceback:\n", "ValueError: big\n"]})
+
+    errors = read_crashfiles(paths, root=tmp_path, max_length=100, max_workers=2)
+    assert len(errors) == 1
+    assert errors[0]["count"] == 3
+    assert errors[0]["node"] == "big_node"
+    ((name, value),) = errors[0]["inputs"]
+    assert name == "in_files"
+    assert value.startswith("['/data/sub-00000_T1w.nii.gz', ")
+    assert value.endswith("items truncated ...]")
+    assert len(value) < 200
+    assert errors[0]["traceback"] == "Traceback:\nValueError: big\n"
+
+
+@pytest.mark.parametrize("ext", [".png", ".webp", ".avif"])
+def test_raster_reportlet(tmp_path, ext):
+    """Raster figures are embedded as static images, even if the reportlet is dynamic."""
+    figures_dir = tmp_path / "sub-01" / "figures"
+    figures_dir.mkdir(parents=True)
+    (figures_dir / f"sub-01_desc-mosaic_T1w{ext}").write_bytes(b"")
+
+    config = {"bids": {"desc": "mosaic", "suffix": "T1w"}, "static": False}
+    layout = ReportletIndex(tmp_path)
+    snippet = str(Reportlet(layout, config=config, out_dir=tmp_path).components[0][0])
+    assert f'<img class="svg-reportlet" src="./sub-01/figures/sub-01_desc-mosaic_T1w{ext}"' in (
+        snippet
+    )
+
+
+def test_deferred_figures(tmp_path):
+    """Only templates that load dynamic figures themselves have them deferred."""
+    default = Path(pkgrf("nireports", "assembler/data/report.tpl")).read_text()
+    template = tmp_path / "custom.tpl"
+    template.write_text(re.sub(r"\{\{ elem\[0\] \|[^}]*\}\}", "{{ elem[0] }}", default))
+    config = tmp_path / "custom.yml"
+    config.write_text(
+        f"template_path: {template}\n"
+        + Path(pkgrf("nireports", "assembler/data/default.yml")).read_text()
+    )
+
+    reportlets_dir = Path(pkgrf("nireports", "assembler/data/tests/work/reportlets/nireports"))
+    html = {}
+    for name, report_config in (("default", None), ("custom", config)):
+        report = Report(
+            tmp_path / name,
+            "fakeuuid",
+            config=report_config,
+            reportlets_dir=reportlets_dir,
+            subject_id="01",
+        )
+        report.generate_report()
+        html[name] = report.out_filename.read_text()
+
+    dynamic = '<object class="svg-reportlet" type="image/svg+xml" '
+    assert f'{dynamic}data-src="./' in html["default"]
+    assert f'{dynamic}data="./' not in html["default"]
+    assert f'{dynamic}data="./' in html["custom"]
+    assert f'{dynamic}data-src="./' not in html["custom"]
+
+
+@pytest.mark.parametrize("suffix", [".zip", ".tar", ".tar.gz", ".tar.zst"])
+def test_export_report(tmp_path, suffix):
+    """Archives contain the report and exactly the figures it references."""
+    if suffix == ".tar.zst":
+        pytest.importorskip("zstandard")
+
+    report = Report(
+        tmp_path / "out",
+        "fakeuuid",
+        reportlets_dir=Path(pkgrf("nireports", "assembler/data/tests/work/reportlets/nireports")),
+        subject_id="01",
+    )
+    report.generate_report()
+    archive = export_report(report, tmp_path / f"sub-01{suffix}")
+
+    html = report.out_filename.read_text()
+    referenced = set(re.findall(r'(?:src|data)="\./([^"]+)"', html))
+    if suffix == ".zip":
+        with zipfile.ZipFile(archive) as zipf:
+            assert zipf.read("sub-01.html").decode() == html
+            names = zipf.namelist()
+    elif suffix == ".tar.zst":
+        import zstandard
+
+        with open(archive, "rb") as fileobj:
+            reader = zstandard.ZstdDecompressor().stream_reader(fileobj)
+            names = tarfile.open(fileobj=reader, mode="r|").getnames()
+    else:
+        names = tarfile.open(archive).getnames()
+
+    assert names[0] == "sub-01.html"
+    assert set(names[1:]) == referenced
+
+
+def test_browser_reports(tmp_path):
+    """Reports rendered from their index are identical to those generated up front."""
+    reportlets_dir = Path(pkgrf("nireports", "assembler/data/tests/work/reportlets"))
+    generate_reports(["01", "02"], tmp_path / "html", "fakeuuid", work_dir=reportlets_dir.parent)
+    generate_reports(
+        ["01", "02"],
+        tmp_path / "browser",
+        "fakeuuid",
+        work_dir=reportlets_dir.parent,
+        browser=True,
+    )
+
+    assert [f.name for f in (tmp_path / "browser").glob("*.html")] == ["viewer.html"]
+    template = (tmp_path / "browser" / "report.tpl").read_text()
+    for subject in ("01", "02"):
+        index = (tmp_path / "browser" / f"sub-{subject}.json").read_text()
+        html = (tmp_path / "html" / f"sub-{subject}.html").read_text()
+        assert render_index(index, template) == html
+
+
+def test_browser_reports_template(tmp_path):
+    """The viewer renders reports with the template configured for them."""
+    template = tmp_path / "custom.tpl"
+    template.write_text(
+        Path(pkgrf("nireports", "assembler/data/report.tpl"))
+        .read_text()
+        .replace("<body>", "<body>\n<p>Custom template</p>")
+    )
+    config = tmp_path / "custom.yml"
+    config.write_text(
+        "template_path: custom.tpl\n"
+        + Path(pkgrf("nireports", "assembler/data/default.yml")).read_text()
+    )
+
+    reportlets_dir = Path(pkgrf("nireports", "assembler/data/tests/work/reportlets"))
+    for out_dir, browser in (("html", False), ("browser", True)):
+        generate_reports(
+            ["01"],
+            tmp_path / out_dir,
+            "fakeuuid",
+            config=config,
+            work_dir=reportlets_dir.parent,
+            browser=browser,
+        )
+
+    html = (tmp_path / "html" / "sub-01.html").read_text()
+    assert "<p>Custom template</p>" in html
+    assert (tmp_path / "browser" / "report.tpl").read_text() == template.read_text()
+    index = (tmp_path / "browser" / "sub-01.json").read_text()
+    assert render_index(index, template.read_text()) == html
@@ -23,8 +23,27 @@
 # STATEMENT OF CHANGES: This file was ported carrying over full git history from niworkflows,
 # another NiPreps project licensed under the Apache-2.0 terms, and has been changed since.
 """Utilities for the :mod:`~nireports.assembler` module."""
+import json
+import logging
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from fnmatch import fnmatchcase
+from functools import partial
 from pathlib import Path
-from nireports.assembler.report import Report
+from time import monotonic, sleep
+
+from pkg_resources import resource_filename as pkgrf
+
+from nireports.assembler.index import ReportletIndex
+from nireports.assembler.misc import snapshot_tree
+from nireports.assembler.pyodide import write_index, write_viewer
+from nireports.assembler.report import Report, get_template, init_layout
+
+SUBJECT_REGEX = re.compile(r"(?:^|/)sub-([a-zA-Z0-9]+)")
+
+# Layout shared by all the subjects processed by a worker process
+_worker_layout = None
 
 
 def run_reports(
@@ -33,10 +52,21 @@ def run_reports(
     run_uuid,
     config=None,
     reportlets_dir=None,
+    layout=None,
+    cache_dir=None,
+    indexer="pybids",
+    incremental=False,
+    profile=False,
+    browser=False,
 ):
     """
     Run the reports.
 
+    With ``browser=True``, the index of the report (see
+    :func:`~nireports.assembler.pyodide.write_index`) is written instead of its HTML,
+    along with the viewer and the template of the report
+    (see :func:`~nireports.assembler.pyodide.write_viewer`).
+
     Examples
     --------
     .. testsetup::
@@ -53,13 +83,35 @@ def run_reports(
     0
 
     """
-    return Report(
+    report = Report(
         out_dir,
         run_uuid,
         config=config,
         subject_id=subject_label,
         reportlets_dir=reportlets_dir,
-    ).generate_report()
+        layout=layout,
+        cache_dir=cache_dir,
+        indexer=indexer,
+        incremental=incremental,
+        profile=profile,
+    )
+    if browser:
+        write_index(report)
+        # The viewer renders indexes with the template of the report
+        write_viewer(out_dir, template=report.template_path)
+        return 0
+    return report.generate_report()
+
+
+def _init_worker(root, cache_dir=None, indexer="pybids"):
+    """Index the reportlets once per worker process."""
+    global _worker_layout
+    _worker_layout = init_layout(root, cache_dir=cache_dir, indexer=indexer)
+
+
+def _run_worker(subject_label, **kwargs):
+    """Run the reports of one subject reusing the worker's layout."""
+    return run_reports(subject_label=subject_label, layout=_worker_layout, **kwargs)
 
 
 def generate_reports(
@@ -68,26 +120,88 @@ def generate_reports(
     run_uuid,
     config=None,
     work_dir=None,
+    nprocs=1,
+    cache_dir=None,
+    indexer="pybids",
+    incremental=False,
+    profile=False,
+    browser=False,
 ):
-    """Execute run_reports on a list of subjects."""
+    """
+    Execute run_reports on a list of subjects.
+
+    Parameters
+    ----------
+    subject_list : :obj:`list` of :obj:`str`
+        The participant labels for which reports are generated.
+    output_dir : :obj:`str` or :obj:`~pathlib.Path`
+        The folder where reports are written.
+    run_uuid : :obj:`str`
+        The unique identifier of the run.
+    config : :obj:`str` or :obj:`~pathlib.Path`
+        The report configuration file (YAML).
+    work_dir : :obj:`str` or :obj:`~pathlib.Path`
+        A working directory containing the ``reportlets`` folder.
+    nprocs : :obj:`int`
+        Number of subjects processed concurrently (in separate processes).
+        ``None`` uses all available CPUs, and ``1`` (default) runs serially.
+        The reportlets are indexed only once (once per process when running in
+        parallel), and the layout is shared across subjects.
+    cache_dir : :obj:`str` or :obj:`~pathlib.Path`
+        A folder where the index of reportlets is persisted, so that it is not
+        rebuilt in subsequent executions unless reportlets were added or removed.
+        The compiled report template is also cached there.
+    indexer : :obj:`str`
+        Either ``"pybids"`` (default) or ``"fast"`` to index reportlets with
+        :obj:`~nireports.assembler.index.ReportletIndex` instead of *PyBIDS*.
+    incremental : :obj:`bool`
+        Skip the subjects whose inputs did not change since their report was last
+        generated, as recorded by the manifest written next to each report.
+    profile : :obj:`bool`
+        Record the time spent indexing each section and reportlet, and rendering,
+        into a JSON file written next to each report (e.g., ``sub-01.timings.json``).
+    browser : :obj:`bool`
+        Write a compact JSON index of each report (e.g., ``sub-01.json``), which
+        ``viewer.html`` renders in the web browser (see :mod:`nireports.assembler.pyodide`),
+        instead of the HTML reports.
+
+    """
     reportlets_dir = None
     if work_dir is not None:
         reportlets_dir = Path(work_dir) / "reportlets"
-    report_errors = [
-        run_reports(
-            output_dir,
-            subject_label,
-            run_uuid,
-            config=config,
-            reportlets_dir=reportlets_dir,
-        )
-        for subject_label in subject_list
-    ]
+
+    root = reportlets_dir or output_dir
+    kwargs = {
+        "out_dir": output_dir,
+        "run_uuid": run_uuid,
+        "config": config,
+        "reportlets_dir": reportlets_dir,
+        "incremental": incremental,
+        "profile": profile,
+        "browser": browser,
+    }
+    nprocs = min(nprocs or os.cpu_count() or 1, len(subject_list))
+    if nprocs > 1:
+        if cache_dir is not None:
+            # Refresh the cached index once, before workers load it concurrently
+            init_layout(root, cache_dir=cache_dir, indexer=indexer)
+
+        # Layouts cannot be pickled, so each worker indexes the reportlets only once
+        with ProcessPoolExecutor(
+            max_workers=nprocs,
+            initializer=_init_worker,
+            initargs=(root, cache_dir, indexer),
+        ) as pool:
+            report_errors = list(pool.map(partial(_run_worker, **kwargs), subject_list))
+    else:
+        layout = init_layout(root, cache_dir=cache_dir, indexer=indexer) if subject_list else None
+        report_errors = [
+            run_reports(subject_label=subject_label, layout=layout, **kwargs)
+            for subject_label in subject_list
+        ]
 
     errno = sum(report_errors)
     if errno:
-        import logging
-
         logger = logging.getLogger("cli")
         error_list = ", ".join(
             "%s (%d)" % (subid, err) for subid, err in zip(subject_list, report_errors) if err
@@ -98,3 +212,268 @@ def generate_reports(
             error_list,
         )
     return errno
+
+
+def generate_group_report(
+    output_dir,
+    subject_list=None,
+    work_dir=None,
+    layout=None,
+    cache_dir=None,
+    indexer="pybids",
+    page_size=20,
+    browser=False,
+    out_filename="index.html",
+):
+    """
+    Write a group-level index of the reports of all subjects.
+
+    The index summarizes the reportlets of every subject, as found by the layout
+    that also indexes individual reports, and pages through subjects.
+    The report of each subject is only loaded when the reviewer opens it.
+
+    .. testsetup::
+
+       >>> from pkg_resources import resource_filename
+       >>> test_data_path = Path(resource_filename('nireports', 'assembler/data/tests/work'))
+
+    Parameters
+    ----------
+    output_dir : :obj:`str` or :obj:`~pathlib.Path`
+        The folder where reports are written.
+    subject_list : :obj:`list` of :obj:`str`
+        The participant labels to include (by default, all subjects with reportlets).
+    work_dir : :obj:`str` or :obj:`~pathlib.Path`
+        A working directory containing the ``reportlets`` folder.
+    layout : :obj:`~bids.layout.BIDSLayout` or :obj:`~nireports.assembler.index.ReportletIndex`
+        A layout indexing the reportlets, possibly shared with the reports of subjects.
+    cache_dir : :obj:`str` or :obj:`~pathlib.Path`
+        A folder where the index of reportlets is persisted (see :func:`generate_reports`).
+    indexer : :obj:`str`
+        Either ``"pybids"`` (default) or ``"fast"`` (see :func:`generate_reports`).
+    page_size : :obj:`int`
+        The number of subjects shown per page.
+    browser : :obj:`bool`
+        Whether reports are rendered in the browser (see :func:`generate_reports`).
+    out_filename : :obj:`str`
+        The name of the index, within ``output_dir``.
+
+    Returns
+    -------
+    out_filename : :obj:`~pathlib.Path`
+        The path of the index.
+
+    Examples
+    --------
+    >>> index = generate_group_report(tmpdir, work_dir=test_data_path, page_size=1)
+    >>> html = index.read_text()
+    >>> '"subject":"01","report":"sub-01.html","reportlets":34' in html
+    True
+    >>> [s for s in ('sub-01', 'sub-02', 'sub-03') if f'"report":"{s}.html"' in html]
+    ['sub-01', 'sub-02', 'sub-03']
+
+    >>> html = generate_group_report(
+    ...     tmpdir, subject_list=['sub-01', '03'], work_dir=test_data_path, browser=True
+    ... ).read_text()
+    >>> [s for s in ('01', '02', '03') if f'"report":"viewer.html?subject={s}"' in html]
+    ['01', '03']
+
+    """
+    output_dir = Path(output_dir)
+    root = Path(work_dir) / "reportlets" if work_dir is not None else output_dir
+    if layout is None:
+        layout = init_layout(root, cache_dir=cache_dir, indexer=indexer)
+
+    summaries = {}
+    for bidsfile in layout.get():
+        entities = bidsfile.get_entities()
+        if (subject := entities.get("subject")) is None:
+            continue
+        summary = summaries.setdefault(subject, {"reportlets": 0, "session": {}, "task": {}})
+        summary["reportlets"] += 1
+        for entity in ("session", "task"):
+            if entities.get(entity) is not None:
+                summary[entity][str(entities[entity])] = None
+
+    if subject_list is not None:
+        subject_list = [s[4:] if s.startswith("sub-") else s for s in subject_list]
+    subjects = [
+        {
+            "subject": subject,
+            "report": f"viewer.html?subject={subject}" if browser else f"sub-{subject}.html",
+            "reportlets": summary["reportlets"],
+            "sessions": list(summary["session"]),
+            "tasks": list(summary["task"]),
+        }
+        for subject, summary in sorted(summaries.items())
+        if subject_list is None or subject in subject_list
+    ]
+
+    template = get_template(Path(pkgrf("nireports.assembler", "data/group.tpl")))
+    out_filename = output_dir / out_filename
+    out_filename.parent.mkdir(parents=True, exist_ok=True)
+    out_filename.write_text(
+        template.render(
+            title=f"Reports of {len(subjects)} subjects",
+            subjects=subjects,
+            # Avoid closing the <script> element from within the JSON document
+            subjects_json=json.dumps(subjects, separators=(",", ":")).replace("</", "<\\/"),
+            page_size=page_size,
+        )
+    )
+    return out_filename
+
+
+def _changed_subjects(previous, snapshot):
+    """
+    Find the subjects with reportlets added, removed, or renamed between two snapshots.
+
+    Only changes within subject folders are considered, so that writing the reports
+    (e.g., ``sub-01.html`` at the top of the output folder) does not trigger updates.
+
+    Examples
+    --------
+    >>> previous = {
+    ...     '.': {'mtime': 1, 'dirs': ['sub-01'], 'files': []},
+    ...     'sub-01': {'mtime': 1, 'dirs': ['figures'], 'files': []},
+    ...     'sub-01/figures': {'mtime': 1, 'dirs': [], 'files': ['sub-01_dseg.svg']},
+    ... }
+    >>> snapshot = {
+    ...     '.': {'mtime': 2, 'dirs': ['sub-01', 'sub-02'], 'files': ['sub-01.html']},
+    ...     'sub-01': {'mtime': 1, 'dirs': ['figures'], 'files': []},
+    ...     'sub-01/figures': {'mtime': 1, 'dirs': [], 'files': ['sub-01_dseg.svg']},
+    ...     'sub-02': {'mtime': 2, 'dirs': [], 'files': []},
+    ... }
+    >>> _changed_subjects(previous, snapshot)
+    {'02'}
+    >>> _changed_subjects(snapshot, {'.': snapshot['.']}) == {'01', '02'}
+    True
+
+    """
+    return {
+        match.group(1)
+        for reldir in set(previous) | set(snapshot)
+        if previous.get(reldir) != snapshot.get(reldir)
+        and (match := SUBJECT_REGEX.search(reldir))
+    }
+
+
+def watch_reports(
+    output_dir,
+    run_uuid,
+    subject_list=None,
+    config=None,
+    work_dir=None,
+    interval=2.0,
+    debounce=5.0,
+    timeout=None,
+    incremental=False,
+    profile=False,
+    browser=False,
+    group_index=False,
+    page_size=20,
+):
+    """
+    Keep the reports up to date while reportlets are being generated.
+
+    The folder of reportlets is polled every ``interval`` seconds.
+    Only the folders that changed since the last poll are listed again (see
+    :func:`~nireports.assembler.misc.snapshot_tree`), and the reports of the subjects
+    with new (or removed) reportlets are rebuilt once writes settle for ``debounce``
+    seconds.
+    Each affected report is rebuilt in full (all of its sections are indexed and
+    rendered again), whereas the reports of other subjects are left untouched.
+    Reports are indexed with a :obj:`~nireports.assembler.index.ReportletIndex`
+    built from the same listing, so the folder is never traversed again in full,
+    and they are built serially, in the watching process.
+
+    Parameters
+    ----------
+    output_dir : :obj:`str` or :obj:`~pathlib.Path`
+        The folder where reports are written.
+    run_uuid : :obj:`str`
+        The unique identifier of the run.
+    subject_list : :obj:`list` of :obj:`str`
+        The participant labels (or shell-style patterns) for which reports are
+        generated (by default, all subjects found, including those appearing while
+        watching).
+    config : :obj:`str` or :obj:`~pathlib.Path`
+        The report configuration file (YAML).
+    work_dir : :obj:`str` or :obj:`~pathlib.Path`
+        A working directory containing the ``reportlets`` folder.
+    interval : :obj:`float`
+        Seconds between two polls of the folder.
+    debounce : :obj:`float`
+        Seconds without changes before the affected reports are rebuilt.
+    timeout : :obj:`float`
+        Stop watching after these many seconds (by default, watch until interrupted).
+    incremental : :obj:`bool`
+        Skip the reports whose inputs did not change (see :func:`generate_reports`).
+    profile : :obj:`bool`
+        Record the time spent building each report (see :func:`generate_reports`).
+    browser : :obj:`bool`
+        Write the indexes of reports and a viewer instead of the HTML reports
+        (see :func:`generate_reports`).
+    group_index : :obj:`bool`
+        Also update the group-level index (see :func:`generate_group_report`) after
+        reports are rebuilt.
+    page_size : :obj:`int`
+        The number of subjects shown per page of the group-level index.
+
+    Returns
+    -------
+    errno : :obj:`int`
+        The number of reports built with errors.
+
+    """
+    logger = logging.getLogger("cli")
+    root = Path(work_dir) / "reportlets" if work_dir is not None else Path(output_dir)
+    kwargs = {
+        "out_dir": output_dir,
+        "run_uuid": run_uuid,
+        "config": config,
+        "reportlets_dir": Path(work_dir) / "reportlets" if work_dir is not None else None,
+        "incremental": incremental,
+        "profile": profile,
+        "browser": browser,
+    }
+    patterns = [s[4:] if s.startswith("sub-") else s for s in subject_list or []]
+    snapshot = snapshot_tree(root)
+    pending = _changed_subjects({}, snapshot)
+    subjects = set()
+    last_change = None
+    errno = 0
+    start = monotonic()
+    try:
+        while timeout is None or monotonic() - start < timeout:
+            if subject_list is not None:
+                pending = {s for s in pending if any(fnmatchcase(s, p) for p in patterns)}
+
+            if pending and (last_change is None or monotonic() - last_change >= debounce):
+                layout = ReportletIndex(root, snapshot=snapshot)
+                for subject_label in sorted(pending):
+                    logger.info("Updating report of participant <%s>.", subject_label)
+                    errno += int(
+                        bool(run_reports(subject_label=subject_label, layout=layout, **kwargs))
+                    )
+                subjects |= pending
+                if group_index:
+                    generate_group_report(
+                        output_dir,
+                        subject_list=sorted(subjects),
+                        work_dir=work_dir,
+                        layout=layout,
+                        page_size=page_size,
+                        browser=browser,
+                    )
+                pending = set()
+
+            sleep(interval)
+            new_snapshot = snapshot_tree(root, previous=snapshot)
+            if changed := _changed_subjects(snapshot, new_snapshot):
+                pending |= changed
+                last_change = monotonic()
+            snapshot = new_snapshot
+    except KeyboardInterrupt:
+        pass
+    return errno
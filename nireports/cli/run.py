@@ -0,0 +1,256 @@
+# emacs: -*- mode: python; py-indent-offset: 4; indent-tabs-mode: nil -*-
+# vi: set ft=python sts=4 ts=4 sw=4 et:
+#
+# Copyright 2023 The NiPreps Developers <nipreps@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# We support and encourage derived works from this project, please read
+# about our expectations at
+#
+#     https://www.nipreps.org/community/licensing/
+#
+"""The ``nireports`` command-line tool, which assembles the reports of many subjects."""
+from argparse import ArgumentParser, ArgumentDefaultsHelpFormatter
+from collections import Counter
+from fnmatch import fnmatchcase
+from pathlib import Path
+from time import perf_counter
+
+
+def get_parser():
+    """Build the parser of command-line arguments."""
+    from nireports import __version__
+
+    parser = ArgumentParser(
+        prog="nireports",
+        description="Assemble the visual reports of a list of subjects.",
+        formatter_class=ArgumentDefaultsHelpFormatter,
+    )
+    parser.add_argument(
+        "output_dir",
+        type=Path,
+        help="The folder where reports are written (and where reportlets are found, "
+        "unless --work-dir is given).",
+    )
+    parser.add_argument("--version", action="version", version=f"nireports v{__version__}")
+    parser.add_argument(
+        "-w",
+        "--work-dir",
+        type=Path,
+        help="A working directory containing the reportlets in a 'reportlets' folder.",
+    )
+    parser.add_argument(
+        "--participant-label",
+        "--participant_label",
+        nargs="+",
+        help="One or more participant labels (the 'sub-' prefix can be omitted). "
+        "Labels can be shell-style patterns (e.g., '01*'), which are matched against "
+        "the subjects found among the reportlets. By default, all subjects are reported.",
+    )
+    parser.add_argument(
+        "--config",
+        type=Path,
+        help="The report configuration file (YAML).",
+    )
+    parser.add_argument("--run-uuid", help="The unique identifier of the run.")
+    parser.add_argument(
+        "--nprocs",
+        "--n-cpus",
+        type=int,
+        default=1,
+        help="Number of subjects processed concurrently (0 uses all available CPUs).",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        type=Path,
+        help="A folder to persist the index of reportlets across executions.",
+    )
+    parser.add_argument(
+        "--indexer",
+        choices=("pybids", "fast"),
+        help="The engine indexing the reportlets (pybids, unless given).",
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Skip subjects whose inputs did not change since their last report.",
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="Write the time spent on each section and reportlet next to each report.",
+    )
+    parser.add_argument(
+        "--browser",
+        action="store_true",
+        help="Write a compact index of each report instead of its HTML, and a viewer "
+        "(viewer.html?subject=<label>) that renders reports in the web browser.",
+    )
+    parser.add_argument(
+        "--group-index",
+        action="store_true",
+        help="Also write a group-level index (index.html) that pages through all subjects.",
+    )
+    parser.add_argument(
+        "--page-size",
+        type=int,
+        default=20,
+        help="Number of subjects per page of the group-level index (with --group-index).",
+    )
+    parser.add_argument(
+        "--watch",
+        action="store_true",
+        help="Keep running, and update the reports as new reportlets are written. "
+        "The report of each subject with new reportlets is rebuilt in full, serially "
+        "(--nprocs, --cache-dir and --indexer are not supported).",
+    )
+    parser.add_argument(
+        "--watch-interval",
+        type=float,
+        default=2.0,
+        help="Seconds between two checks for new reportlets (with --watch).",
+    )
+    parser.add_argument(
+        "--debounce",
+        type=float,
+        default=5.0,
+        help="Seconds without new reportlets before reports are updated (with --watch).",
+    )
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="Only index the reportlets and print some statistics.",
+    )
+    return parser
+
+
+def select_subjects(labels, available):
+    """
+    Resolve participant labels and patterns against the available subjects.
+
+    Examples
+    --------
+    >>> select_subjects(None, ['02', '01', '10'])
+    ['01', '02', '10']
+    >>> select_subjects(['sub-01', '1*'], ['02', '01', '10'])
+    ['01', '10']
+    >>> select_subjects(['03'], ['02', '01'])
+    ['03']
+
+    """
+    available = sorted(available)
+    if not labels:
+        return available
+
+    selected = []
+    for label in labels:
+        label = label[4:] if label.startswith("sub-") else label
+        if any(c in label for c in "*?["):
+            selected += [s for s in available if fnmatchcase(s, label)]
+        else:
+            selected.append(label)
+    return list(dict.fromkeys(selected))
+
+
+def main(argv=None):
+    """Entry point of the ``nireports`` command."""
+    from nireports.assembler.report import init_layout
+    from nireports.assembler.tools import (
+        generate_group_report,
+        generate_reports,
+        watch_reports,
+    )
+
+    parser = get_parser()
+    opts = parser.parse_args(argv)
+    root = opts.work_dir / "reportlets" if opts.work_dir else opts.output_dir
+
+    if opts.watch and not opts.dry_run:
+        # Watching indexes reportlets from its own listing of the folder, serially
+        unsupported = [
+            flag
+            for flag, given in (
+                ("--nprocs", opts.nprocs != 1),
+                ("--cache-dir", opts.cache_dir is not None),
+                ("--indexer", opts.indexer is not None),
+            )
+            if given
+        ]
+        if unsupported:
+            parser.error(f"--watch cannot be combined with {', '.join(unsupported)}")
+
+        return watch_reports(
+            opts.output_dir,
+            opts.run_uuid,
+            subject_list=opts.participant_label,
+            config=opts.config,
+            work_dir=opts.work_dir,
+            interval=opts.watch_interval,
+            debounce=opts.debounce,
+            incremental=opts.incremental,
+            profile=opts.profile,
+            browser=opts.browser,
+            group_index=opts.group_index,
+            page_size=opts.page_size,
+        )
+
+    indexer = opts.indexer or "pybids"
+
+    subjects = opts.participant_label
+    needs_index = opts.dry_run or not subjects or any(
+        c in label for label in subjects for c in "*?["
+    )
+    if needs_index:
+        t0 = perf_counter()
+        layout = init_layout(root, cache_dir=opts.cache_dir, indexer=indexer)
+        counts = Counter(f.get_entities().get("subject") for f in layout.get())
+        elapsed = perf_counter() - t0
+        subjects = select_subjects(subjects, [s for s in counts if s is not None])
+
+    if opts.dry_run:
+        print(f"Indexed {sum(counts.values())} files under {root} in {elapsed:.2f}s.")
+        print(f"Reports would be generated for {len(subjects)} subject(s):")
+        for subject in subjects:
+            print(f"  sub-{subject}: {counts.get(subject, 0)} reportlets")
+        return 0
+
+    errno = generate_reports(
+        subjects,
+        opts.output_dir,
+        opts.run_uuid,
+        config=opts.config,
+        work_dir=opts.work_dir,
+        nprocs=opts.nprocs or None,
+        cache_dir=opts.cache_dir,
+        indexer=indexer,
+        incremental=opts.incremental,
+        profile=opts.profile,
+        browser=opts.browser,
+    )
+
+    if opts.group_index:
+        generate_group_report(
+            opts.output_dir,
+            subject_list=subjects,
+            work_dir=opts.work_dir,
+            cache_dir=opts.cache_dir,
+            indexer=indexer,
+            page_size=opts.page_size,
+            browser=opts.browser,
+        )
+    return errno
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
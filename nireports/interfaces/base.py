@@ -46,4 +46,11 @@ class _PlotBaseInputSpec(BaseInterfaceInputSpec):
     )
     dpi = traits.Int(300, usedefault=True, desc="Desired DPI of figure")
     out_file = File("mosaic.svg", usedefault=True, desc="output file name")
+    image_format = traits.Enum(
+        "svg",
+        "png",
+        "webp",
+        "avif",
+        desc="format of the figure (replaces the extension of out_file if given)",
+    )
     cmap = traits.Str("Greys_r", usedefault=True)
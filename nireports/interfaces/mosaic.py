@@ -42,6 +42,13 @@ from nireports.interfaces.base import _PlotBaseInputSpec
 from nireports.reportlets.mosaic import plot_mosaic, plot_segmentation, plot_spikes
 
 
+def _figure_output(inputs):
+    """Resolve the output file name and format of a figure from the interface inputs."""
+    if not isdefined(inputs.image_format):
+        return inputs.out_file, None
+    return str(Path(inputs.out_file).with_suffix(f".{inputs.image_format}")), inputs.image_format
+
+
 class _PlotContoursInputSpec(BaseInterfaceInputSpec):
     in_file = File(exists=True, mandatory=True, desc="File to be plotted")
     in_contours = File(exists=True, mandatory=True, desc="file to pick the contours from")
@@ -142,18 +149,21 @@ class PlotMosaic(SimpleInterface):
         )
 
         title = self.inputs.title if isdefined(self.inputs.title) else None
+        out_file, image_format = _figure_output(self.inputs)
 
         plot_mosaic(
             self.inputs.in_file,
-            out_file=self.inputs.out_file,
+            out_file=out_file,
             title=title,
             only_plot_noise=self.inputs.only_noise,
             bbox_mask_file=mask,
             cmap=self.inputs.cmap,
             annotate=self.inputs.annotate,
             views=self.inputs.view,
+            image_format=image_format,
+            dpi=self.inputs.dpi,
         )
-        self._results["out_file"] = str((Path(runtime.cwd) / self.inputs.out_file).resolve())
+        self._results["out_file"] = str((Path(runtime.cwd) / out_file).resolve())
         return runtime
 
 
@@ -173,7 +183,8 @@ class PlotSpikes(SimpleInterface):
     output_spec = _PlotSpikesOutputSpec
 
     def _run_interface(self, runtime):
-        out_file = str((Path(runtime.cwd) / self.inputs.out_file).resolve())
+        out_file, image_format = _figure_output(self.inputs)
+        out_file = str((Path(runtime.cwd) / out_file).resolve())
         self._results["out_file"] = out_file
 
         spikes_list = np.loadtxt(self.inputs.in_spikes, dtype=int).tolist()
@@ -188,5 +199,7 @@ class PlotSpikes(SimpleInterface):
             self.inputs.in_fft,
             spikes_list,
             out_file=out_file,
+            image_format=image_format,
+            dpi=self.inputs.dpi,
         )
         return runtime
@@ -0,0 +1,369 @@
+# emacs: -*- mode: python; py-indent-offset: 4; indent-tabs-mode: nil -*-
+# vi: set ft=python sts=4 ts=4 sw=4 et:
+#
+# Copyright 2023 The NiPreps Developers <nipreps@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# We support and encourage derived works from this project, please read
+# about our expectations at
+#
+#     https://www.nipreps.org/community/licensing/
+#
+"""
+Trace the contours of segmentations on the cuts of a reportlet.
+
+Isolines are extracted with marching squares on the voxel data of the cut slices only
+(no resampling, unless the image is oblique, see :func:`axis_aligned`), and simplified
+so that they can be written as compact SVG paths.
+
+"""
+import math
+
+import numpy as np
+import nibabel as nb
+
+DISPLAY_AXES = {"x": (0, 1, 2), "y": (1, 0, 2), "z": (2, 0, 1)}
+"""Axis cut through, and axes shown horizontally and vertically, for each display mode."""
+
+# Segments of each marching squares case, as pairs of cell edges
+# (0: top, 1: right, 2: bottom, 3: left). Cases are indexed by the corners above
+# the level (8: top-left, 4: top-right, 2: bottom-right, 1: bottom-left).
+_SEGMENTS = {
+    1: ((3, 2),),
+    2: ((2, 1),),
+    3: ((3, 1),),
+    4: ((0, 1),),
+    6: ((0, 2),),
+    7: ((3, 0),),
+    8: ((3, 0),),
+    9: ((0, 2),),
+    11: ((0, 1),),
+    12: ((3, 1),),
+    13: ((2, 1),),
+    14: ((3, 2),),
+}
+# Saddle cases are disambiguated by whether the center of the cell is above the level
+_SADDLES = {
+    (5, True): ((3, 0), (2, 1)),
+    (5, False): ((0, 1), (3, 2)),
+    (10, True): ((0, 1), (3, 2)),
+    (10, False): ((3, 0), (2, 1)),
+}
+
+
+def marching_squares(data, level):
+    """
+    Extract the isolines of a 2D array at a given level.
+
+    Lines are returned as arrays of ``(column, row)`` coordinates, in voxel units.
+    Closed lines end with their first point. NaNs are taken as below the level.
+
+    Examples
+    --------
+    >>> data = np.zeros((4, 4))
+    >>> data[1:3, 1:3] = 1
+    >>> marching_squares(data, 0.5)
+    [array([[2. , 0.5],
+           [2.5, 1. ],
+           [2.5, 2. ],
+           [2. , 2.5],
+           [1. , 2.5],
+           [0.5, 2. ],
+           [0.5, 1. ],
+           [1. , 0.5],
+           [2. , 0.5]])]
+    >>> marching_squares(np.zeros((4, 4)), 0.5)
+    []
+
+    """
+    data = np.asanyarray(data, dtype="float64")
+    nrows, ncols = data.shape
+    if nrows < 2 or ncols < 2:
+        return []
+
+    above = (data > level).astype("uint8")
+    cases = (above[:-1, :-1] << 3) | (above[:-1, 1:] << 2) | (above[1:, 1:] << 1) | above[1:, :-1]
+    rows, cols = np.nonzero((cases > 0) & (cases < 15))
+    if not rows.size:
+        return []
+
+    cases = cases[rows, cols]
+    # Edges are identified by an index: horizontal edges first, then vertical edges
+    n_horizontal = nrows * (ncols - 1)
+    edges = np.stack(
+        (
+            rows * (ncols - 1) + cols,
+            n_horizontal + rows * ncols + cols + 1,
+            (rows + 1) * (ncols - 1) + cols,
+            n_horizontal + rows * ncols + cols,
+        ),
+        axis=1,
+    )
+
+    selections = [(cases == case, segments) for case, segments in _SEGMENTS.items()]
+    saddles = (cases == 5) | (cases == 10)
+    if saddles.any():
+        center_above = np.zeros_like(saddles)
+        r, c = rows[saddles], cols[saddles]
+        center_above[saddles] = (
+            data[r, c] + data[r, c + 1] + data[r + 1, c] + data[r + 1, c + 1]
+        ) > 4 * level
+        selections += [
+            ((cases == case) & (center_above == center), segments)
+            for (case, center), segments in _SADDLES.items()
+        ]
+
+    starts, ends = [], []
+    for selected, segments in selections:
+        for first, second in segments:
+            starts.append(edges[selected, first])
+            ends.append(edges[selected, second])
+
+    # Locate the crossing of the level along each edge in use, by linear interpolation
+    used, inverse = np.unique(np.concatenate(starts + ends), return_inverse=True)
+    vertical = used >= n_horizontal
+    r, c = np.divmod(
+        np.where(vertical, used - n_horizontal, used), np.where(vertical, ncols, ncols - 1)
+    )
+    v0 = data[r, c]
+    v1 = data[r + vertical, c + ~vertical]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        t = np.clip(np.nan_to_num((level - v0) / (v1 - v0), nan=0.5), 0.0, 1.0)
+    points = np.column_stack((c + t * ~vertical, r + t * vertical))
+
+    nsegments = inverse.size // 2
+    return [points[chain] for chain in _chain(inverse[:nsegments], inverse[nsegments:])]
+
+
+def _chain(starts, ends):
+    """Join segments sharing an end into polylines (each end is shared by two at most)."""
+    starts, ends = starts.tolist(), ends.tolist()
+    neighbors = {}
+    for segment, ends_of in enumerate(zip(starts, ends)):
+        for point in ends_of:
+            neighbors.setdefault(point, []).append(segment)
+
+    visited = [False] * len(starts)
+    chains = []
+    for segment in range(len(starts)):
+        if visited[segment]:
+            continue
+        visited[segment] = True
+        halves = []
+        for point in (ends[segment], starts[segment]):
+            half = []
+            while True:
+                following = [s for s in neighbors[point] if not visited[s]]
+                if not following:
+                    break
+                following = following[0]
+                visited[following] = True
+                point = ends[following] if starts[following] == point else starts[following]
+                half.append(point)
+            halves.append(half)
+        chains.append(halves[1][::-1] + [starts[segment], ends[segment]] + halves[0])
+    return chains
+
+
+def simplify(line, tolerance=0.25):
+    """
+    Simplify a polyline with the Ramer-Douglas-Peucker algorithm.
+
+    Points are removed while the simplified line stays within ``tolerance`` of the
+    original (in the units of the coordinates). Closed lines remain closed.
+
+    Examples
+    --------
+    >>> simplify(np.array([[0.0, 0.0], [1.0, 0.1], [2.0, 0.0], [2.0, 2.0]]))
+    array([[0., 0.],
+           [2., 0.],
+           [2., 2.]])
+
+    """
+    line = np.asanyarray(line)
+    if len(line) < 3 or tolerance <= 0:
+        return line
+
+    # Drop the points on the way between their neighbors first, which is lossless
+    before, after = line[1:-1] - line[:-2], line[2:] - line[1:-1]
+    straight = (np.abs(before[:, 0] * after[:, 1] - before[:, 1] * after[:, 0]) < 1e-9) & (
+        (before * after).sum(axis=1) > 0
+    )
+    line = line[np.concatenate(([True], ~straight, [True]))]
+    if len(line) < 3:
+        return line
+
+    # Lines have few points between splits, which plain Python handles faster than NumPy
+    points = line.tolist()
+    keep = [False] * len(points)
+    keep[0] = keep[-1] = True
+    stack = [(0, len(points) - 1)]
+    if points[0] == points[-1]:
+        # Split closed lines at the point farthest from their start
+        split = int(np.argmax(((line - line[0]) ** 2).sum(axis=1)))
+        if split == 0:
+            return line[[0, -1]]
+        keep[split] = True
+        stack = [(0, split), (split, len(points) - 1)]
+
+    while stack:
+        first, last = stack.pop()
+        if last - first < 2:
+            continue
+        (x0, y0), (x1, y1) = points[first], points[last]
+        dx, dy = x1 - x0, y1 - y0
+        length = math.hypot(dx, dy)
+        farthest, distance = first, -1.0
+        for i in range(first + 1, last):
+            x, y = points[i]
+            d = (
+                abs(dx * (y - y0) - dy * (x - x0)) / length if length > 0
+                else math.hypot(x - x0, y - y0)
+            )
+            if d > distance:
+                farthest, distance = i, d
+        if distance > tolerance:
+            keep[farthest] = True
+            stack += [(first, farthest), (farthest, last)]
+    return line[keep]
+
+
+def isolines(data, levels=(0.5,), tolerance=0.25):
+    """
+    Extract and simplify the isolines of a 2D array, for each level.
+
+    Examples
+    --------
+    >>> data = np.zeros((6, 6))
+    >>> data[1:5, 1:5] = 1
+    >>> len(marching_squares(data, 0.5)[0])
+    17
+    >>> [[len(line) for line in lines] for lines in isolines(data, levels=[0.5, 2.0])]
+    [[9], []]
+
+    """
+    return [
+        [simplify(line, tolerance) for line in marching_squares(data, level)]
+        for level in levels
+    ]
+
+
+def axis_aligned(img, interpolation="continuous"):
+    """
+    Reorient an image to RAS+, resampling it onto an axis-aligned grid if it is oblique.
+
+    Cuts are taken from the voxel grid, which must therefore be aligned with the axes
+    of world coordinates. Oblique images are resampled (with
+    :func:`nilearn.image.reorder_img` and the given ``interpolation``) onto a grid of
+    their voxel sizes.
+
+    Examples
+    --------
+    >>> img = nb.Nifti1Image(np.ones((10, 10, 10)), np.diag([-2.0, 2.0, 2.0, 1.0]))
+    >>> axis_aligned(img).affine[:3, :3].tolist()
+    [[2.0, 0.0, 0.0], [0.0, 2.0, 0.0], [0.0, 0.0, 2.0]]
+    >>> oblique = np.diag([2.0, 2.0, 2.0, 1.0])
+    >>> oblique[:3, :3] = oblique[:3, :3] @ nb.eulerangles.euler2mat(x=np.pi / 6)
+    >>> aligned = axis_aligned(nb.Nifti1Image(np.ones((10, 10, 10)), oblique))
+    >>> np.round(aligned.affine[:3, :3], 3).tolist()
+    [[2.0, 0.0, 0.0], [0.0, 2.0, 0.0], [0.0, 0.0, 2.0]]
+
+    """
+    img = nb.as_closest_canonical(img)
+    rotations = img.affine[:3, :3] - np.diag(np.diag(img.affine[:3, :3]))
+    if np.all(np.abs(rotations) <= 0.001):
+        return img
+
+    from nilearn.image import reorder_img
+
+    return nb.as_closest_canonical(reorder_img(img, resample=interpolation))
+
+
+def cut_index(img, axis, coord):
+    """
+    Find the index of the slice closest to a world coordinate, along an axis of a
+    RAS+ image (see :func:`nibabel.as_closest_canonical`).
+
+    The point at ``coord`` along ``axis`` (and at the center of the image along the
+    other axes) is mapped into voxel coordinates with the inverse of the affine, so
+    that the slice of oblique images is the one crossing that point.
+
+    Examples
+    --------
+    >>> img = nb.Nifti1Image(np.zeros((10, 10, 10)), np.diag([2.0, 2.0, 2.0, 1.0]))
+    >>> cut_index(img, 0, 7.2), cut_index(img, 2, 100)
+    (4, 9)
+    >>> oblique = np.diag([2.0, 2.0, 2.0, 1.0])
+    >>> oblique[:3, :3] = nb.eulerangles.euler2mat(z=np.pi / 6) @ oblique[:3, :3]
+    >>> cut_index(nb.Nifti1Image(np.zeros((10, 10, 10)), oblique), 0, 7.2)
+    6
+
+    """
+    affine = img.affine
+    point = nb.affines.apply_affine(affine, (np.array(img.shape[:3]) - 1) / 2)
+    point[axis] = coord
+    index = np.round(nb.affines.apply_affine(np.linalg.inv(affine), point)[axis])
+    return int(np.clip(index, 0, img.shape[axis] - 1))
+
+
+def cut_isolines(img, display_mode, cut_coords, levels=(0.5,), tolerance=0.25):
+    """
+    Trace the isolines of an image on the cuts of a view.
+
+    Only the cut slices are read. For each cut (and for each level), lines are given
+    in world coordinates along the axes shown horizontally and vertically by the
+    view (see :data:`DISPLAY_AXES`), as nilearn's displays lay cuts out.
+    Oblique images are resampled with nearest-neighbor interpolation first, so that
+    label maps keep their labels (see :func:`axis_aligned`).
+    The ``tolerance`` of the simplification is given in voxels.
+
+    Examples
+    --------
+    >>> data = np.zeros((10, 10, 10))
+    >>> data[2:6, 2:6, 2:6] = 1
+    >>> img = nb.Nifti1Image(data, np.diag([2.0, 2.0, 2.0, 1.0]))
+    >>> lines = cut_isolines(img, "z", [0.0, 6.0])
+    >>> len(lines[0][0])
+    0
+    >>> lines[1][0][0]
+    array([[10.,  3.],
+           [11.,  4.],
+           [11., 10.],
+           [10., 11.],
+           [ 4., 11.],
+           [ 3., 10.],
+           [ 3.,  4.],
+           [ 4.,  3.],
+           [10.,  3.]])
+
+    """
+    img = axis_aligned(img, interpolation="nearest")
+    axis, h_axis, v_axis = DISPLAY_AXES[display_mode]
+    affine = img.affine
+
+    cuts = []
+    for coord in cut_coords:
+        index = cut_index(img, axis, coord)
+        # Rows go along the vertical axis of the view
+        data = np.asanyarray(img.dataobj[(slice(None),) * axis + (index,)]).T
+        cut = []
+        for lines in isolines(data, levels, tolerance):
+            world = []
+            for line in lines:
+                voxels = np.full((len(line), 3), float(index))
+                voxels[:, h_axis], voxels[:, v_axis] = line[:, 0], line[:, 1]
+                world.append(nb.affines.apply_affine(affine, voxels)[:, [h_axis, v_axis]])
+            cut.append(world)
+        cuts.append(cut)
+    return cuts
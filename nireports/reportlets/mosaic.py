@@ -23,28 +23,48 @@
 # STATEMENT OF CHANGES: This file was ported carrying over full git history from
 # NiPreps projects licensed under the Apache-2.0 terms.
 """Base components to generate mosaic-like reportlets."""
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from pathlib import Path
+from tempfile import TemporaryDirectory
 from uuid import uuid4
+import os
 from os import path as op
 import math
 import numpy as np
 import nibabel as nb
 import matplotlib.pyplot as plt
+from matplotlib.artist import Artist
+from matplotlib.collections import PolyCollection
+from matplotlib.font_manager import FontProperties
 from matplotlib.gridspec import GridSpec
+from matplotlib.patches import PathPatch
+from matplotlib.path import Path as MplPath
 from matplotlib.cm import get_cmap
+from matplotlib.transforms import IdentityTransform
 from svgutils.transform import fromstring
 from nilearn.plotting import plot_anat
 from nilearn import image as nlimage
 
 from nireports.tools.ndimage import rotate_affine, rotation2canonical
+from nireports.reportlets.contours import (
+    DISPLAY_AXES,
+    axis_aligned,
+    cut_index,
+    cut_isolines,
+)
 from nireports.reportlets.utils import (
     _3d_in_file,
     _bbox,
     _get_limits,
     cuts_from_bbox,
     extract_svg,
+    figure_format,
     get_parula,
     robust_set_limits,
+    save_figure,
 )
+from nireports.reportlets.svg import SVGDocument, blend, colorize, has_webp, path_data
 
 
 def plot_segs(
@@ -55,6 +75,9 @@ def plot_segs(
     masked=False,
     colors=None,
     compress="auto",
+    backend="matplotlib",
+    nprocs=1,
+    contour_engine=None,
     **plot_params,
 ):
     """
@@ -64,7 +87,24 @@ def plot_segs(
     seg_niis should be a list of files. mask_nii helps determine the cut
     coordinates. plot_params will be passed on to nilearn plot_* functions. If
     seg_niis is a list of size one, it behaves as if it was plotting the mask.
+    With ``backend="svg"``, views are written directly (see :func:`_svg_contours`)
+    instead, which only interprets the ``vmin``, ``vmax``, ``cmap``, ``title``,
+    ``levels`` and ``colors`` plotting parameters.
+    Contours are traced by nilearn (``contour_engine="nilearn"``, the default of the
+    matplotlib backend) or with marching squares on the cut slices
+    (``contour_engine="marching"``, see :mod:`nireports.reportlets.contours`),
+    which the svg backend always uses.
+    Views are drawn in ``nprocs`` processes (see :func:`_map_views`).
     """
+    if backend not in ("matplotlib", "svg"):
+        raise ValueError(f"Unknown backend '{backend}'.")
+
+    if contour_engine is None:
+        contour_engine = "marching" if backend == "svg" else "nilearn"
+    if contour_engine not in ("nilearn", "marching"):
+        raise ValueError(f"Unknown contour engine '{contour_engine}'.")
+    if backend == "svg" and contour_engine != "marching":
+        raise ValueError("The svg backend only supports the marching contour engine.")
 
     plot_params = {} if plot_params is None else plot_params
 
@@ -85,11 +125,26 @@ def plot_segs(
 
     cuts = cuts_from_bbox(bbox_nii, cuts=7)
     plot_params["colors"] = colors or plot_params.get("colors", None)
+    dimensions = plot_params.pop("dimensions", ("z", "x", "y"))
+    svgs = _map_views(
+        _segs_view,
+        [image_nii] + seg_niis,
+        [
+            {
+                **plot_params,
+                "display_mode": d,
+                "cut_coords": cuts[d],
+                "backend": backend,
+                "compress": compress,
+                "contour_engine": contour_engine,
+            }
+            for d in dimensions
+        ],
+        nprocs=nprocs,
+    )
+
     out_files = []
-    for d in plot_params.pop("dimensions", ("z", "x", "y")):
-        plot_params["display_mode"] = d
-        plot_params["cut_coords"] = cuts[d]
-        svg = _plot_anat_with_contours(image_nii, segs=seg_niis, compress=compress, **plot_params)
+    for d, svg in zip(dimensions, svgs):
         # Find and replace the figure_1 id.
         svg = svg.replace("figure_1", "segmentation-%s-%s" % (d, uuid4()), 1)
         out_files.append(fromstring(svg))
@@ -97,6 +152,60 @@ def plot_segs(
     return out_files
 
 
+def _segs_view(
+    image, *segs, backend="matplotlib", compress="auto", contour_engine="nilearn", **plot_params
+):
+    """Draw one view of :func:`plot_segs`, returning the SVG code."""
+    if backend == "svg":
+        return _svg_contours(image, segs=list(segs), compress=compress, **plot_params).tostring()
+    return _plot_anat_with_contours(
+        image, segs=list(segs), compress=compress, contour_engine=contour_engine, **plot_params
+    )
+
+
+def _share_image(img, tmpdir):
+    """Write the data of an image into a file that processes can memory-map."""
+    path = Path(tmpdir) / f"{uuid4()}.npy"
+    np.save(path, np.asanyarray(img.dataobj))
+    return str(path), img.__class__, img.affine, img.header
+
+
+def _load_shared(path, klass, affine, header):
+    """Map an image written by :func:`_share_image` (copy-on-write), with its header."""
+    return klass(np.load(path, mmap_mode="c"), affine, header)
+
+
+def _render_shared(render, shared, params):
+    """Call ``render`` on images shared by :func:`_share_image`."""
+    images = [None if spec is None else _load_shared(*spec) for spec in shared]
+    return render(*images, **params)
+
+
+def _map_views(render, images, params, nprocs=1):
+    """
+    Render views, calling ``render(*images, **view_params)`` for each of ``params``.
+
+    Views are independent, and with ``nprocs`` other than ``1`` (``None`` uses all
+    available CPUs) they are rendered concurrently in a process pool.
+    Instead of pickling the images for each view, their data are written once into
+    temporary files, which workers memory-map.
+    Images may be ``None``, and results are returned in the order of ``params``.
+
+    """
+    nprocs = min(nprocs or os.cpu_count() or 1, len(params))
+    if nprocs <= 1:
+        return [render(*images, **view_params) for view_params in params]
+
+    with TemporaryDirectory() as tmpdir:
+        shared = [None if img is None else _share_image(img, tmpdir) for img in images]
+        with ProcessPoolExecutor(max_workers=nprocs) as pool:
+            futures = [
+                pool.submit(_render_shared, render, shared, view_params)
+                for view_params in params
+            ]
+            return [future.result() for future in futures]
+
+
 def plot_registration(
     anat_nii,
     div_id,
@@ -108,11 +217,17 @@ def plot_registration(
     contour=None,
     compress="auto",
     dismiss_affine=False,
+    nprocs=1,
+    contour_engine="nilearn",
 ):
     """
     Plots the foreground and background views
     Default order is: axial, coronal, sagittal
+    Views are drawn in ``nprocs`` processes (see :func:`_map_views`).
+    Contours are traced by nilearn or with marching squares (see :func:`plot_segs`).
     """
+    if contour_engine not in ("nilearn", "marching"):
+        raise ValueError(f"Unknown contour engine '{contour_engine}'.")
 
     plot_params = {} if plot_params is None else plot_params
 
@@ -150,26 +265,24 @@ def plot_registration(
             contour = rotate_affine(contour, rot=canonical_r)
 
     # Plot each cut axis
-    for i, mode in enumerate(list(order)):
-        plot_params["display_mode"] = mode
-        plot_params["cut_coords"] = cuts[mode]
-        if i == 0:
-            plot_params["title"] = label
-        else:
-            plot_params["title"] = None
-
-        # Generate nilearn figure
-        display = plot_anat(anat_nii, **plot_params)
-        if ribbon:
-            kwargs = {"levels": [0.5], "linewidths": 0.5}
-            display.add_contours(white, colors="b", **kwargs)
-            display.add_contours(pial, colors="r", **kwargs)
-        elif contour is not None:
-            display.add_contours(contour, colors="r", levels=[0.5], linewidths=0.5)
-
-        svg = extract_svg(display, compress=compress)
-        display.close()
+    svgs = _map_views(
+        _registration_view,
+        [anat_nii] + ([white, pial, None] if ribbon else [None, None, contour]),
+        [
+            {
+                **plot_params,
+                "display_mode": mode,
+                "cut_coords": cuts[mode],
+                "title": label if i == 0 else None,
+                "compress": compress,
+                "contour_engine": contour_engine,
+            }
+            for i, mode in enumerate(order)
+        ],
+        nprocs=nprocs,
+    )
 
+    for mode, svg in zip(order, svgs):
         # Find and replace the figure_1 id.
         svg = svg.replace("figure_1", "%s-%s-%s" % (div_id, mode, uuid4()), 1)
         out_files.append(fromstring(svg))
@@ -177,7 +290,36 @@ def plot_registration(
     return out_files
 
 
-def _plot_anat_with_contours(image, segs=None, compress="auto", **plot_params):
+def _registration_view(
+    anat,
+    white=None,
+    pial=None,
+    contour=None,
+    compress="auto",
+    contour_engine="nilearn",
+    **plot_params,
+):
+    """Draw one view of :func:`plot_registration`, returning the SVG code."""
+    # Generate nilearn figure
+    display = plot_anat(anat, **plot_params)
+    kwargs = {"levels": [0.5], "linewidths": 0.5}
+    add_contours = (
+        display.add_contours if contour_engine == "nilearn" else partial(_add_isolines, display)
+    )
+    if white is not None:
+        add_contours(white, colors="b", **kwargs)
+        add_contours(pial, colors="r", **kwargs)
+    elif contour is not None:
+        add_contours(contour, colors="r", **kwargs)
+
+    svg = extract_svg(display, compress=compress)
+    display.close()
+    return svg
+
+
+def _plot_anat_with_contours(
+    image, segs=None, compress="auto", contour_engine="nilearn", **plot_params
+):
 
     nsegs = len(segs or [])
     plot_params = plot_params or {}
@@ -205,6 +347,9 @@ def _plot_anat_with_contours(image, segs=None, compress="auto", **plot_params):
 
     plot_params["linewidths"] = 0.5
     for i in reversed(range(nsegs)):
+        if contour_engine == "marching":
+            _add_isolines(display, segs[i], levels=levels[i], colors=colors[i])
+            continue
         plot_params["colors"] = colors[i]
         display.add_contours(segs[i], levels=levels[i], **plot_params)
 
@@ -213,6 +358,149 @@ def _plot_anat_with_contours(image, segs=None, compress="auto", **plot_params):
     return svg
 
 
+def _add_isolines(display, img, levels=(0.5,), colors=("r",), linewidths=0.5):
+    """
+    Draw contours on the cuts of a nilearn display, as ``add_contours`` does.
+
+    Isolines are traced with marching squares on the cut slices only (see
+    :func:`~nireports.reportlets.contours.cut_isolines`), and all the lines of a color
+    are drawn as one path per cut.
+    """
+    from matplotlib.colors import to_rgba
+
+    colors = [colors] if isinstance(colors, str) else list(colors)
+    for coord, cut_axes in display.axes.items():
+        (cut,) = cut_isolines(img, cut_axes.direction, [coord], levels=levels)
+        batches = {}
+        for jj, lines in enumerate(cut):
+            batches.setdefault(to_rgba(colors[jj % len(colors)]), []).extend(lines)
+        for color, lines in batches.items():
+            if lines:
+                cut_axes.ax.add_artist(
+                    PathPatch(_mpl_path(lines), fill=False, edgecolor=color, linewidth=linewidths)
+                )
+
+
+def _mpl_path(lines):
+    """Join polylines into one matplotlib path, closing those ending at their start."""
+    vertices, codes = [], []
+    for line in lines:
+        line_codes = np.full(len(line), MplPath.LINETO, dtype=MplPath.code_type)
+        line_codes[0] = MplPath.MOVETO
+        if len(line) > 2 and np.array_equal(line[0], line[-1]):
+            line_codes[-1] = MplPath.CLOSEPOLY
+        vertices.append(line)
+        codes.append(line_codes)
+    return MplPath(np.concatenate(vertices), np.concatenate(codes))
+
+
+def _svg_contours(image, segs=None, compress="auto", **plot_params):
+    """
+    Draw the cuts of one view with contours of segmentations, as an SVG document.
+
+    This replaces nilearn's ``plot_anat`` and ``add_contours`` (see
+    :func:`_plot_anat_with_contours`): cuts are taken from the voxel grid of the
+    image (reoriented to RAS+, and resampled if oblique, see
+    :func:`~.contours.axis_aligned`), and contours are traced with marching squares on the
+    cut slices of each segmentation (see :func:`~.contours.cut_isolines`), in its own
+    grid. The contours of each color are written as a single path.
+    Embedded images are encoded as WebP if ``compress`` is ``True`` or ``"auto"``
+    and Pillow supports it.
+
+    """
+    from matplotlib.colors import to_rgba
+
+    has_compress = has_webp()
+    if compress is True and not has_compress:
+        raise RuntimeError("Compression is required, but Pillow cannot write WebP images")
+    image_format = "webp" if (compress is True or compress == "auto") and has_compress else "png"
+
+    segs = segs or []
+    colors = plot_params.get("colors") or []
+    levels = plot_params.get("levels") or []
+    missing = len(segs) - len(colors)
+    if missing > 0:  # missing may be negative
+        from seaborn import color_palette
+
+        colors = colors + color_palette("husl", missing)
+
+    colors = [[c] if not isinstance(c, list) else c for c in colors]
+    if not levels:
+        levels = [[0.5]] * len(segs)
+
+    image = axis_aligned(image)
+    data = np.asanyarray(image.dataobj)
+
+    display_mode = plot_params["display_mode"]
+    axis, h_axis, v_axis = DISPLAY_AXES[display_mode]
+    zooms = nb.affines.voxel_sizes(image.affine)
+
+    vmin = plot_params.get("vmin")
+    vmax = plot_params.get("vmax")
+    if vmin is None or vmax is None:
+        est_vmin, est_vmax = _get_limits(data)
+        vmin = est_vmin if vmin is None else vmin
+        vmax = est_vmax if vmax is None else vmax
+
+    cut_coords = plot_params["cut_coords"]
+    n_h, n_v = data.shape[h_axis], data.shape[v_axis]
+    scale = 100.0 / (n_v * zooms[v_axis])  # Cuts are 100 points high
+    panel_w, panel_h = n_h * zooms[h_axis] * scale, 100.0
+    title_height = 14.0 if plot_params.get("title") else 0.0
+    # World coordinates of the left and bottom edges of the cuts
+    origin_h = image.affine[h_axis, 3] - 0.5 * zooms[h_axis]
+    origin_v = image.affine[v_axis, 3] - 0.5 * zooms[v_axis]
+
+    doc = SVGDocument(len(cut_coords) * panel_w, panel_h + title_height)
+    doc.add_rect(0, 0, doc.width, doc.height, fill="black")
+    if title_height:
+        doc.add_text(2, 2, plot_params["title"], size=10, valign="top")
+
+    for ii, coord in enumerate(cut_coords):
+        # Transposed, so that rows go along the vertical axis (bottom row first)
+        dslice = _cut(data, cut_index(image, axis, coord), axis).T
+        doc.add_image(
+            colorize(dslice[::-1], plot_params.get("cmap") or "gray", vmin=vmin, vmax=vmax),
+            ii * panel_w,
+            title_height,
+            panel_w,
+            panel_h,
+            image_format=image_format,
+        )
+
+    # Contours are drawn from the last segmentation, with one path per color
+    batches = {}
+    for seg, seg_levels, seg_colors in reversed(list(zip(segs, levels, colors))):
+        cuts = cut_isolines(seg, display_mode, cut_coords, levels=seg_levels)
+        for ii, cut in enumerate(cuts):
+            for jj, lines in enumerate(cut):
+                batches.setdefault(to_rgba(seg_colors[jj % len(seg_colors)]), []).extend(
+                    np.column_stack((
+                        ii * panel_w + (line[:, 0] - origin_h) * scale,
+                        title_height + panel_h - (line[:, 1] - origin_v) * scale,
+                    ))
+                    for line in lines
+                )
+    for color, lines in batches.items():
+        doc.add_path(path_data(lines, decimals=1), stroke=color)
+
+    for ii, coord in enumerate(cut_coords):
+        doc.add_text(
+            ii * panel_w + 2,
+            title_height + panel_h - 2,
+            f"{display_mode}={int(round(coord))}",
+            size=8,
+        )
+
+    if display_mode != "x":
+        doc.add_text(2, title_height + 0.5 * panel_h, "L", size=8, valign="center")
+        doc.add_text(
+            doc.width - 2, title_height + 0.5 * panel_h, "R", size=8, halign="right",
+            valign="center",
+        )
+    return doc
+
+
 def plot_segmentation(anat_file, segmentation, out_file, **kwargs):
     """Plot a segmentation (from MRIQC)."""
     from nilearn.plotting import plot_anat
@@ -416,10 +704,29 @@ def plot_spikes(
     cols=3,
     labelfmt="t={0:.3f}s (z={1:d})",
     out_file=None,
+    backend="matplotlib",
+    image_format=None,
+    dpi=300,
 ):
-    """Plot a mosaic enhancing EM spikes."""
+    """
+    Plot a mosaic enhancing EM spikes.
+
+    With ``backend="svg"``, the mosaic is written directly (see :func:`_svg_spikes`)
+    instead of drawn with matplotlib.
+    The figure is saved in ``image_format`` (by default, the format matching the
+    extension of ``out_file``, see :func:`~nireports.reportlets.utils.save_figure`),
+    and raster images are rendered at ``dpi``.
+
+    """
     from mpl_toolkits.axes_grid1 import make_axes_locatable
 
+    if backend not in ("matplotlib", "svg"):
+        raise ValueError(f"Unknown backend '{backend}'.")
+
+    image_format = figure_format(out_file, image_format)
+    if backend == "svg" and image_format != "svg":
+        raise ValueError("The 'svg' backend can only write SVG files.")
+
     nii = nb.as_closest_canonical(nb.load(in_file))
     fft = nb.load(in_fft).get_fdata()
 
@@ -436,6 +743,16 @@ def plot_spikes(
     if nspikes > cols:
         rows = math.ceil(nspikes / cols)
 
+    if out_file is None:
+        fname, ext = op.splitext(op.basename(in_file))
+        if ext == ".gz":
+            fname, _ = op.splitext(fname)
+        out_file = op.abspath("%s.%s" % (fname, image_format))
+
+    if backend == "svg":
+        _svg_spikes(data, fft, spikes_list, zooms, tstep, cols, rows, labelfmt).save(out_file)
+        return out_file
+
     fig = plt.figure(figsize=(7 * cols, 5 * rows))
 
     for i, (t, z) in enumerate(spikes_list):
@@ -476,16 +793,422 @@ def plot_spikes(
         )
 
     plt.tight_layout()
-    if out_file is None:
-        fname, ext = op.splitext(op.basename(in_file))
-        if ext == ".gz":
-            fname, _ = op.splitext(fname)
-        out_file = op.abspath("%s.svg" % fname)
-
-    fig.savefig(out_file, format="svg", dpi=300, bbox_inches="tight")
+    save_figure(fig, out_file, image_format=image_format, dpi=dpi)
     return out_file
 
 
+def _tern_rgba(dslice, prev=None, post=None, cmap="Greys_r", vmin=None, vmax=None):
+    """Colorize a slice between its previous and next, as :func:`plot_slice_tern` shows."""
+    vmin, vmax = _slice_limits(dslice, vmin, vmax)
+    if prev is None:
+        prev = np.ones_like(dslice)
+    if post is None:
+        post = np.ones_like(dslice)
+
+    # Shown with origin="lower", and therefore flipped to write the top row first
+    combined = np.swapaxes(np.vstack((prev, dslice, post)), 0, 1)[::-1]
+    return colorize(combined, cmap, vmin=vmin, vmax=vmax)
+
+
+def _svg_spikes(data, fft, spikes_list, zooms, tstep, cols, rows, labelfmt):
+    """
+    Lay out the mosaic of :func:`plot_spikes` as an :class:`~.svg.SVGDocument`.
+
+    Each spike is shown in a cell of 7 inches wide, with the slice (and the
+    previous and next time points) above its spectrum.
+
+    """
+    pad = 7.2  # 0.1 inches, as the padding between axes of the matplotlib figure
+    cell_w = 504.0 - 2 * pad
+    nx, ny = data.shape[:2]
+    scale = cell_w / (3 * nx * zooms[0])
+    tern_h = scale * ny * zooms[1]
+    cell_h = 2 * tern_h + 3 * pad
+    ntpoints = data.shape[-1]
+    parula = get_parula()
+
+    doc = SVGDocument(cols * (cell_w + 2 * pad), rows * cell_h + pad)
+    doc.add_rect(0, 0, doc.width, doc.height, fill="white")
+    for i, (t, z) in enumerate(spikes_list):
+        row, col = divmod(i, cols)
+        left = col * (cell_w + 2 * pad) + pad
+        top = row * cell_h + pad
+        # Neighboring time points, if any
+        neighbors = {
+            "prev": t - 1 if t > 0 else None,
+            "post": t + 1 if t < (ntpoints - 1) else None,
+        }
+
+        doc.add_image(
+            _tern_rgba(
+                data[..., z, t],
+                **{k: None if v is None else data[..., z, v] for k, v in neighbors.items()},
+            ),
+            left,
+            top,
+            cell_w,
+            tern_h,
+        )
+        doc.add_text(
+            left + 0.5 * cell_w,
+            top + 0.95 * tern_h,
+            labelfmt.format(t * tstep, z),
+            fill="white",
+            size=14,
+            halign="center",
+            valign="top",
+            background="black",
+        )
+        doc.add_image(
+            _tern_rgba(
+                fft[..., z, t],
+                **{k: None if v is None else fft[..., z, v] for k, v in neighbors.items()},
+                cmap=parula,
+                vmin=-5,
+                vmax=5,
+            ),
+            left,
+            top + tern_h + pad,
+            cell_w,
+            tern_h,
+        )
+    return doc
+
+
+class _TextLayer(Artist):
+    """
+    Draw many short, boxed texts (e.g., the labels of slices) as a single artist.
+
+    Texts are placed and drawn as :class:`~matplotlib.text.Text` would with
+    ``bbox=dict(boxstyle="square,pad=0")``, but without creating one artist (and
+    one patch) per text.
+
+    """
+
+    def __init__(self, texts, size=14):
+        super().__init__()
+        self.texts = texts
+        self.prop = FontProperties(size=size)
+        # Texts do not extend the bounding box of the axes they annotate
+        self.set_in_layout(False)
+
+    def draw(self, renderer):
+        if not self.get_visible() or not self.texts:
+            return
+
+        _, lp_h, lp_d = renderer.get_text_width_height_descent("lp", self.prop, ismath=False)
+        positions = self.axes.transData.transform([(x, y) for x, y, *_ in self.texts])
+
+        boxes, facecolors, glyphs = [], [], []
+        for (x, y), (_, _, text, halign, valign, fgcolor, bgcolor) in zip(
+            positions, self.texts
+        ):
+            w, h, d = renderer.get_text_width_height_descent(text, self.prop, ismath=False)
+            h, d = max(h, lp_h), max(d, lp_d)
+            x0 = x - {"left": 0, "center": 0.5 * w, "right": w}[halign]
+            y0 = y - {"bottom": 0, "center": 0.5 * h, "top": h}[valign]
+            boxes.append([(x0, y0), (x0 + w, y0), (x0 + w, y0 + h), (x0, y0 + h)])
+            facecolors.append(bgcolor)
+            glyphs.append((x0, y0 + d, text, fgcolor))
+
+        renderer.open_group("text_layer", gid=self.get_gid())
+        backgrounds = PolyCollection(
+            boxes,
+            facecolors=facecolors,
+            edgecolors=facecolors,
+            linewidths=1.0,
+            transform=IdentityTransform(),
+        )
+        backgrounds.set_figure(self.figure)
+        backgrounds.draw(renderer)
+
+        canvas_height = renderer.get_canvas_width_height()[1]
+        gc = renderer.new_gc()
+        for x, y, text, fgcolor in glyphs:
+            gc.set_foreground(fgcolor)
+            renderer.draw_text(
+                gc,
+                x,
+                canvas_height - y if renderer.flipy() else y,
+                text,
+                self.prop,
+                0.0,
+                ismath=False,
+            )
+        gc.restore()
+        renderer.close_group("text_layer")
+        self.stale = False
+
+
+def _slice_limits(dslice, vmin=None, vmax=None):
+    """Resolve the intensity limits of a slice as :func:`plot_slice` does."""
+    if vmin and vmax:
+        return vmin, vmax
+
+    est_vmin, est_vmax = _get_limits(dslice)
+    return vmin or est_vmin, vmax or est_vmax
+
+
+def _cut(data, index, axis):
+    """Cut a slice through ``axis`` of a volume, as a view (without copying data)."""
+    return data[(slice(None),) * axis + (index,)]
+
+
+def _orient_slices(slices, spacing=None, swapaxes=False):
+    """Transpose slices (and their pixel spacing) if requested, as :func:`plot_slice` does."""
+    if spacing is None:
+        spacing = [1.0, 1.0]
+
+    if swapaxes:
+        slices = [np.swapaxes(dslice, 0, 1) for dslice in slices]
+        spacing = (spacing[1], spacing[0])
+    return slices, spacing
+
+
+def _tile_slices(
+    slices,
+    ncols,
+    nrows=None,
+    labels=None,
+    spacing=(1.0, 1.0),
+    cmap="Greys_r",
+    vmin=None,
+    vmax=None,
+    annotate=False,
+    row_gap=0,
+    col_gap=0,
+):
+    """
+    Tile slices into a single canvas, normalized with the limits :func:`plot_slice` uses.
+
+    The canvas is meant to be shown with ``origin="lower"``, and slices are separated by
+    ``row_gap`` and ``col_gap`` voxels filled with NaNs.
+    Returns the canvas and the labels and L/R annotations of all slices, as tuples
+    ``(x, y, text, halign, valign, fgcolor, bgcolor)`` in physical coordinates of the
+    canvas, placed where :func:`plot_slice` places them within each slice.
+
+    """
+    height, width = slices[0].shape
+    nrows = nrows or math.ceil(len(slices) / ncols)
+    tile_h, tile_w = height * spacing[0], width * spacing[1]
+
+    canvas = np.full(
+        (nrows * (height + row_gap) - row_gap, ncols * (width + col_gap) - col_gap),
+        np.nan,
+        dtype="float32",
+    )
+
+    texts = []
+    for k, dslice in enumerate(slices):
+        ii, jj = divmod(k, ncols)
+        lo, hi = _slice_limits(dslice, vmin, vmax)
+        # Rows are flipped because the canvas is shown with origin="lower"
+        row0 = (nrows - 1 - ii) * (height + row_gap)
+        col0 = jj * (width + col_gap)
+        canvas[row0:row0 + height, col0:col0 + width] = (
+            (dslice - lo) / (hi - lo) if hi != lo else np.where(np.isnan(dslice), np.nan, 0.0)
+        )
+
+        if labels is None and not annotate:
+            continue
+
+        bgcolor = cmap(min(lo, 0.0))
+        fgcolor = cmap(hi)
+        x0, y0 = col0 * spacing[1], row0 * spacing[0]
+        if labels is not None:
+            texts.append(
+                (
+                    x0 + 0.98 * tile_w,
+                    y0 + 0.01 * tile_h,
+                    labels[k],
+                    "right",
+                    "bottom",
+                    fgcolor,
+                    bgcolor,
+                )
+            )
+        if annotate:
+            texts += [
+                (x0 + 0.95 * tile_w, y0 + 0.95 * tile_h, "R", "center", "top", fgcolor, bgcolor),
+                (x0 + 0.05 * tile_w, y0 + 0.95 * tile_h, "L", "center", "top", fgcolor, bgcolor),
+            ]
+
+    return canvas, texts
+
+
+def _plot_tiles(
+    ax,
+    slices,
+    ncols,
+    nrows=None,
+    labels=None,
+    spacing=None,
+    cmap="Greys_r",
+    vmin=None,
+    vmax=None,
+    annotate=False,
+    swapaxes=False,
+    hspace=0.0,
+    wspace=0.0,
+):
+    """
+    Draw a grid of slices with a single ``imshow`` call on one axes.
+
+    Slices are tiled into one canvas of ``nrows`` (by default, as many as needed) by
+    ``ncols`` slices (see :func:`_tile_slices`).
+    Slices are separated by transparent gaps, so that they are placed where they would
+    be if each was drawn on its own axes of a grid (with ``hspace`` and ``wspace``
+    spacing, as for :meth:`~matplotlib.gridspec.SubplotSpec.subgridspec`) filling ``ax``.
+    The labels and L/R annotations of all slices are drawn on the same axes.
+
+    """
+    if isinstance(cmap, (str, bytes)):
+        cmap = get_cmap(cmap)
+
+    slices, spacing = _orient_slices(slices, spacing, swapaxes)
+    height, width = slices[0].shape
+    nrows = nrows or math.ceil(len(slices) / ncols)
+    tile_h, tile_w = height * spacing[0], width * spacing[1]
+
+    # Leave the gaps that centering each slice within a grid of axes would leave
+    panel = ax.get_position(original=True)
+    fig_w, fig_h = ax.figure.get_size_inches()
+    cell_h = panel.height * fig_h / (nrows + hspace * (nrows - 1))
+    cell_w = panel.width * fig_w / (ncols + wspace * (ncols - 1))
+    scale = min(cell_w / tile_w, cell_h / tile_h)
+    row_gap = round((cell_h * (1 + hspace) / scale - tile_h) / spacing[0]) if nrows > 1 else 0
+    col_gap = round((cell_w * (1 + wspace) / scale - tile_w) / spacing[1]) if ncols > 1 else 0
+
+    canvas, texts = _tile_slices(
+        slices,
+        ncols,
+        nrows=nrows,
+        labels=labels,
+        spacing=spacing,
+        cmap=cmap,
+        vmin=vmin,
+        vmax=vmax,
+        annotate=annotate,
+        row_gap=row_gap,
+        col_gap=col_gap,
+    )
+
+    ax.imshow(
+        canvas,
+        vmin=0,
+        vmax=1,
+        cmap=cmap,
+        extent=[0, canvas.shape[1] * spacing[1], 0, canvas.shape[0] * spacing[0]],
+        interpolation="none",
+        origin="lower",
+    )
+    if texts:
+        ax.add_artist(_TextLayer(texts)).set_zorder(3)
+    ax.set_xticklabels([])
+    ax.set_yticklabels([])
+    ax.grid(False)
+    ax.axis("off")
+    return ax
+
+
+def _svg_mosaic(
+    panels,
+    cmap="Greys_r",
+    overlay_cmap=None,
+    vmin=None,
+    vmax=None,
+    title=None,
+    width=1116.0,
+    image_format="png",
+):
+    """
+    Lay out the panels of a mosaic as an :class:`~nireports.reportlets.svg.SVGDocument`.
+
+    Each panel is given as a tuple ``(slices, overlays, labels, spacing, ncols, nrows,
+    swapaxes, annotate)``, and it is tiled (see :func:`_tile_slices`) into a single
+    embedded image, with ``overlays`` (if not ``None``) blended on top.
+    The first panel spans ``width`` points (as the main panel of the figure drawn with
+    matplotlib does), the others are centered below at the same scale, and labels
+    are written as text with the size they have in that figure.
+
+    """
+    if isinstance(cmap, (str, bytes)):
+        cmap = get_cmap(cmap)
+
+    pad = 7.2  # The default padding of tight bounding boxes in matplotlib (0.1 in)
+    tiles = []
+    for slices, overlays, labels, spacing, ncols, nrows, swapaxes, annotate in panels:
+        slices, spacing = _orient_slices(slices, spacing, swapaxes)
+        # Rows of slices are separated as the rows of axes are by default (hspace=0.01)
+        row_gap = round(0.01 * slices[0].shape[0]) if nrows > 1 else 0
+        canvas, texts = _tile_slices(
+            slices,
+            ncols,
+            nrows=nrows,
+            labels=labels,
+            spacing=spacing,
+            cmap=cmap,
+            vmin=vmin,
+            vmax=vmax,
+            annotate=annotate,
+            row_gap=row_gap,
+        )
+        # Images are written top row first
+        rgba = colorize(canvas[::-1], cmap)
+        if overlays:
+            overlay, _ = _tile_slices(
+                _orient_slices(overlays, swapaxes=swapaxes)[0],
+                ncols,
+                nrows=nrows,
+                spacing=spacing,
+                vmin=0,
+                vmax=1,
+                row_gap=row_gap,
+            )
+            rgba = blend(rgba, colorize(overlay[::-1], overlay_cmap))
+        # Flatten transparent gaps onto the white background, so that images are opaque
+        rgba = blend(np.full_like(rgba, 255), rgba)
+        tiles.append((rgba, texts, canvas.shape[0] * spacing[0], canvas.shape[1] * spacing[1]))
+
+    scale = width / tiles[0][3]
+    gap = 0.08 * scale * np.mean([height for _, _, height, _ in tiles])
+    title_height = 15.0 if title else 0.0
+
+    doc = SVGDocument(
+        width + 2 * pad,
+        2 * pad
+        + title_height
+        + scale * sum(height for _, _, height, _ in tiles)
+        + gap * (len(tiles) - 1),
+    )
+    doc.add_rect(0, 0, doc.width, doc.height, fill="white")
+    if title:
+        doc.add_text(
+            0.5 * doc.width, pad, title, fill="black", size=10, halign="center", valign="top"
+        )
+
+    top = pad + title_height
+    for rgba, texts, height, panel_width in tiles:
+        left = pad + 0.5 * (width - scale * panel_width)
+        doc.add_image(
+            rgba, left, top, scale * panel_width, scale * height, image_format=image_format
+        )
+        # Texts are positioned in the canvas, whose origin is at the lower-left corner
+        for x, y, text, halign, valign, fgcolor, bgcolor in texts:
+            doc.add_text(
+                left + scale * x,
+                top + scale * (height - y),
+                text,
+                fill=fgcolor,
+                size=14,
+                halign=halign,
+                valign=valign,
+                background=bgcolor,
+            )
+        top += scale * height + gap
+    return doc
+
+
 def plot_mosaic(
     img,
     out_file=None,
@@ -502,8 +1225,42 @@ def plot_mosaic(
     fig=None,
     maxrows=16,
     views=("axial", "sagittal", None),
+    engine="canvas",
+    backend="matplotlib",
+    image_format=None,
+    dpi=300,
 ):
-    """Plot a mosaic of 2D cuts."""
+    """
+    Plot a mosaic of 2D cuts.
+
+    With ``engine="canvas"`` (default), the slices of each view are tiled into a
+    single image drawn on one axes (see :func:`_plot_tiles`), which is much faster
+    than ``engine="axes"``, which draws each slice on its own axes with
+    :func:`plot_slice`.
+
+    With ``backend="svg"``, matplotlib is not used to draw the mosaic: the tiled
+    slices of each view are embedded as one image in an SVG document, written
+    directly (see :func:`_svg_mosaic`).
+    In that case, ``engine`` is ignored and ``fig`` must not be given.
+
+    The mosaic is saved in ``image_format`` (by default, the format matching the
+    extension of ``out_file``, see :func:`~nireports.reportlets.utils.save_figure`),
+    and raster images (PNG, WebP or AVIF) are rendered at ``dpi``, which makes them
+    much lighter than SVG files for mosaics of many slices.
+
+    """
+    if engine not in ("canvas", "axes"):
+        raise ValueError(f"Unknown mosaic engine '{engine}'.")
+
+    if backend not in ("matplotlib", "svg"):
+        raise ValueError(f"Unknown mosaic backend '{backend}'.")
+
+    if backend == "svg" and fig is not None:
+        raise ValueError("A matplotlib figure cannot be drawn with the 'svg' backend.")
+
+    image_format = figure_format(out_file, image_format)
+    if backend == "svg" and image_format != "svg":
+        raise ValueError("The 'svg' backend can only write SVG files.")
 
     VIEW_AXES_ORDER = (2, 1, 0)
 
@@ -526,7 +1283,7 @@ def plot_mosaic(
     else:
         img_data = img
         zooms = [1.0, 1.0, 1.0]
-        out_file = "mosaic.svg"
+        out_file = f"mosaic.{image_format}"
 
     shape = img_data.shape[:3]
     view_hratios = {
@@ -576,12 +1333,18 @@ def plot_mosaic(
             axes_order,
             VIEW_AXES_ORDER[:len(axes_order)],
         )
-        img_data = _bbox(img_data, bbox_data)
     elif img_data.shape[-1] > (ncols * maxrows):
         lowthres = np.percentile(img_data, 5)
-        mask_file = np.ones_like(img_data)
-        mask_file[img_data <= lowthres] = 0
-        img_data = _bbox(img_data, mask_file)
+        bbox_data = np.ones_like(img_data)
+        bbox_data[img_data <= lowthres] = 0
+    else:
+        bbox_data = None
+
+    if bbox_data is not None:
+        img_data = _bbox(img_data, bbox_data)
+        # The overlay is cropped alike, so that it stays aligned with the image
+        if overlay_mask:
+            overlay_data = _bbox(overlay_data, bbox_data)
 
     nrows = min((img_data.shape[-1] + 1) // ncols, maxrows)
 
@@ -591,10 +1354,6 @@ def plot_mosaic(
     ))
     n_gs = sum(bool(v) for v in views)
 
-    main_mosaic_idx = np.full((nrows * ncols, ), -1, dtype=int)
-    main_mosaic_idx[:len(z_vals)] = z_vals
-    main_mosaic_idx = main_mosaic_idx.reshape(nrows, ncols)
-
     swapaxes = views in (
         ("axial", "coronal", None),
         ("axial", "coronal", "sagittal"),
@@ -607,11 +1366,6 @@ def plot_mosaic(
 
     nrows = [nrows, 1, 1]
 
-    # create figures
-
-    if fig is None:
-        fig = plt.figure(layout=None)
-
     fig_height = []
     panel_width = []
     for ii, vv in enumerate(views):
@@ -624,77 +1378,20 @@ def plot_mosaic(
         fig_height.append(zooms[axis_y] * shape[axis_y] * nrows[ii])
         panel_width.append(zooms[axis_x] * shape[axis_x])
 
-    fig_ratio = sum(fig_height) / (panel_width[0] * ncols)
-    fig.set_size_inches(20, 20 * fig_ratio)
-
-    height_ratios = [
-        view_hratios[r] * nrows[i]
-        for i, r in enumerate(views) if r is not None
-    ]
-    subfigs = GridSpec(
-        nrows=n_gs,
-        ncols=1,
-        top=0.96,
-        bottom=0.01,
-        hspace=0.08,
-        height_ratios=height_ratios if len(height_ratios) > 1 else [1],
-    )
-
     est_vmin, est_vmax = _get_limits(img_data, only_plot_noise=only_plot_noise)
     if not vmin:
         vmin = est_vmin
     if not vmax:
         vmax = est_vmax
 
-    slice_spacing = [vs for i, vs in enumerate(zooms) if i != axes_order[0]]
-
-    # Fill in the main mosaic panel
-    panel_axs = subfigs[0].subgridspec(nrows[0], ncols, hspace=0.01, wspace=0.00001)
-    for ii, row_slices in enumerate(main_mosaic_idx):
-        for jj, z_val in enumerate(row_slices):
-            if z_val < 0:
-                break
-
-            ax = fig.add_subplot(panel_axs[ii, jj])
-            if overlay_mask:
-                panel_axs[ii, jj].set_rasterized(True)
-
-            plot_slice(
-                img_data[:, :, z_val],
-                vmin=vmin,
-                vmax=vmax,
-                cmap=cmap,
-                ax=ax,
-                spacing=slice_spacing,
-                label=f"{z_val:d}",
-                swapaxes=swapaxes,
-                annotate=annotate and views[0] in ("axial", "coronal"),
-            )
-
-            if overlay_mask:
-                from matplotlib import cm
-
-                msk_cmap = cm.Reds  # @UndefinedVariable
-                msk_cmap._init()
-                alphas = np.linspace(0, 0.75, msk_cmap.N + 3)
-                msk_cmap._lut[:, -1] = alphas
-                plot_slice(
-                    overlay_data[:, :, z_val],
-                    vmin=0,
-                    vmax=1,
-                    cmap=msk_cmap,
-                    ax=panel_axs[ii, jj],
-                    spacing=slice_spacing,
-                    swapaxes=swapaxes,
-                )
+    # Each panel cuts the data along one axis: (axis, cut indices, ncols, nrows, swapaxes)
+    panels = [(2, z_vals, ncols, nrows[0], swapaxes)]
 
     if views[1] is not None:
         ncols_2 = math.floor((panel_width[0] * ncols) / panel_width[1]) - 1
-        slice_spacing = [vs for i, vs in enumerate(zooms) if i != axes_order[1]]
         step = max(int(img_data.shape[1] / (ncols_2 + 1)), 1)
         start = step
         stop = img_data.shape[1] - step
-        panel_axs = subfigs[1].subgridspec(1, ncols_2, wspace=0.0001)
 
         swapaxes = views in (
             ("axial", "coronal", None),
@@ -706,27 +1403,13 @@ def plot_mosaic(
         )
 
         y_vals = np.linspace(start, stop, num=ncols_2, dtype=int, endpoint=True)
-        for jj, slice_val in enumerate(y_vals):
-            ax = fig.add_subplot(panel_axs[jj])
-            plot_slice(
-                img_data[:, slice_val, :],
-                vmin=vmin,
-                vmax=vmax,
-                cmap=cmap,
-                ax=ax,
-                label=f"{slice_val:d}",
-                spacing=slice_spacing,
-                swapaxes=swapaxes,
-                annotate=annotate and views[1] in ("axial", "coronal"),
-            )
+        panels.append((1, y_vals, ncols_2, 1, swapaxes))
 
     if views[1] is not None and views[2] is not None:
         ncols_3 = math.floor((panel_width[0] * ncols) / panel_width[2]) - 1
-        slice_spacing = [vs for i, vs in enumerate(zooms) if i != axes_order[2]]
         step = max(int(img_data.shape[0] / (ncols_3 + 1)), 1)
         start = step
         stop = img_data.shape[0] - step
-        panel_axs = subfigs[2].subgridspec(1, ncols_3, wspace=0.0001)
 
         swapaxes = views in (
             ("axial", "coronal", "sagittal"),
@@ -735,30 +1418,149 @@ def plot_mosaic(
         )
 
         x_vals = np.linspace(start, stop, num=ncols_3, dtype=int, endpoint=True)
-        for jj, slice_val in enumerate(x_vals):
-            ax = fig.add_subplot(panel_axs[jj])
+        panels.append((0, x_vals, ncols_3, 1, swapaxes))
+
+    if overlay_mask:
+        from matplotlib import cm
+
+        msk_cmap = cm.Reds.copy()
+        msk_cmap._init()
+        alphas = np.linspace(0, 0.75, msk_cmap.N + 3)
+        msk_cmap._lut[:, -1] = alphas
+        # The gaps between slices of the canvas are transparent
+        msk_cmap.set_bad(alpha=0)
+
+    if out_file is None:
+        fname, ext = op.splitext(op.basename(img))
+        if ext == ".gz":
+            fname, _ = op.splitext(fname)
+        out_file = op.abspath(f"{fname}_mosaic.{image_format}")
+
+    if backend == "svg":
+        doc = _svg_mosaic(
+            [
+                (
+                    [_cut(img_data, cut, axis) for cut in cuts],
+                    [_cut(overlay_data, cut, axis) for cut in cuts]
+                    if overlay_mask and ii == 0 else None,
+                    [f"{cut:d}" for cut in cuts],
+                    [vs for i, vs in enumerate(zooms) if i != axes_order[ii]],
+                    panel_ncols,
+                    panel_nrows,
+                    panel_swapaxes,
+                    annotate and views[ii] in ("axial", "coronal"),
+                )
+                for ii, (axis, cuts, panel_ncols, panel_nrows, panel_swapaxes)
+                in enumerate(panels)
+            ],
+            cmap=cmap,
+            overlay_cmap=msk_cmap if overlay_mask else None,
+            vmin=vmin,
+            vmax=vmax,
+            title=title,
+        )
+        doc.save(out_file)
+        return out_file
+
+    # create figures
+
+    if fig is None:
+        fig = plt.figure(layout=None)
+
+    fig_ratio = sum(fig_height) / (panel_width[0] * ncols)
+    fig.set_size_inches(20, 20 * fig_ratio)
+
+    height_ratios = [
+        view_hratios[r] * nrows[i]
+        for i, r in enumerate(views) if r is not None
+    ]
+    subfigs = GridSpec(
+        nrows=n_gs,
+        ncols=1,
+        top=0.96,
+        bottom=0.01,
+        hspace=0.08,
+        height_ratios=height_ratios if len(height_ratios) > 1 else [1],
+    )
+
+    for ii, (axis, cuts, panel_ncols, panel_nrows, panel_swapaxes) in enumerate(panels):
+        slices = [_cut(img_data, cut, axis) for cut in cuts]
+        overlays = (
+            [_cut(overlay_data, cut, axis) for cut in cuts]
+            if overlay_mask and ii == 0 else None
+        )
+        slice_spacing = [vs for i, vs in enumerate(zooms) if i != axes_order[ii]]
+        tile_params = {
+            "spacing": slice_spacing,
+            "swapaxes": panel_swapaxes,
+        }
+        # The main panel has several rows, the panels of the other views have one
+        spacing_params = (
+            {"hspace": 0.01, "wspace": 0.00001} if ii == 0 else {"wspace": 0.0001}
+        )
+        view_annotate = annotate and views[ii] in ("axial", "coronal")
+
+        if engine == "canvas":
+            # The canvas is a single image, and therefore it does not need rasterizing
+            ax = fig.add_subplot(subfigs[ii])
+            _plot_tiles(
+                ax,
+                slices,
+                panel_ncols,
+                nrows=panel_nrows,
+                labels=[f"{cut:d}" for cut in cuts],
+                cmap=cmap,
+                vmin=vmin,
+                vmax=vmax,
+                annotate=view_annotate,
+                **tile_params,
+                **spacing_params,
+            )
+            if overlays:
+                _plot_tiles(
+                    ax,
+                    overlays,
+                    panel_ncols,
+                    nrows=panel_nrows,
+                    cmap=msk_cmap,
+                    vmin=0,
+                    vmax=1,
+                    **tile_params,
+                    **spacing_params,
+                )
+            continue
+
+        panel_axs = subfigs[ii].subgridspec(panel_nrows, panel_ncols, **spacing_params)
+        for k, (cut, dslice) in enumerate(zip(cuts, slices)):
+            ax = fig.add_subplot(panel_axs[divmod(k, panel_ncols)])
+            if overlays:
+                ax.set_rasterized(True)
+
             plot_slice(
-                img_data[slice_val, ...],
+                dslice,
                 vmin=vmin,
                 vmax=vmax,
                 cmap=cmap,
                 ax=ax,
-                label=f"{slice_val:d}",
-                spacing=slice_spacing,
-                swapaxes=swapaxes,
-                annotate=annotate and views[2] in ("axial", "coronal"),
+                label=f"{cut:d}",
+                annotate=view_annotate,
+                **tile_params,
             )
 
+            if overlays:
+                plot_slice(
+                    overlays[k],
+                    vmin=0,
+                    vmax=1,
+                    cmap=msk_cmap,
+                    ax=ax,
+                    **tile_params,
+                )
+
     if title:
         fig.suptitle(title, fontsize="10")
 
     # fig.subplots_adjust(wspace=0.002, hspace=0.002)
 
-    if out_file is None:
-        fname, ext = op.splitext(op.basename(img))
-        if ext == ".gz":
-            fname, _ = op.splitext(fname)
-        out_file = op.abspath(fname + "_mosaic.svg")
-
-    fig.savefig(out_file, format="svg", dpi=300, bbox_inches="tight")
+    save_figure(fig, out_file, image_format=image_format, dpi=dpi)
     return out_file
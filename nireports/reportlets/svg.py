@@ -0,0 +1,367 @@
+# emacs: -*- mode: python; py-indent-offset: 4; indent-tabs-mode: nil -*-
+# vi: set ft=python sts=4 ts=4 sw=4 et:
+#
+# Copyright 2023 The NiPreps Developers <nipreps@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# We support and encourage derived works from this project, please read
+# about our expectations at
+#
+#     https://www.nipreps.org/community/licensing/
+#
+"""
+Write reportlets as SVG documents directly.
+
+Slices are colorized and encoded with NumPy and Pillow, and the document is
+assembled as text, bypassing matplotlib's renderer (only its colormaps are used).
+
+"""
+import base64
+from io import BytesIO
+from xml.sax.saxutils import escape, quoteattr
+
+import numpy as np
+
+FONT_FAMILY = "DejaVu Sans, Bitstream Vera Sans, sans-serif"
+"""Font matching the default of matplotlib, so that labels look alike."""
+
+# Advance widths (in ems) of the DejaVu Sans glyphs most common in labels
+_GLYPH_WIDTHS = {
+    **{str(digit): 0.636 for digit in range(10)},
+    " ": 0.318,
+    ".": 0.318,
+    "-": 0.361,
+    "=": 0.838,
+    "(": 0.390,
+    ")": 0.390,
+    "L": 0.557,
+    "R": 0.695,
+    "s": 0.521,
+    "t": 0.392,
+    "x": 0.592,
+    "y": 0.592,
+    "z": 0.525,
+}
+# Ascent and descent (in ems) of the box matplotlib draws around a line of text
+_ASCENT, _DESCENT = 0.76, 0.21
+
+
+def text_extent(text, size=14):
+    """
+    Estimate the width, ascent and descent of a line of text.
+
+    Examples
+    --------
+    >>> text_extent("10", size=10)
+    (12.72, 7.6, 2.1)
+
+    """
+    width = sum(_GLYPH_WIDTHS.get(char, 0.6) for char in text)
+    return round(width * size, 3), round(_ASCENT * size, 3), round(_DESCENT * size, 3)
+
+
+def colorize(data, cmap="Greys_r", vmin=0.0, vmax=1.0):
+    """
+    Map a 2D array to RGBA bytes with a colormap.
+
+    Non-finite values take the *bad* color of the colormap (transparent by default).
+
+    Examples
+    --------
+    >>> colorize(np.array([[0.0, 0.5], [1.0, np.nan]]), cmap="gray")[..., 0]
+    array([[  0, 128],
+           [255,   0]], dtype=uint8)
+
+    """
+    from matplotlib.cm import get_cmap
+
+    if isinstance(cmap, (str, bytes)):
+        cmap = get_cmap(cmap)
+
+    data = np.asanyarray(data, dtype="float32")
+    if vmax != vmin:
+        data = (data - vmin) / (vmax - vmin)
+    else:
+        data = np.where(np.isnan(data), np.nan, 0.0)
+    return cmap(np.ma.masked_invalid(data), bytes=True)
+
+
+def blend(background, foreground):
+    """
+    Composite two RGBA images, placing ``foreground`` over ``background``.
+
+    Examples
+    --------
+    >>> bg = np.array([[[0, 0, 0, 255]]], dtype="uint8")
+    >>> fg = np.array([[[255, 0, 0, 128]]], dtype="uint8")
+    >>> blend(bg, fg)
+    array([[[128,   0,   0, 255]]], dtype=uint8)
+
+    """
+    alpha = foreground[..., 3:].astype("float32") / 255
+    rgb = foreground[..., :3] * alpha + background[..., :3] * (1 - alpha)
+    out = np.empty_like(background)
+    out[..., :3] = np.round(rgb)
+    out[..., 3] = np.maximum(background[..., 3], foreground[..., 3])
+    return out
+
+
+def encode_image(rgba, image_format="png", quality=80):
+    """
+    Encode an RGBA image, given top row first, returning its MIME type and bytes.
+
+    Opaque images are encoded without the alpha channel, and gray images (as slices
+    shown with a gray colormap) with a single color channel, which makes encoding
+    faster and files smaller. WebP images are encoded lossy, with the given ``quality``.
+
+    Examples
+    --------
+    >>> mimetype, data = encode_image(np.zeros((2, 2, 4), dtype="uint8"))
+    >>> mimetype, data[1:4]
+    ('image/png', b'PNG')
+
+    """
+    from PIL import Image
+
+    image_format = image_format.lower()
+    if image_format not in ("png", "webp"):
+        raise ValueError(f"Unsupported image format '{image_format}'.")
+
+    rgba = np.asanyarray(rgba, dtype="uint8")
+    gray = np.array_equal(rgba[..., 0], rgba[..., 1]) and np.array_equal(
+        rgba[..., 0], rgba[..., 2]
+    )
+    opaque = rgba[..., 3].min() == 255
+    if gray and image_format == "png":
+        channels = [0] if opaque else [0, 3]
+        mode = "L" if opaque else "LA"
+    else:
+        channels = [0, 1, 2] if opaque else [0, 1, 2, 3]
+        mode = "RGB" if opaque else "RGBA"
+
+    pixels = np.ascontiguousarray(rgba[..., channels])
+    image = Image.frombuffer(mode, pixels.shape[1::-1], pixels, "raw", mode, 0, 1)
+
+    buffer = BytesIO()
+    if image_format == "webp":
+        image.save(buffer, format="WEBP", quality=quality, method=0)
+    else:
+        image.save(buffer, format="PNG", compress_level=6)
+    return f"image/{image_format}", buffer.getvalue()
+
+
+def has_webp():
+    """Check whether Pillow can encode WebP images."""
+    from PIL import features
+
+    return bool(features.check("webp"))
+
+
+def _num(value):
+    """Format a coordinate compactly (two decimals, no trailing zeros)."""
+    text = f"{value:.2f}".rstrip("0").rstrip(".")
+    return "0" if text in ("", "-0") else text
+
+
+def _join(values, decimals):
+    """Join integer coordinates (in units of ``10 ** -decimals``), as compactly as SVG allows."""
+    numbers = []
+    for value in values:
+        text = f"{value / 10 ** decimals:.{decimals}f}".rstrip("0").rstrip(".")
+        if text in ("", "-0"):
+            text = "0"
+        elif text.startswith(("0.", "-0.")):
+            text = text.replace("0.", ".", 1)
+        # Negative numbers need no separator
+        numbers.append(text if not numbers or text[0] == "-" else " " + text)
+    return "".join(numbers)
+
+
+def path_data(lines, closed=False, decimals=2):
+    """
+    Generate the ``d`` attribute of a ``<path>`` from a sequence of polylines.
+
+    All lines go in the same path, each starting with an absolute move followed by
+    lines relative to the previous point, rounded to ``decimals``.
+    Lines ending with their first point (and all lines, if ``closed``) are closed.
+
+    Examples
+    --------
+    >>> path_data([np.array([[0.0, 0.0], [1.5, 0.0], [1.5, 2.25]])], closed=True)
+    'M0 0l1.5 0 0 2.25z'
+    >>> path_data([[[1, 1], [1.5, 0.5], [1, 1]], [[2, 2], [1.85, 2]]], decimals=1)
+    'M1 1l.5-.5zM2 2l-.2 0'
+
+    """
+    scale = 10 ** decimals
+    commands = []
+    for line in lines:
+        points = np.round(np.asanyarray(line, dtype="float64") * scale).astype(int)
+        close = closed
+        if len(points) > 2 and np.array_equal(points[0], points[-1]):
+            points, close = points[:-1], True
+        if len(points) < 2:
+            continue
+        commands.append(
+            "M"
+            + _join(points[0], decimals)
+            + "l"
+            + _join(np.diff(points, axis=0).ravel(), decimals)
+            + ("z" if close else "")
+        )
+    return "".join(commands)
+
+
+def _color(color):
+    """Convert any matplotlib color specification into an SVG color and an opacity."""
+    from matplotlib.colors import to_hex, to_rgba
+
+    if isinstance(color, np.ndarray):
+        color = tuple(color)
+    alpha = to_rgba(color)[3]
+    return to_hex(color, keep_alpha=False), alpha
+
+
+class SVGDocument:
+    """
+    A minimal SVG document, with raster images, boxed labels and paths.
+
+    Coordinates and sizes are given in user units (points, as matplotlib's SVG backend
+    writes them), with the origin at the top-left corner of the document.
+    The elements are wrapped by a group with id ``figure_1``, as in matplotlib's output,
+    so that reportlets can rename it to make it unique.
+
+    Examples
+    --------
+    >>> doc = SVGDocument(100, 50)
+    >>> doc.add_rect(0, 0, 100, 50, fill="black")
+    >>> doc.add_text(50, 25, "z=10", fill="w", size=10, halign="center", valign="center")
+    >>> doc.add_path("M0 0l10 10", stroke="r")
+    >>> print(doc.tostring())  # doctest: +ELLIPSIS
+    <svg xmlns="http://www.w3.org/2000/svg" ... viewBox="0 0 100 50" ...>
+    <g id="figure_1">
+    <rect x="0" y="0" width="100" height="50" fill="#000000"/>
+    <text x="50" y="27.75" fill="#ffffff" font-size="10" text-anchor="middle">z=10</text>
+    <path d="M0 0l10 10" fill="none" stroke="#ff0000" stroke-width="0.5"/>
+    </g>
+    </svg>
+
+    """
+
+    __slots__ = {
+        "width": "width of the document, in user units",
+        "height": "height of the document, in user units",
+        "elements": "list of serialized elements, in drawing order",
+    }
+
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        self.elements = []
+
+    def add_rect(self, x, y, width, height, fill="black"):
+        """Draw a filled rectangle."""
+        color, alpha = _color(fill)
+        opacity = f' fill-opacity="{_num(alpha)}"' if alpha < 1 else ""
+        self.elements.append(
+            f'<rect x="{_num(x)}" y="{_num(y)}" width="{_num(width)}" '
+            f'height="{_num(height)}" fill="{color}"{opacity}/>'
+        )
+
+    def add_image(self, rgba, x, y, width, height, image_format="png", quality=80):
+        """
+        Embed an RGBA image (top row first), stretched to the given box.
+
+        Pixels are not interpolated when the image is scaled, so that voxels remain sharp.
+        """
+        mimetype, data = encode_image(rgba, image_format=image_format, quality=quality)
+        self.elements.append(
+            f'<image x="{_num(x)}" y="{_num(y)}" width="{_num(width)}" '
+            f'height="{_num(height)}" preserveAspectRatio="none" '
+            'style="image-rendering:pixelated" '
+            f'xlink:href="data:{mimetype};base64,{base64.b64encode(data).decode("ascii")}"/>'
+        )
+
+    def add_text(
+        self,
+        x,
+        y,
+        text,
+        fill="white",
+        size=14,
+        halign="left",
+        valign="baseline",
+        background=None,
+    ):
+        """
+        Write a line of text, optionally on a box of ``background`` color.
+
+        Alignments follow matplotlib's: ``halign`` may be ``"left"``, ``"center"``
+        or ``"right"``, and ``valign`` ``"top"``, ``"center"``, ``"baseline"`` or
+        ``"bottom"`` (the bottom of the box, below the baseline).
+        """
+        width, ascent, descent = text_extent(text, size)
+        x0 = x - {"left": 0, "center": 0.5 * width, "right": width}[halign]
+        baseline = y + {
+            "top": ascent,
+            "center": 0.5 * (ascent - descent),
+            "baseline": 0.0,
+            "bottom": -descent,
+        }[valign]
+
+        if background is not None:
+            self.add_rect(x0, baseline - ascent, width, ascent + descent, fill=background)
+
+        color, alpha = _color(fill)
+        opacity = f' fill-opacity="{_num(alpha)}"' if alpha < 1 else ""
+        anchor = {"left": "", "center": ' text-anchor="middle"', "right": ' text-anchor="end"'}
+        self.elements.append(
+            f'<text x="{_num(x)}" y="{_num(baseline)}" fill="{color}"{opacity} '
+            f'font-size="{_num(size)}"{anchor[halign]}>{escape(text)}</text>'
+        )
+
+    def add_path(self, d, stroke="red", stroke_width=0.5, fill="none"):
+        """Draw a path, given its ``d`` attribute (see :func:`path_data`)."""
+        if not d:
+            return
+        color, alpha = _color(stroke)
+        opacity = f' stroke-opacity="{_num(alpha)}"' if alpha < 1 else ""
+        self.elements.append(
+            f"<path d={quoteattr(d)} fill=\"{fill}\" stroke=\"{color}\"{opacity} "
+            f'stroke-width="{_num(stroke_width)}"/>'
+        )
+
+    def tostring(self):
+        """Serialize the document, without XML declaration, for embedding in HTML."""
+        return "\n".join(
+            [
+                '<svg xmlns="http://www.w3.org/2000/svg" '
+                'xmlns:xlink="http://www.w3.org/1999/xlink" version="1.1" '
+                f'viewBox="0 0 {_num(self.width)} {_num(self.height)}" '
+                'preserveAspectRatio="xMidYMid meet" '
+                f'font-family={quoteattr(FONT_FAMILY)}>',
+                '<g id="figure_1">',
+                *self.elements,
+                "</g>",
+                "</svg>",
+            ]
+        )
+
+    def save(self, filename):
+        """Write the document as a standalone SVG file."""
+        with open(filename, "w") as fobj:
+            fobj.write('<?xml version="1.0" encoding="utf-8" standalone="no"?>\n')
+            fobj.write(self.tostring())
+            fobj.write("\n")
+        return filename
@@ -43,6 +43,8 @@ from nipype.utils import filemanip
 
 
 SVGNS = "http://www.w3.org/2000/svg"
+FIGURE_FORMATS = ("svg", "png", "webp", "avif")
+"""Formats figures of reportlets can be saved to (see :func:`save_figure`)."""
 
 
 def robust_set_limits(data, plot_params, percentiles=(15, 99.8)):
@@ -63,11 +65,9 @@ def _get_limits(nifti_file, only_plot_noise=False):
 
     if only_plot_noise:
         data_mask = np.logical_and(data_mask, data != 0)
-        vmin = np.percentile(data[data_mask], 0)
-        vmax = np.percentile(data[data_mask], 61)
+        vmin, vmax = np.percentile(data[data_mask], [0, 61])
     else:
-        vmin = np.percentile(data[data_mask], 0.5)
-        vmax = np.percentile(data[data_mask], 99.5)
+        vmin, vmax = np.percentile(data[data_mask], [0.5, 99.5])
 
     return vmin, vmax
 
@@ -146,6 +146,59 @@ def svg_compress(image, compress="auto"):
     return "".join(image_svg)  # straight up giant string
 
 
+def figure_format(out_file=None, image_format=None):
+    """
+    Resolve the format of a figure, from ``image_format`` or the extension of ``out_file``.
+
+    Examples
+    --------
+    >>> figure_format("mosaic.png"), figure_format("mosaic.svg", "WebP")
+    ('png', 'webp')
+    >>> figure_format("mosaic.nii.gz"), figure_format()
+    ('svg', 'svg')
+    >>> figure_format(image_format="gif")
+    Traceback (most recent call last):
+    ValueError: Unsupported figure format 'gif'.
+
+    """
+    if image_format is not None:
+        if image_format.lower() not in FIGURE_FORMATS:
+            raise ValueError(f"Unsupported figure format '{image_format}'.")
+        return image_format.lower()
+
+    suffix = Path(out_file or "").suffix.lstrip(".").lower()
+    return suffix if suffix in FIGURE_FORMATS else "svg"
+
+
+def save_figure(fig, out_file, image_format=None, dpi=300, quality=80):
+    """
+    Save a matplotlib figure as an SVG file or as a raster image.
+
+    The format is given by ``image_format`` or, if ``None``, by the extension of
+    ``out_file`` (SVG if not one of :data:`FIGURE_FORMATS`).
+    Raster images are rendered at ``dpi`` dots per inch; WebP and AVIF images are
+    converted with Pillow from the PNG matplotlib renders, with the given ``quality``.
+
+    """
+    image_format = figure_format(out_file, image_format)
+    if image_format in ("svg", "png"):
+        fig.savefig(out_file, format=image_format, dpi=dpi, bbox_inches="tight")
+        return out_file
+
+    from io import BytesIO
+    from PIL import Image, features
+
+    if not features.check(image_format):
+        raise RuntimeError(f"Pillow cannot write {image_format.upper()} images")
+
+    buffer = BytesIO()
+    fig.savefig(buffer, format="png", dpi=dpi, bbox_inches="tight")
+    buffer.seek(0)
+    with Image.open(buffer) as image:
+        image.save(out_file, format=image_format.upper(), quality=quality)
+    return out_file
+
+
 def svg2str(display_object, dpi=300):
     """Serialize a nilearn display object to string."""
     from io import StringIO
@@ -0,0 +1,82 @@
+# emacs: -*- mode: python; py-indent-offset: 4; indent-tabs-mode: nil -*-
+# vi: set ft=python sts=4 ts=4 sw=4 et:
+#
+# Copyright 2023 The NiPreps Developers <nipreps@gmail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+# We support and encourage derived works from this project, please read
+# about our expectations at
+#
+#     https://www.nipreps.org/community/licensing/
+#
+"""Tests for the command-line interface."""
+import shutil
+
+import pytest
+from pkg_resources import resource_filename as pkgrf
+
+from nireports.cli.run import main
+
+
+@pytest.fixture()
+def work_dir(tmp_path):
+    return shutil.copytree(pkgrf("nireports", "assembler/data/tests/work"), tmp_path / "work")
+
+
+@pytest.mark.parametrize("indexer", ["pybids", "fast"])
+def test_dry_run(tmp_path, work_dir, indexer, capsys):
+    out_dir = tmp_path / "out"
+    argv = [str(out_dir), "-w", str(work_dir), "--dry-run", "--indexer", indexer]
+    assert main(argv + ["--participant-label", "0[12]"]) == 0
+
+    lines = capsys.readouterr().out.splitlines()
+    assert lines[0].startswith("Indexed 106 files")
+    assert lines[1:] == [
+        "Reports would be generated for 2 subject(s):",
+        "  sub-01: 34 reportlets",
+        "  sub-02: 35 reportlets",
+    ]
+    assert not out_dir.exists()
+
+
+def test_main(tmp_path, work_dir):
+    out_dir = tmp_path / "out"
+    argv = [str(out_dir), "-w", str(work_dir), "--nprocs", "2", "--indexer", "fast"]
+    assert main(argv + ["--cache-dir", str(tmp_path / "cache")]) == 0
+    assert sorted(p.name for p in out_dir.glob("*.html")) == [
+        "sub-01.html",
+        "sub-02.html",
+        "sub-03.html",
+    ]
+
+
+def test_group_index(tmp_path, work_dir):
+    out_dir = tmp_path / "out"
+    argv = [str(out_dir), "-w", str(work_dir), "--participant-label", "01", "--group-index"]
+    assert main(argv + ["--indexer", "fast", "--page-size", "5"]) == 0
+    html = (out_dir / "index.html").read_text()
+    assert "const PAGE_SIZE = 5;" in html
+    assert '"report":"sub-01.html"' in html
+    assert '"report":"sub-02.html"' not in html
+
+
+@pytest.mark.parametrize(
+    "flags", [["--nprocs", "2"], ["--cache-dir", "cache"], ["--indexer", "fast"]]
+)
+def test_watch_unsupported(tmp_path, work_dir, flags, capsys):
+    argv = [str(tmp_path / "out"), "-w", str(work_dir), "--watch"]
+    with pytest.raises(SystemExit) as excinfo:
+        main(argv + flags)
+    assert excinfo.value.code == 2
+    assert f"--watch cannot be combined with {flags[0]}" in capsys.readouterr().err
@@ -22,6 +22,7 @@
 #
 """Test reportlets module."""
 import os
+import re
 from pathlib import Path
 from itertools import permutations
 from functools import partial
@@ -36,7 +37,14 @@ from templateflow.api import get
 from nireports.reportlets.modality.func import fMRIPlot
 from nireports.reportlets.nuisance import plot_carpet
 from nireports.reportlets.surface import cifti_surfaces_plot
-from nireports.reportlets.mosaic import plot_mosaic
+from nireports.reportlets.contours import cut_isolines, marching_squares, simplify
+from nireports.reportlets.mosaic import (
+    plot_mosaic,
+    plot_registration,
+    plot_segs,
+    plot_spikes,
+)
+from nireports.reportlets.utils import compose_view, cuts_from_bbox
 from nireports.reportlets.xca import compcor_variance_plot, plot_melodic_components
 from nireports.tools.timeseries import cifti_timeseries as _cifti_timeseries
 from nireports.tools.timeseries import get_tr as _get_tr
@@ -371,3 +379,305 @@ def test_mriqc_plot_mosaic_2(tmp_path, testdata_path, outdir):
         maxrows=12,
         annotate=True,
     )
+
+
+@pytest.mark.parametrize("overlay", (False, True))
+def test_plot_mosaic_engine(tmp_path, outdir, overlay):
+    """Check both mosaic engines render the same synthetic volume alike."""
+    from matplotlib.image import imread
+
+    rng = np.random.default_rng(2023)
+    data = rng.normal(100, 20, size=(40, 48, 36)).astype("float32")
+    data[:5] = 0
+    img = nb.Nifti1Image(data, np.diag((2.0, 2.0, 2.0, 1.0)))
+    in_file = tmp_path / "synthetic.nii.gz"
+    img.to_filename(in_file)
+
+    overlay_mask = None
+    if overlay:
+        overlay_mask = tmp_path / "mask.nii.gz"
+        nb.Nifti1Image(
+            (data > 110).astype("uint8"), img.affine
+        ).to_filename(overlay_mask)
+
+    rasters = []
+    for engine in ("canvas", "axes"):
+        fname = f"mosaic_engine_{engine}{'_overlay' * overlay}.png"
+        out_file = plot_mosaic(
+            str(in_file),
+            views=("axial", "sagittal", "coronal"),
+            overlay_mask=str(overlay_mask) if overlay else None,
+            out_file=str((outdir or tmp_path) / fname),
+            annotate=True,
+            maxrows=3,
+            engine=engine,
+            dpi=50,
+        )
+        rasters.append(imread(out_file)[..., :3])
+
+    assert rasters[0].shape == rasters[1].shape
+    assert np.abs(rasters[0] - rasters[1]).mean() < 0.05
+
+
+def test_plot_mosaic_bad_engine(tmp_path):
+    """An unknown engine or backend is rejected before any plotting happens."""
+    with pytest.raises(ValueError):
+        plot_mosaic(str(tmp_path / "missing.nii.gz"), engine="vtk")
+    with pytest.raises(ValueError):
+        plot_mosaic(str(tmp_path / "missing.nii.gz"), backend="vtk")
+
+
+def _synthetic_volume(shape, zooms=(2.0, 2.0, 2.0)):
+    """Generate an ellipsoidal blob, and a mask of its core."""
+    grid = np.meshgrid(*(np.linspace(-1, 1, n) for n in shape), indexing="ij")
+    radius = np.sqrt(sum(axis**2 for axis in grid))
+    affine = np.diag(tuple(zooms) + (1.0,))
+    affine[:3, 3] = -0.5 * np.array(zooms) * shape
+    return (
+        nb.Nifti1Image((np.clip(1.2 - radius, 0, None) * 1000).astype("float32"), affine),
+        nb.Nifti1Image((radius < 0.5).astype("uint8"), affine),
+    )
+
+
+@pytest.mark.parametrize("overlay", (False, True))
+def test_plot_mosaic_svg(tmp_path, outdir, overlay):
+    """Write a mosaic without matplotlib."""
+    img, mask = _synthetic_volume((40, 48, 36))
+    img.to_filename(tmp_path / "synthetic.nii.gz")
+    mask.to_filename(tmp_path / "mask.nii.gz")
+
+    fname = f"mosaic_backend_svg{'_overlay' * overlay}.svg"
+    out_file = plot_mosaic(
+        str(tmp_path / "synthetic.nii.gz"),
+        views=("axial", "sagittal", "coronal"),
+        overlay_mask=str(tmp_path / "mask.nii.gz") if overlay else None,
+        out_file=str((outdir or tmp_path) / fname),
+        title="A mosaic written without matplotlib",
+        maxrows=3,
+        backend="svg",
+    )
+    svg = Path(out_file).read_text()
+    # One embedded image per view, and one label per slice
+    assert svg.count("<image ") == 3
+    assert ">R</text>" in svg
+    assert "without matplotlib</text>" in svg
+
+    with pytest.raises(ValueError):
+        plot_mosaic(str(tmp_path / "synthetic.nii.gz"), fig=object(), backend="svg")
+
+
+@pytest.mark.parametrize("image_format", ("png", "webp", "avif"))
+def test_plot_mosaic_raster(tmp_path, outdir, image_format):
+    """Save mosaics as raster images."""
+    from PIL import Image, features
+
+    if image_format != "png" and not features.check(image_format):
+        pytest.skip(f"Pillow cannot write {image_format.upper()} images")
+
+    img, _ = _synthetic_volume((40, 48, 36))
+    img.to_filename(tmp_path / "synthetic.nii.gz")
+    out_file = plot_mosaic(
+        str(tmp_path / "synthetic.nii.gz"),
+        out_file=str((outdir or tmp_path) / f"mosaic_raster.{image_format}"),
+        maxrows=3,
+        dpi=30,
+    )
+    with Image.open(out_file) as image:
+        assert image.format == image_format.upper()
+        # A 20-inch wide figure, cropped to its contents
+        assert 400 < image.size[0] <= 600
+
+    with pytest.raises(ValueError):
+        plot_mosaic(
+            str(tmp_path / "synthetic.nii.gz"),
+            out_file=str(tmp_path / f"mosaic_raster.{image_format}"),
+            backend="svg",
+        )
+
+
+def test_plot_spikes_svg(tmp_path, outdir):
+    """Write the spikes mosaic without matplotlib."""
+    rng = np.random.default_rng(2023)
+    affine = np.diag((3.0, 3.0, 3.5, 1.0))
+    nb.Nifti1Image(rng.normal(100, 10, size=(32, 32, 10, 8)), affine).to_filename(
+        tmp_path / "bold.nii.gz"
+    )
+    nb.Nifti1Image(rng.normal(0, 2, size=(32, 32, 10, 8)), affine).to_filename(
+        tmp_path / "fft.nii.gz"
+    )
+
+    out_file = plot_spikes(
+        str(tmp_path / "bold.nii.gz"),
+        str(tmp_path / "fft.nii.gz"),
+        [(0, 1), (4, 5), (7, 9)],
+        out_file=str((outdir or tmp_path) / "spikes_backend_svg.svg"),
+        backend="svg",
+    )
+    svg = Path(out_file).read_text()
+    assert svg.count("<image ") == 6
+    assert "t=0.000s (z=1)" in svg
+
+
+def test_plot_segs_svg(tmp_path, outdir):
+    """Draw contours of segmentations without matplotlib."""
+    img, mask = _synthetic_volume((40, 48, 36))
+    img.to_filename(tmp_path / "synthetic.nii.gz")
+    mask.to_filename(tmp_path / "mask.nii.gz")
+
+    svgs = plot_segs(
+        str(tmp_path / "synthetic.nii.gz"),
+        [str(tmp_path / "mask.nii.gz")],
+        None,
+        colors=["r"],
+        compress=False,
+        backend="svg",
+    )
+    assert len(svgs) == 3
+    svg = svgs[0].to_str().decode()
+    assert 'id="segmentation-z-' in svg
+    assert svg.count("<image ") == 7
+    assert 'stroke="#ff0000"' in svg
+
+    if outdir is not None:
+        compose_view(svgs, None, out_file=outdir / "segs_backend_svg.svg")
+
+
+def test_cut_isolines_oblique():
+    """Contours of oblique segmentations are traced where they are in world coordinates."""
+    rotation = 2.0 * nb.eulerangles.euler2mat(z=np.pi / 5, x=np.pi / 6)
+    affine = nb.affines.from_matvec(rotation, -rotation @ np.full(3, 19.5))
+    world = nb.affines.apply_affine(affine, np.moveaxis(np.indices((40, 40, 40)), 0, -1))
+    # A sphere of 15mm radius, centered at the origin
+    mask = nb.Nifti1Image((np.linalg.norm(world, axis=-1) < 15).astype("uint8"), affine)
+
+    for display_mode, coord in (("z", 0.0), ("x", 5.0), ("y", -8.0)):
+        ((lines,),) = cut_isolines(mask, display_mode, [coord])
+        assert len(lines) == 1
+        radius = np.linalg.norm(lines[0], axis=1)
+        # Within a voxel and a half of the circle cut through the sphere
+        assert np.abs(radius - np.sqrt(15.0**2 - coord**2)).max() < 3.0
+
+
+def test_plot_segs_nprocs(tmp_path):
+    """Views rendered in a process pool are those rendered serially, in the same order."""
+    img, mask = _synthetic_volume((40, 48, 36))
+    img.to_filename(tmp_path / "synthetic.nii.gz")
+    mask.to_filename(tmp_path / "mask.nii.gz")
+
+    views = [
+        [
+            re.sub(r'id="segmentation-[^"]*"', "", svg.to_str().decode())
+            for svg in plot_segs(
+                str(tmp_path / "synthetic.nii.gz"),
+                [str(tmp_path / "mask.nii.gz")],
+                None,
+                compress=False,
+                backend="svg",
+                nprocs=nprocs,
+            )
+        ]
+        for nprocs in (1, 2)
+    ]
+    assert views[0] == views[1]
+
+
+@pytest.mark.parametrize("contour_engine", ("nilearn", "marching"))
+def test_plot_registration_nprocs(contour_engine):
+    """Registration views rendered in a process pool are those rendered serially."""
+    img, mask = _synthetic_volume((40, 48, 36))
+
+    views = [
+        [
+            # Drop the creation date and the identifiers generated for each figure
+            re.sub(
+                r'<dc:date>[^<]*</dc:date>|id="[^"]*"|url\(#[^)]*\)|xlink:href="#[^"]*"',
+                "",
+                svg.to_str().decode(),
+            )
+            for svg in plot_registration(
+                img,
+                "registration",
+                cuts=cuts_from_bbox(mask, cuts=3),
+                contour=mask,
+                compress=False,
+                nprocs=nprocs,
+                contour_engine=contour_engine,
+            )
+        ]
+        for nprocs in (1, 2)
+    ]
+    assert len(views[0]) == 3
+    assert views[0] == views[1]
+
+
+def test_marching_squares():
+    """Isolines cross the edges of the grid where contourpy finds them."""
+    contour_generator = pytest.importorskip("contourpy").contour_generator
+
+    data = np.random.default_rng(1234).random((30, 40))
+    lines = marching_squares(data, 0.5)
+    expected = contour_generator(z=data, corner_mask=False, line_type="Separate").lines(0.5)
+    assert len(lines) == len(expected)
+    assert np.array_equal(
+        np.unique(np.round(np.concatenate(lines), 6), axis=0),
+        np.unique(np.round(np.concatenate(expected), 6), axis=0),
+    )
+
+    # Simplified lines stay within the tolerance of every original point
+    for line in lines:
+        simple = simplify(line, tolerance=0.25)
+        assert np.array_equal(simple[[0, -1]], line[[0, -1]])
+        start, stop = simple[:-1, None], simple[1:, None]
+        t = np.clip(
+            ((line - start) * (stop - start)).sum(-1)
+            / np.maximum(((stop - start) ** 2).sum(-1), 1e-12),
+            0,
+            1,
+        )
+        distances = np.hypot(*np.moveaxis(line - start - t[..., None] * (stop - start), -1, 0))
+        assert distances.min(axis=0).max() <= 0.25 + 1e-9
+
+
+@pytest.mark.parametrize("backend,contour_engine", [
+    ("matplotlib", "nilearn"),
+    ("matplotlib", "marching"),
+    ("svg", "marching"),
+])
+def test_plot_segs_contour_engine(tmp_path, outdir, backend, contour_engine):
+    """Draw the contours of a label map with each contour engine."""
+    img, mask = _synthetic_volume((40, 48, 36))
+    labels = np.asanyarray(mask.dataobj) * (1 + (np.indices(mask.shape)[0] > 20))
+    img.to_filename(tmp_path / "synthetic.nii.gz")
+    mask.__class__(labels.astype("uint8"), mask.affine).to_filename(tmp_path / "labels.nii.gz")
+
+    svgs = plot_segs(
+        str(tmp_path / "synthetic.nii.gz"),
+        [str(tmp_path / "labels.nii.gz")],
+        None,
+        colors=[["r", "b"]],
+        levels=[[0.5, 1.5]],
+        compress=False,
+        backend=backend,
+        contour_engine=contour_engine,
+    )
+    svg = svgs[0].to_str().decode()
+    assert re.search(r"stroke(: |=\")#ff0000", svg) and re.search(r"stroke(: |=\")#0000ff", svg)
+    if contour_engine == "marching":
+        # All the lines of a color are drawn by one path per cut (or view, with svg)
+        paths = re.findall(r"<path [^>]*stroke(?:: |=\")#ff0000", svg)
+        assert 1 <= len(paths) <= (1 if backend == "svg" else 7)
+
+    if outdir is not None:
+        compose_view(svgs, None, out_file=outdir / f"segs_{backend}_{contour_engine}.svg")
+
+
+def test_plot_segs_bad_contour_engine(tmp_path):
+    img, mask = _synthetic_volume((20, 24, 18))
+    img.to_filename(tmp_path / "synthetic.nii.gz")
+    mask.to_filename(tmp_path / "mask.nii.gz")
+    args = (str(tmp_path / "synthetic.nii.gz"), [str(tmp_path / "mask.nii.gz")], None)
+
+    with pytest.raises(ValueError, match="contour engine"):
+        plot_segs(*args, contour_engine="skimage")
+    with pytest.raises(ValueError, match="marching"):
+        plot_segs(*args, backend="svg", contour_engine="nilearn")